@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+#   \title      corpus.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Synthetic pages for the benchmarks, same syntax the
+#               lexer understands, in whatever size and mix we ask for
+#
+#   \license    MIT
+
+
+import random
+import sys
+
+
+# how often each kind of block shows up, relative to the others
+DEFAULT_MIX = {
+    "heading": 1,
+    "list": 3,
+    "code": 1,
+    "comment": 1,
+    "list_comment": 1,
+    "paragraph": 4,
+    # nested lists, off by default so older results stay comparable
+    "outline": 0,
+}
+
+WORDS = (
+    "the lexer reads a page and hands tokens to the parser which builds "
+    "a tree of nodes that the renderer walks to write html for the blog "
+    "subnet mask address network host router bits byte octet cidr range"
+).split()
+
+CODE = (
+    "def lex(page):",
+    "    for char in page:",
+    "        if char == '#':",
+    "            yield heading(char)",
+    "int main(int argc, char **argv) { return 0; }",
+    "ip addr add 172.16.5.1/27 dev eth0",
+    "key: <value> # yaml comment",
+)
+
+
+def parse_mix(text: str) -> dict:
+    """
+        "heading=1,list=3" -> {"heading": 1, "list": 3}, kinds that are
+        left out do not show up at all
+    """
+    mix = {}
+
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"unknown block kind {kind}")
+
+        mix[kind] = float(weight or 1)
+
+    return mix
+
+
+def parse_size(text: str) -> int:
+    """
+        "512k" / "4M" / "1000" -> bytes
+    """
+    scale = {"k": 1024, "m": 1024 * 1024}.get(text[-1].lower(), 1)
+
+    return int(float(text[:-1] if scale != 1 else text) * scale)
+
+
+def sentence(rng: random.Random, low=6, high=24) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def block(rng: random.Random, kind: str) -> str:
+    if kind == "heading":
+        return "#" * rng.randint(1, 4) + " " + sentence(rng, 2, 6)
+
+    if kind == "list":
+        count = rng.randint(2, 8)
+        return "\n".join(f"{idx}. {sentence(rng)}" for idx in range(1, count + 1))
+
+    if kind == "outline":
+        items = []
+        depth = 0
+
+        for idx in range(rng.randint(4, 40)):
+            depth = max(0, min(depth + rng.choice((-1, 0, 0, 1)), 5))
+            bullet = f"{idx + 1}." if depth % 2 == 0 else "-"
+            items.append("    " * depth + f"{bullet} {sentence(rng, 2, 10)}")
+
+        return "\n".join(items)
+
+    if kind == "code":
+        lines = [rng.choice(CODE) for _ in range(rng.randint(2, 12))]
+        return "```python\n" + "\n".join(lines) + "\n```"
+
+    if kind == "comment":
+        return "// " + sentence(rng, 2, 8)
+
+    if kind == "list_comment":
+        return "-// " + sentence(rng, 2, 8)
+
+    return sentence(rng, 20, 80)
+
+
+def generate(size: int, mix=None, seed=0) -> str:
+    """
+        build a page of roughly size bytes
+    args
+        size    how big the page should be, it stops at the first block past it
+        mix     kind -> weight, see DEFAULT_MIX
+        seed    same seed, same page
+    returns
+        str     the markdown source
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    blocks = []
+    length = 0
+
+    while length < size:
+        text = block(rng, rng.choices(kinds, weights)[0])
+        blocks.append(text)
+        length += len(text) + 2
+
+    return "\n\n".join(blocks) + "\n"
+
+
+if __name__ == "__main__":
+    # corpus.py <size> [mix] > page.md
+    mix = parse_mix(sys.argv[2]) if len(sys.argv) > 2 else None
+    sys.stdout.write(generate(parse_size(sys.argv[1]), mix))
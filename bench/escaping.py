@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+#   \title      escaping.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       What html escaping adds to the render of text heavy pages,
+#               compared against the renderer as it was before escaping,
+#               no entity nodes in the IR and escaping swapped for a no-op
+#
+#   \license    MIT
+
+
+import argparse
+import sys
+import gc
+import re
+import io
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pipeline import best_of
+import highlight
+import corpus
+import core
+
+
+# mostly prose, which is where escaping has the most text to look at
+TEXT_MIX = {"heading": 1, "list": 3, "paragraph": 6}
+
+
+def no_escape(text: str) -> str:
+    return text
+
+
+# INLINE_TRIGGER from before &, < and > were split out into entity nodes
+UNESCAPED_TRIGGER = re.compile(r"[*\[\]`\\]")
+
+
+def build_tree(source: str, escaping: bool) -> list:
+    trigger = core.INLINE_TRIGGER
+    if not escaping:
+        core.INLINE_TRIGGER = UNESCAPED_TRIGGER
+
+    try:
+        parser = core.PageParser()
+        parser.create_ir(core.PageLexer(io.StringIO(source)))
+    finally:
+        core.INLINE_TRIGGER = trigger
+
+    return parser.tree.successors
+
+
+def render(nodes: list) -> str:
+    renderer = core.PageParser()
+    renderer.render_nodes(nodes)
+
+    return "".join(renderer.page)
+
+
+def time_render(nodes: list, repeat: int, escaping: bool) -> float:
+    escapes = (core.escape_text, core.escape_attr, highlight.escape_text)
+
+    if not escaping:
+        core.escape_text = core.escape_attr = highlight.escape_text = no_escape
+
+    # a collection landing in one run and not the other is bigger than what
+    # is being measured here
+    gc.disable()
+
+    try:
+        return best_of(repeat, lambda: render(nodes))[0]
+    finally:
+        gc.enable()
+        core.escape_text, core.escape_attr, highlight.escape_text = escapes
+
+
+def mark_lines(source: str, every: int) -> str:
+    lines = source.split("\n")
+
+    for index in range(0, len(lines), every):
+        lines[index] = lines[index].replace(" and ", " & ").replace(" to ", " <to> ")
+
+    return "\n".join(lines)
+
+
+def main(argv: list) -> int:
+    args = argparse.ArgumentParser(prog="escaping.py")
+    args.add_argument("--size", default="1M", help="page size")
+    args.add_argument("--repeat", type=int, default=5)
+    args.add_argument("--rounds", type=int, default=10)
+    args.add_argument("--seed", type=int, default=0)
+    args.add_argument(
+        "--budget", type=float, default=5.0, help="allowed overhead in percent"
+    )
+    opts = args.parse_args(argv)
+
+    source = corpus.generate(corpus.parse_size(opts.size), TEXT_MIX, opts.seed)
+
+    # the generated words never need escaping, these put an & and a < into
+    # some or all of the lines so the slow path is measured as well. the
+    # budget is for pages that look like our posts, about 1 line in 50 has
+    # something to escape in it there, "every" is the worst case
+    pages = {
+        "clean": source,
+        "1 in 50": mark_lines(source, 50),
+        "1 in 10": mark_lines(source, 10),
+        "every": mark_lines(source, 1),
+    }
+    budgeted = ("clean", "1 in 50")
+
+    print(f"{'page':>8}{'plain ms':>12}{'escaped ms':>12}{'overhead':>10}")
+
+    over = False
+    for name, page in pages.items():
+        plain_nodes = build_tree(page, False)
+        escaped_nodes = build_tree(page, True)
+
+        # interleave the two so drift on the machine hits both the same
+        plain = escaped = float("inf")
+        for _ in range(opts.rounds):
+            plain = min(plain, time_render(plain_nodes, opts.repeat, False))
+            escaped = min(escaped, time_render(escaped_nodes, opts.repeat, True))
+
+        overhead = (escaped - plain) / plain * 100
+        over |= name in budgeted and overhead > opts.budget
+
+        print(
+            f"{name:>8}{plain * 1000:12.2f}{escaped * 1000:12.2f}{overhead:9.1f}%"
+        )
+
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+#   \title      irload.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Loading a page's IR out of the binary cache, compared against
+#               lexing and parsing it again
+#
+#   \license    MIT
+
+
+import argparse
+import sys
+import gc
+import io
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pipeline import best_of
+import ircache
+import corpus
+import core
+
+
+def build_ir(source: str) -> tuple:
+    """
+        what the cache saves us, lex_page() and create_ir()
+    """
+    lexer = core.PageLexer(io.StringIO(source))
+    parser = core.PageParser(lexer.lex_page())
+    parser.create_ir()
+
+    return parser.tree.successors, lexer.errors
+
+
+def main(argv: list) -> int:
+    args = argparse.ArgumentParser(prog="irload.py")
+    args.add_argument(
+        "--sizes", default="10K,100K,1M", help="comma separated page sizes"
+    )
+    args.add_argument("--repeat", type=int, default=5)
+    args.add_argument("--rounds", type=int, default=5)
+    args.add_argument("--seed", type=int, default=0)
+    opts = args.parse_args(argv)
+
+    print(
+        f"{'size':>8}{'cache KB':>10}{'lex+ir ms':>11}{'load ms':>10}"
+        f"{'dump ms':>10}{'speedup':>9}"
+    )
+
+    for size in opts.sizes.split(","):
+        source = corpus.generate(corpus.parse_size(size), None, opts.seed)
+        nodes, errors = build_ir(source)
+        data = ircache.dumps(nodes, errors)
+
+        if ircache.loads(data) != (nodes, errors):
+            print(f"{size}: the IR does not survive the round trip", file=sys.stderr)
+            return 1
+
+        # a collection landing in one run and not the other is bigger than
+        # what is being measured here
+        gc.disable()
+
+        try:
+            # interleave the two so drift on the machine hits both the same
+            built = loaded = float("inf")
+            for _ in range(opts.rounds):
+                built = min(built, best_of(opts.repeat, lambda: build_ir(source))[0])
+                loaded = min(
+                    loaded, best_of(opts.repeat, lambda: ircache.loads(data))[0]
+                )
+
+            dumped = best_of(opts.repeat, lambda: ircache.dumps(nodes, errors))[0]
+
+        finally:
+            gc.enable()
+
+        print(
+            f"{size:>8}{len(data) / 1024:10.1f}{built * 1000:11.2f}"
+            f"{loaded * 1000:10.2f}{dumped * 1000:10.2f}{built / loaded:8.1f}x"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
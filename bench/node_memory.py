@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+#   \title      node_memory.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       How many bytes a DocToken / DocNode costs, slotted vs the
+#               old __dict__ dataclasses
+#
+#   \license    MIT
+
+
+from dataclasses import dataclass, field
+import tracemalloc
+import sys
+import io
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import core
+
+
+@dataclass(init=True)
+class DictDocToken:
+    """
+    DocToken the way it was before __slots__
+    """
+
+    type: core.DocNodeType
+    value: str
+
+
+@dataclass(init=True)
+class DictDocNode(object):
+    """
+    DocNode the way it was before __slots__, every node owns a list
+    """
+
+    type: core.DocNodeType
+    successors: list = field(default=None)
+    depth: int = field(default=1)
+    ordered: bool = True
+    text: str = ""
+    indent: int = 0
+
+    def __post_init__(self):
+        if not bool(self.successors):
+            self.successors = []
+
+        if not bool(self.ordered):
+            self.ordered = True
+
+        if not bool(self.text):
+            self.text = ""
+
+
+def make_document(lines: int) -> str:
+    """
+        a page that is mostly headings, list items and paragraphs
+    """
+    body = []
+
+    for idx in range(lines):
+        kind = idx % 10
+
+        if kind == 0:
+            body.append(f"## heading number {idx}")
+        elif kind < 5:
+            body.append(f"{kind}. list item {idx}")
+        else:
+            body.append(f"paragraph text for line {idx}")
+
+    return "\n".join(body) + "\n"
+
+
+def measure(source: str, token_type, node_type) -> tuple:
+    """
+        lex and build the IR with the given classes swapped into core
+    returns
+        (tokens, token bytes, nodes, node bytes)
+    """
+    saved = core.DocToken, core.DocNode
+    core.DocToken, core.DocNode = token_type, node_type
+
+    try:
+        tracemalloc.start()
+        lexer = core.PageLexer(io.StringIO(source))
+        tokens = list(lexer.iter_tokens(token_type))
+        token_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # the token values are shared with the IR, only count the nodes
+        tracemalloc.start()
+        parser = core.PageParser(tokens)
+        parser.create_ir()
+        node_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    finally:
+        core.DocToken, core.DocNode = saved
+
+    nodes = 0
+    stack = [parser.tree]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        stack.extend(node.successors)
+
+    return len(tokens), token_bytes, nodes, node_bytes
+
+
+def main(argv: list) -> int:
+    lines = int(argv[0]) if argv else 100_000
+    source = make_document(lines)
+
+    before = measure(source, DictDocToken, DictDocNode)
+    after = measure(source, core.DocToken, core.DocNode)
+
+    print(f"{lines} lines, {before[0]} tokens, {before[2]} nodes")
+    print(f"{'':8}{'token B':>10}{'node B':>10}")
+
+    for name, (tokens, token_bytes, nodes, node_bytes) in (
+        ("dict", before),
+        ("slots", after),
+    ):
+        print(f"{name:8}{token_bytes / tokens:10.1f}{node_bytes / nodes:10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
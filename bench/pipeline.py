@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+#   \title      pipeline.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Time the lexer, the IR builder and the renderer on
+#               synthetic pages, results go to JSON so runs on different
+#               commits can be compared
+#
+#   \license    MIT
+
+
+from concurrent.futures import ProcessPoolExecutor
+import subprocess
+import argparse
+import resource
+import platform
+import time
+import json
+import sys
+import io
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import corpus
+import core
+
+
+PHASES = ("lex", "ir", "render")
+
+
+def best_of(repeat: int, run) -> tuple:
+    """
+        call run() repeat times
+    returns
+        (fastest wall time, what the last call returned)
+    """
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = run()
+        best = min(best, time.perf_counter() - start)
+
+    return best, value
+
+
+def run_case(case: dict) -> dict:
+    """
+        benchmark a single page, runs in its own process so the peak RSS
+        belongs to this case alone
+    """
+    source = corpus.generate(case["size"], case["mix"], case["seed"])
+    repeat = case["repeat"]
+
+    def lex():
+        return core.PageLexer(io.StringIO(source), engine=case["engine"]).lex_page()
+
+    lex_s, tokens = best_of(repeat, lex)
+
+    def build_ir():
+        parser = core.PageParser(tokens)
+        parser.create_ir()
+        return parser
+
+    ir_s, parser = best_of(repeat, build_ir)
+
+    def render():
+        renderer = core.PageParser()
+        renderer.render_nodes(parser.tree.successors)
+        return "".join(renderer.page)
+
+    render_s, html = best_of(repeat, render)
+
+    megabytes = len(source.encode()) / 1e6
+    result = dict(case)
+    result.update(
+        bytes=len(source.encode()),
+        lines=source.count("\n"),
+        tokens=len(tokens),
+        nodes=len(parser.tree.successors),
+        html_bytes=len(html.encode()),
+        lex_s=lex_s,
+        ir_s=ir_s,
+        render_s=render_s,
+        total_s=lex_s + ir_s + render_s,
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+
+    for phase in PHASES + ("total",):
+        result[f"{phase}_mbps"] = megabytes / result[f"{phase}_s"]
+
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: list, baseline=None) -> None:
+    print(
+        f"{'size':>10}{'engine':>8}{'lex MB/s':>10}{'ir MB/s':>10}"
+        f"{'render MB/s':>13}{'total MB/s':>12}{'RSS MB':>9}"
+    )
+
+    def key(result):
+        return result["size"], result["engine"], json.dumps(result["mix"])
+
+    previous = {key(result): result for result in baseline or ()}
+
+    for result in results:
+        print(
+            f"{result['bytes']:>10}{result['engine']:>8}"
+            f"{result['lex_mbps']:10.2f}{result['ir_mbps']:10.2f}"
+            f"{result['render_mbps']:13.2f}{result['total_mbps']:12.2f}"
+            f"{result['peak_rss_kb'] / 1024:9.1f}"
+        )
+
+        old = previous.get(key(result))
+        if old:
+            ratios = "  ".join(
+                f"{phase} x{old[f'{phase}_s'] / result[f'{phase}_s']:.2f}"
+                for phase in PHASES + ("total",)
+            )
+            print(f"{'':>10}{'vs':>8}  {ratios}")
+
+
+def main(argv: list) -> int:
+    args = argparse.ArgumentParser(prog="pipeline.py")
+    args.add_argument(
+        "--sizes", default="64k,1M,4M", help="comma separated page sizes"
+    )
+    args.add_argument("--mix", help="e.g. heading=1,list=3,code=1,paragraph=4")
+    args.add_argument(
+        "--engine", default="fast", choices=("fast", "legacy", "both")
+    )
+    args.add_argument("--repeat", type=int, default=3)
+    args.add_argument("--seed", type=int, default=0)
+    args.add_argument("--json", help="write the results here")
+    args.add_argument("--compare", help="results JSON from an earlier run")
+    opts = args.parse_args(argv)
+
+    mix = corpus.parse_mix(opts.mix) if opts.mix else corpus.DEFAULT_MIX
+    engines = ("fast", "legacy") if opts.engine == "both" else (opts.engine,)
+
+    cases = [
+        {
+            "size": corpus.parse_size(size),
+            "mix": mix,
+            "engine": engine,
+            "seed": opts.seed,
+            "repeat": opts.repeat,
+        }
+        for size in opts.sizes.split(",")
+        for engine in engines
+    ]
+
+    # a fresh process per case so ru_maxrss is not carried over
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_case, case).result())
+
+    baseline = None
+    if opts.compare:
+        with open(opts.compare, "r") as fd:
+            baseline = json.load(fd)["results"]
+
+    print_results(results, baseline)
+
+    if opts.json:
+        with open(opts.json, "w") as fd:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "version": core.__version__,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                fd,
+                indent=1,
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+#   \title      assets.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Fingerprinted copies of the stylesheet and the local files
+#               pages link to, so they can be cached forever
+#
+#   \license    MIT
+
+
+from urllib.parse import quote, unquote, urlsplit
+import posixpath
+import hashlib
+import shutil
+import re
+import os
+
+
+# the stylesheet every page links to
+STYLESHEET = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "styles", "skeleton.css"
+)
+
+# where the stylesheet goes in the output directory
+STYLES_DIR = "styles"
+
+# hex digits of the content hash that go into a fingerprinted name
+DIGEST_SIZE = 12
+
+# links that do not point at a file of the site, a scheme, //host or #anchor
+REMOTE = re.compile(r"(?:[A-Za-z][A-Za-z0-9+.-]*:|//|#|$)")
+
+# links to other pages are links to their html, not assets
+PAGE_SUFFIXES = (".md", ".html")
+
+# static hosts (netlify, cloudflare pages) read the response headers of the
+# site from this file in its root
+HEADERS_NAME = "_headers"
+
+# a fingerprinted file never changes under its name
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class AssetHashes(object):
+    """
+    Content hashes of files, kept with their stat so a file that did not
+    change is not read again
+    known       absolute path -> [mtime_ns, size, inode, digest], this is
+                what the build manifest saves between builds
+    """
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def digest(self, path: str) -> str:
+        """
+            the fingerprint of path, read only if its stat changed
+        raises
+            OSError     path cannot be read
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+        entry = self.known.get(path)
+        if entry and entry[:3] == signature:
+            return entry[3]
+
+        with open(path, "rb") as fd:
+            digest = hashlib.sha256(fd.read()).hexdigest()[:DIGEST_SIZE]
+
+        self.known[path] = signature + [digest]
+
+        return digest
+
+    def prune(self, paths) -> None:
+        """
+            forget every file but paths, so deleted files do not pile up
+        """
+        keep = set(map(os.path.abspath, paths))
+        self.known = {path: entry for path, entry in self.known.items() if path in keep}
+
+
+def fingerprinted(name: str, digest: str) -> str:
+    """
+        skeleton.css -> skeleton.<digest>.css
+    """
+    root, ext = os.path.splitext(name)
+
+    return f"{root}.{digest}{ext}"
+
+
+def publish(source: str, target: str) -> bool:
+    """
+        copy source to target, which has the hash of source in its name, so
+        if it is there already it is the same file and is left alone
+    returns
+        bool    whether it was copied
+    """
+    if os.path.exists(target):
+        return False
+
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+
+    # copy then rename, workers publishing the same file never see half of it
+    shutil.copyfile(source, f"{target}.{os.getpid()}.tmp")
+    os.replace(f"{target}.{os.getpid()}.tmp", target)
+
+    return True
+
+
+def publish_stylesheet(out_dir: str, hashes: AssetHashes, stylesheet=STYLESHEET) -> str:
+    """
+        put the stylesheet in out_dir under its fingerprinted name
+    returns
+        str     its url relative to the root of out_dir
+    """
+    name = fingerprinted(os.path.basename(stylesheet), hashes.digest(stylesheet))
+    publish(stylesheet, os.path.join(out_dir, STYLES_DIR, name))
+
+    return f"{STYLES_DIR}/{name}"
+
+
+def hash_assets(src_dir: str, hashes: AssetHashes, out_dir=None) -> dict:
+    """
+        fingerprint every file under src_dir a page could link to
+    args
+        out_dir     left out when it sits inside src_dir
+    returns
+        dict        path relative to src_dir -> digest
+    """
+    digests = {}
+    skip = os.path.abspath(out_dir) if out_dir else None
+
+    for root, dirs, files in os.walk(src_dir):
+        dirs[:] = [
+            name
+            for name in dirs
+            if not name.startswith(".")
+            and os.path.abspath(os.path.join(root, name)) != skip
+        ]
+
+        for name in files:
+            if name.startswith(".") or name.endswith(PAGE_SUFFIXES):
+                continue
+
+            path = os.path.join(root, name)
+            try:
+                digests[os.path.relpath(path, src_dir)] = hashes.digest(path)
+            except OSError:
+                # removed or unreadable, a link to it is left as it is
+                continue
+
+    return digests
+
+
+def asset_target(out_dir: str, path: str, digest: str) -> str:
+    """
+        where the copy of the asset at path, relative to src_dir, goes
+    """
+    directory, name = os.path.split(path)
+
+    return os.path.join(out_dir, directory, fingerprinted(name, digest))
+
+
+class PageAssets(object):
+    """
+    Points the links of one page at fingerprinted copies of the files they
+    link to, and copies the files over as they are linked, see PageParser
+    src_dir     directory the pages and assets are in
+    out_dir     directory the copies go into, next to where the file was
+    page        path of the page relative to src_dir
+    digests     hash_assets() of src_dir
+    used        path -> digest of every asset this page linked to
+    """
+
+    def __init__(self, src_dir: str, out_dir: str, page: str, digests: dict):
+        self.src_dir = src_dir
+        self.out_dir = out_dir
+        self.page = page
+        self.digests = digests
+        self.used = {}
+
+    def url(self, href: str) -> str:
+        """
+            the url to write for a link to href, href itself for anything that
+            is not a local file
+        """
+        if REMOTE.match(href):
+            return href
+
+        parts = urlsplit(href)
+        if parts.path.startswith("/"):
+            return href
+
+        page_dir = posixpath.dirname(self.page.replace(os.sep, "/"))
+        path = posixpath.normpath(posixpath.join(page_dir, unquote(parts.path)))
+        path = path.replace("/", os.sep)
+
+        digest = self.digests.get(path)
+        if digest is None:
+            return href
+
+        publish(
+            os.path.join(self.src_dir, path), asset_target(self.out_dir, path, digest)
+        )
+        self.used[path] = digest
+
+        head, _, name = parts.path.rpartition("/")
+        name = quote(fingerprinted(unquote(name), digest))
+
+        return parts._replace(path=f"{head}/{name}" if head else name).geturl()
+
+
+def headers_file(urls: list) -> str:
+    """
+        a _headers file marking every url immutable
+    args
+        urls    urls of fingerprinted files, relative to the root of the site
+    """
+    rules = [
+        f"/{quote(url)}\n  Cache-Control: {IMMUTABLE}\n" for url in sorted(set(urls))
+    ]
+
+    return "".join(rules)
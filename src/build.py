@@ -0,0 +1,869 @@
+#!/usr/bin/env python3
+
+#   \title      build.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Compile a whole tree of markdown pages in one go
+#
+#   \license    MIT
+
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+import argparse
+import hashlib
+import json
+import time
+import sys
+import os
+
+import siteindex
+import template
+import assets
+import ircache
+import minify
+import core
+
+
+# the build manifest, kept in the output directory
+CACHE_NAME = ".pquill-cache.json"
+
+# what write_site_index() reads of a manifest entry, a rebuild that leaves
+# all of these alone does not need the index written again
+INDEXED = ("outline", "meta", "assets")
+
+
+@dataclass(init=True)
+class PageResult:
+    """
+    What happened to a single page in a batch build
+    args
+        source      path to the markdown file
+        target      path to the html file
+        seconds     wall time spent compiling the page
+        error       why the page failed, None if it compiled
+        cached      the page was skipped because the manifest said so
+        written     the html on disk changed
+        digest      hash of the html that was produced
+        outline     PageOutline.as_dict() of the page, for the site index
+        diagnostics what the lexer had to skip over, "line:column: message"
+        assets      path -> digest of every local file the page links to
+        meta        PageMeta of the page as a dict, a draft is not written
+    """
+
+    source: str
+    target: str
+    seconds: float = 0.0
+    error: str = None
+    cached: bool = False
+    written: bool = False
+    digest: str = None
+    outline: dict = None
+    diagnostics: list = field(default_factory=list)
+    assets: dict = field(default_factory=dict)
+    meta: dict = None
+
+
+@dataclass(init=True)
+class BuildManifest:
+    """
+    What the last build produced, so the next one can skip unchanged pages
+    args
+        fingerprint     hash over everything besides the page that affects output
+        pages           page -> {"source": hash, "output": hash,
+                                 "outline": PageOutline.as_dict(),
+                                 "diagnostics": [str(PageLexerError)],
+                                 "assets": PageResult.assets,
+                                 "meta": PageResult.meta}
+        assets          AssetHashes.known, kept when the fingerprint changes
+                        since a file hashes the same whatever the settings
+    """
+
+    fingerprint: str = None
+    pages: dict = field(default_factory=dict)
+    assets: dict = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "BuildManifest":
+        """
+            read a manifest, a missing or unreadable one is just an empty cache
+        """
+        try:
+            with open(path, "r") as fd:
+                data = json.load(fd)
+
+            return cls(data["fingerprint"], data["pages"], data.get("assets", {}))
+
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls()
+
+    def save(self, path: str, settings: dict) -> None:
+        data = dict(
+            settings, fingerprint=self.fingerprint, pages=self.pages, assets=self.assets
+        )
+
+        # write then rename so a killed build never leaves half a manifest
+        with open(path + ".tmp", "w") as fd:
+            json.dump(data, fd, indent=1, sort_keys=True)
+
+        os.replace(path + ".tmp", path)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as fd:
+        return hash_bytes(fd.read())
+
+
+def compiler_digest() -> str:
+    """
+        hash over the compiler sources, so hacking on pquill invalidates
+        the cache even without a version bump
+    """
+    digest = hashlib.sha256()
+    src_dir = os.path.dirname(os.path.abspath(core.__file__))
+
+    for name in sorted(os.listdir(src_dir)):
+        if name.endswith(".py"):
+            digest.update(hash_file(os.path.join(src_dir, name)).encode())
+
+    return digest.hexdigest()
+
+
+def build_settings(
+    engine: str, layout=None, minify_html=False, gzip_level=None, stylesheet=None
+) -> dict:
+    """
+        everything outside of a page that changes the html it turns into,
+        or the files written for it. stylesheet is the fingerprinted one the
+        pages link to, so a change to it goes into every page
+    """
+    return {
+        "version": core.__version__,
+        "compiler": compiler_digest(),
+        "stylesheet": stylesheet or core.STYLESHEET,
+        "layout": hash_file(layout or template.DEFAULT_LAYOUT),
+        "options": {"engine": engine, "minify": minify_html, "gzip": gzip_level},
+    }
+
+
+def fingerprint(settings: dict) -> str:
+    return hash_bytes(json.dumps(settings, sort_keys=True).encode())
+
+
+def is_page(name: str) -> bool:
+    """
+        editors drop swap and backup files next to the page while saving,
+        only real markdown files count
+    """
+    return name.endswith(".md") and not name.startswith((".", "#", "~"))
+
+
+def walk_pages(src_dir: str):
+    """
+        every page under src_dir, what build and watch both go by. hidden
+        directories like .git are not looked in
+    yields
+        str     path of the page
+    """
+    for root, dirs, files in os.walk(src_dir):
+        dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+
+        for name in files:
+            if is_page(name):
+                yield os.path.join(root, name)
+
+
+def find_pages(src_dir: str) -> list:
+    """
+        walk src_dir for markdown pages
+    returns
+        list    paths relative to src_dir, sorted so builds are repeatable
+    """
+    return sorted(os.path.relpath(path, src_dir) for path in walk_pages(src_dir))
+
+
+def target_for(page: str, out_dir: str) -> str:
+    """
+        where a page ends up, the directory layout of the source is kept
+    """
+    return os.path.join(out_dir, os.path.splitext(page)[0] + ".html")
+
+
+def page_slots(page: str, stylesheet=core.STYLESHEET) -> dict:
+    """
+        layout slots that depend on where the page sits in the tree,
+        the stylesheet link has to climb out of every directory it is in
+    """
+    return {
+        "stylesheet": "../" * page.count(os.sep) + stylesheet,
+        "title": core.page_title(page),
+    }
+
+
+def assets_current(entry: dict, digests: dict, out_dir: str) -> bool:
+    """
+        whether every file a page links to still has the hash its html links
+        to, and the fingerprinted copy is still in out_dir
+    """
+    for path, digest in entry.get("assets", {}).items():
+        if digests.get(path) != digest:
+            return False
+        if not os.path.exists(assets.asset_target(out_dir, path, digest)):
+            return False
+
+    return True
+
+
+def compile_one(
+    source: str,
+    target: str,
+    engine: str,
+    layout=None,
+    slots=None,
+    ir_cache=None,
+    minify_html=False,
+    gzip_level=None,
+    page_assets=None,
+) -> PageResult:
+    """
+        compile a single page, any failure is caught and reported back
+        so one broken page does not take the rest of the build down
+    args
+        layout      path to the layout, parsed once per process by load_layout()
+        slots       see page_slots()
+        ir_cache    directory to keep the IR of every page in, so a page that
+                    has to be written again without its source changing, say
+                    for a new layout, is only rendered
+        minify_html collapse insignificant whitespace, see minify.minify()
+        gzip_level  zlib level to write a gzipped copy at, None for no copy
+        page_assets assets.PageAssets of the page, links to local files are
+                    pointed at fingerprinted copies and the files copied over
+    """
+    result = PageResult(source, target)
+    start = time.perf_counter()
+
+    try:
+        page_layout = template.load_layout(layout)
+        outline = core.PageOutline(index=True)
+        errors = []
+        meta = core.PageMeta()
+
+        if ir_cache is None:
+            html = core.compile_page(
+                source, engine, page_layout, slots, outline, errors, page_assets, meta
+            )
+        else:
+            html = ircache.compile_page(
+                source,
+                ir_cache,
+                engine,
+                page_layout,
+                slots,
+                outline,
+                errors,
+                page_assets,
+                meta,
+            )
+        if minify_html:
+            html = minify.minify(html)
+        html = html.encode()
+
+        result.outline = outline.as_dict()
+        result.diagnostics = [str(error) for error in errors]
+        result.assets = page_assets.used if page_assets else {}
+        result.meta = asdict(meta)
+        result.digest = hash_bytes(html)
+
+        # a draft is compiled so its diagnostics show, but it is not published
+        if meta.draft:
+            remove_output(target)
+        else:
+            result.written = write_output(target, html, gzip_level)
+
+    except Exception as err:
+        result.error = f"{type(err).__name__}: {err}"
+
+    result.seconds = time.perf_counter() - start
+
+    return result
+
+
+def write_if_changed(target: str, data: bytes) -> bool:
+    """
+        only touch target when its contents would actually change
+    returns
+        bool    whether the file was written
+    """
+    try:
+        with open(target, "rb") as fd:
+            if fd.read() == data:
+                return False
+
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+
+    with open(target, "wb") as fd:
+        fd.write(data)
+
+    return True
+
+
+def remove_output(target: str) -> None:
+    """
+        delete the html of a page and the .gz next to it, whichever are there
+    """
+    for path in (target, target + ".gz"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_output(target: str, data: bytes, gzip_level=None) -> bool:
+    """
+        write_if_changed() for a file of the site, with target.gz next to it
+        when gzip_level is set, and no stale one left behind when it is not
+    returns
+        bool    whether target was written
+    """
+    if gzip_level is not None:
+        write_if_changed(target + ".gz", minify.gzip_bytes(data, gzip_level))
+    elif os.path.exists(target + ".gz"):
+        os.remove(target + ".gz")
+
+    return write_if_changed(target, data)
+
+
+def write_site_index(
+    out_dir: str,
+    manifest: BuildManifest,
+    layout=None,
+    minify_html=False,
+    gzip_level=None,
+    stylesheet=None,
+    site_url=None,
+) -> None:
+    """
+        write the page listing, the search index and the tag pages out of the
+        outlines and front matter the manifest holds, and with site_url the
+        feed and sitemap too. pages that did not change are not parsed again
+        for any of this, and drafts are left out of all of it. with a
+        fingerprinted stylesheet the _headers file that marks it and the
+        assets of every page immutable goes with them
+    """
+    published = {
+        page: entry
+        for page, entry in manifest.pages.items()
+        if entry.get("outline") is not None
+        and not (entry.get("meta") or {}).get("draft")
+    }
+    outlines = {page: entry["outline"] for page, entry in published.items()}
+    metas = {page: entry.get("meta") or {} for page, entry in published.items()}
+
+    page_layout = template.load_layout(layout)
+    slots = {"stylesheet": stylesheet} if stylesheet else None
+
+    # url relative to the top of the site -> the page it is for, or None
+    urls = {siteindex.page_url(page): page for page in outlines}
+
+    def write_page(url: str, html: str) -> None:
+        if minify_html:
+            html = minify.minify(html)
+
+        target = os.path.join(out_dir, *url.split("/"))
+        write_output(target, html.encode(), gzip_level)
+
+    # a page of its own called index wins over the generated one
+    if siteindex.SITE_INDEX not in urls:
+        write_page(
+            siteindex.SITE_INDEX,
+            siteindex.index_page(outlines, page_layout, slots, metas),
+        )
+        urls[siteindex.SITE_INDEX] = None
+
+    search = siteindex.search_json(outlines, metas).encode()
+    write_output(os.path.join(out_dir, siteindex.SEARCH_INDEX), search, gzip_level)
+
+    tag_slots = {"stylesheet": "../" + stylesheet} if stylesheet else None
+    tags = siteindex.tagged(metas)
+    for tag, pages in tags.items():
+        url = siteindex.tag_url(tag)
+        if url in urls:
+            # a page of that name, or two tags that slug the same
+            continue
+
+        write_page(
+            url, siteindex.tag_page(tag, pages, outlines, metas, page_layout, tag_slots)
+        )
+        urls[url] = None
+
+    remove_stale_tags(out_dir, set(urls) | set(map(siteindex.page_url, manifest.pages)))
+
+    if site_url:
+        feed = siteindex.feed_xml(outlines, metas, site_url).encode()
+        write_output(os.path.join(out_dir, siteindex.FEED), feed, gzip_level)
+
+        sitemap = siteindex.sitemap_xml(list(urls.items()), metas, site_url).encode()
+        write_output(os.path.join(out_dir, siteindex.SITEMAP), sitemap, gzip_level)
+
+    if stylesheet:
+        fingerprinted = [stylesheet]
+        for entry in manifest.pages.values():
+            for path, digest in entry.get("assets", {}).items():
+                target = assets.asset_target(out_dir, path, digest)
+                fingerprinted.append(
+                    os.path.relpath(target, out_dir).replace(os.sep, "/")
+                )
+
+        headers = assets.headers_file(fingerprinted).encode()
+        write_if_changed(os.path.join(out_dir, assets.HEADERS_NAME), headers)
+
+
+def remove_stale_tags(out_dir: str, urls: set) -> None:
+    """
+        remove the pages of tags no page has any more
+    args
+        urls    everything the site has in it, relative to the top
+    """
+    tags_dir = os.path.join(out_dir, siteindex.TAGS_DIR)
+    if not os.path.isdir(tags_dir):
+        return
+
+    for name in os.listdir(tags_dir):
+        url = f"{siteindex.TAGS_DIR}/{name.removesuffix('.gz')}"
+
+        if url.endswith(".html") and url not in urls:
+            os.remove(os.path.join(tags_dir, name))
+
+
+def build_site(
+    src_dir: str,
+    out_dir: str,
+    jobs=None,
+    engine="fast",
+    use_cache=True,
+    layout=None,
+    ir_cache=None,
+    minify_html=False,
+    gzip_level=None,
+    site_url=None,
+) -> list:
+    """
+        compile every page under src_dir into out_dir
+    args
+        src_dir     directory to look for .md files in
+        out_dir     directory the html is written to
+        jobs        worker processes, 1 compiles in this process
+        engine      which PageLexer engine to use
+        use_cache   skip pages the build manifest says are up to date
+        layout      layout file to wrap every page in, None for the default
+        ir_cache    directory to cache the IR of pages in, see compile_one()
+        minify_html collapse insignificant whitespace in every page
+        gzip_level  write a gzipped copy of every file at this zlib level,
+                    the pages are compressed in the workers that render them
+        site_url    where the site is served, feed.xml and sitemap.xml are
+                    only written when it is known
+    returns
+        list        PageResult for every page, in source order
+    """
+    cache_path = os.path.join(out_dir, CACHE_NAME)
+
+    # the pages of the last build, cache or not, so the html of a page whose
+    # source is gone goes with it
+    previous = BuildManifest.load(cache_path)
+    manifest = previous if use_cache else BuildManifest()
+
+    # only files whose stat changed since the last build are read to hash them
+    hashes = assets.AssetHashes(manifest.assets)
+    stylesheet = assets.publish_stylesheet(out_dir, hashes)
+    digests = assets.hash_assets(src_dir, hashes, out_dir)
+
+    settings = build_settings(engine, layout, minify_html, gzip_level, stylesheet)
+    if manifest.fingerprint != fingerprint(settings):
+        manifest = BuildManifest(fingerprint(settings), assets=manifest.assets)
+
+    results = {}
+    stale = []
+    pages = find_pages(src_dir)
+
+    for page in previous.pages.keys() - set(pages):
+        remove_output(target_for(page, out_dir))
+
+    for page in pages:
+        source = os.path.join(src_dir, page)
+        target = target_for(page, out_dir)
+        digest = hash_file(source)
+
+        entry = manifest.pages.get(page)
+        # diagnostics are kept with the page, so every build reports all of them
+        # a draft has no html, so not finding any is no reason to build it
+        draft = entry and (entry.get("meta") or {}).get("draft")
+        if (
+            entry
+            and entry["source"] == digest
+            and (draft or os.path.exists(target))
+            and assets_current(entry, digests, out_dir)
+        ):
+            diagnostics = entry.get("diagnostics", [])
+            results[page] = PageResult(
+                source, target, cached=True, diagnostics=diagnostics
+            )
+            continue
+
+        manifest.pages[page] = {"source": digest, "output": None}
+        stale.append(page)
+
+    sources = [os.path.join(src_dir, page) for page in stale]
+    targets = [target_for(page, out_dir) for page in stale]
+    engines = [engine] * len(stale)
+    layouts = [layout] * len(stale)
+    slots = [page_slots(page, stylesheet) for page in stale]
+    ir_caches = [ir_cache] * len(stale)
+    options = (
+        sources,
+        targets,
+        engines,
+        layouts,
+        slots,
+        ir_caches,
+        [minify_html] * len(stale),
+        [gzip_level] * len(stale),
+        [assets.PageAssets(src_dir, out_dir, page, digests) for page in stale],
+    )
+
+    if jobs == 1 or len(stale) < 2:
+        results.update(zip(stale, map(compile_one, *options)))
+    else:
+        # workers get the layout path, each one parses it on its first page
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results.update(zip(stale, pool.map(compile_one, *options)))
+
+    # pages that failed or disappeared get compiled again next time
+    for page in list(manifest.pages):
+        result = results.get(page)
+
+        if result is None or result.error:
+            del manifest.pages[page]
+        elif not result.cached:
+            manifest.pages[page]["output"] = result.digest
+            manifest.pages[page]["outline"] = result.outline
+            manifest.pages[page]["diagnostics"] = result.diagnostics
+            manifest.pages[page]["assets"] = result.assets
+            manifest.pages[page]["meta"] = result.meta
+
+    hashes.prune([assets.STYLESHEET] + [os.path.join(src_dir, p) for p in digests])
+    manifest.assets = hashes.known
+
+    os.makedirs(out_dir, exist_ok=True)
+    write_site_index(
+        out_dir, manifest, layout, minify_html, gzip_level, stylesheet, site_url
+    )
+    manifest.save(cache_path, settings)
+
+    return [results[page] for page in sorted(results)]
+
+
+def print_summary(results: list, seconds: float, out=sys.stdout) -> None:
+    failed = [result for result in results if result.error]
+    hits = sum(result.cached for result in results)
+    written = sum(result.written for result in results)
+
+    for result in results:
+        status = "FAIL" if result.error else "hit" if result.cached else "ok"
+        if status == "ok" and (result.meta or {}).get("draft"):
+            status = "draft"
+        print(f"{result.seconds * 1000:9.2f}ms  {status:4}  {result.source}", file=out)
+
+    for result in results:
+        for diagnostic in result.diagnostics:
+            print(f"{result.source}:{diagnostic}", file=out)
+
+    for result in failed:
+        print(f"error: {result.source}: {result.error}", file=out)
+
+    print(
+        f"{len(results)} pages, {len(results) - len(failed)} compiled, "
+        f"{len(failed)} failed in {seconds:.3f}s",
+        file=out,
+    )
+    print(
+        f"cache: {hits} hit, {len(results) - hits} missed, {written} written",
+        file=out,
+    )
+
+    diagnostics = sum(len(result.diagnostics) for result in results)
+    if diagnostics:
+        print(f"{diagnostics} diagnostics", file=out)
+
+
+def snapshot(src_dir: str) -> dict:
+    """
+        stat every page under src_dir
+    returns
+        dict    page -> (mtime_ns, size, inode), a rename over the page
+                changes the inode even if the mtime does not move
+    """
+    pages = {}
+
+    for path in walk_pages(src_dir):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # renamed away between listing and stat
+            continue
+
+        pages[os.path.relpath(path, src_dir)] = (
+            stat.st_mtime_ns,
+            stat.st_size,
+            stat.st_ino,
+        )
+
+    return pages
+
+
+def watch_site(
+    src_dir: str,
+    out_dir: str,
+    interval=0.025,
+    debounce=0.03,
+    engine="fast",
+    layout=None,
+    ir_cache=None,
+    minify_html=False,
+    gzip_level=None,
+    site_url=None,
+) -> None:
+    """
+        keep out_dir in sync with src_dir until interrupted
+    args
+        src_dir     directory to look for .md files in
+        out_dir     directory the html is written to
+        interval    seconds between two stat polls
+        debounce    a page has to stay unchanged this long before it is rebuilt,
+                    so editors that write in several steps only cost one build
+        engine      which PageLexer engine to use
+        layout      layout file to wrap every page in, None for the default
+        ir_cache    directory to cache the IR of pages in, see compile_one()
+        minify_html collapse insignificant whitespace in every page
+        gzip_level  write a gzipped copy of every file at this zlib level
+        site_url    where the site is served, for feed.xml and sitemap.xml
+    """
+    # taken before the first build, a page saved while it runs is built again
+    known = snapshot(src_dir)
+
+    start = time.perf_counter()
+    results = build_site(
+        src_dir,
+        out_dir,
+        engine=engine,
+        layout=layout,
+        ir_cache=ir_cache,
+        minify_html=minify_html,
+        gzip_level=gzip_level,
+        site_url=site_url,
+    )
+    print_summary(results, time.perf_counter() - start)
+    print(f"watching {src_dir} (every {interval * 1000:.0f}ms)", flush=True)
+
+    # kept up to date as pages are rebuilt, so the site index follows along
+    cache_path = os.path.join(out_dir, CACHE_NAME)
+    manifest = BuildManifest.load(cache_path)
+    hashes = assets.AssetHashes(manifest.assets)
+    stylesheet = assets.publish_stylesheet(out_dir, hashes)
+    settings = build_settings(engine, layout, minify_html, gzip_level, stylesheet)
+
+    pending = {}
+
+    # the manifest is saved once the watch stops, if it never is the next
+    # build only compiles the pages that were rebuilt here again
+    try:
+        while True:
+            time.sleep(interval)
+
+            now = time.monotonic()
+            current = snapshot(src_dir)
+
+            # every new signature restarts the debounce window for that page
+            for page, signature in current.items():
+                if known.get(page) == signature:
+                    continue
+
+                if pending.get(page, (None,))[0] != signature:
+                    pending[page] = (signature, now)
+
+            # the site index is written once for everything this poll changed
+            indexed = False
+
+            for page in known.keys() - current.keys():
+                del known[page]
+                manifest.pages.pop(page, None)
+                remove_output(target_for(page, out_dir))
+                indexed = True
+                print(f"removed {page}", flush=True)
+
+            for page, (signature, seen) in list(pending.items()):
+                if now - seen < debounce:
+                    continue
+
+                del pending[page]
+
+                # it moved again or went away while we were waiting
+                if current.get(page) != signature:
+                    continue
+
+                known[page] = signature
+
+                # an image can be dropped in next to the page just before it
+                digests = assets.hash_assets(src_dir, hashes, out_dir)
+
+                result = compile_one(
+                    os.path.join(src_dir, page),
+                    target_for(page, out_dir),
+                    engine,
+                    layout,
+                    page_slots(page, stylesheet),
+                    ir_cache,
+                    minify_html,
+                    gzip_level,
+                    assets.PageAssets(src_dir, out_dir, page, digests),
+                )
+                lag = time.time() - signature[0] / 1e9
+
+                if result.error:
+                    print(f"error: {page}: {result.error}", flush=True)
+                    continue
+
+                entry = manifest.pages.get(page, {})
+                manifest.pages[page] = {
+                    "source": hash_file(os.path.join(src_dir, page)),
+                    "output": result.digest,
+                    "outline": result.outline,
+                    "diagnostics": result.diagnostics,
+                    "assets": result.assets,
+                    "meta": result.meta,
+                }
+                manifest.assets = hashes.known
+
+                # a save that only moves words around leaves the index alone
+                if any(entry.get(key) != manifest.pages[page][key] for key in INDEXED):
+                    indexed = True
+
+                for diagnostic in result.diagnostics:
+                    print(f"{result.source}:{diagnostic}", flush=True)
+
+                print(
+                    f"rebuilt {page} in {result.seconds * 1000:.2f}ms "
+                    f"({lag * 1000:.0f}ms after save)",
+                    flush=True,
+                )
+
+            if indexed:
+                write_site_index(
+                    out_dir,
+                    manifest,
+                    layout,
+                    minify_html,
+                    gzip_level,
+                    stylesheet,
+                    site_url,
+                )
+
+    finally:
+        manifest.save(cache_path, settings)
+
+
+def main(argv: list) -> int:
+    args = argparse.ArgumentParser(prog="core.py")
+    commands = args.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="compile a directory of pages")
+    build.add_argument("src_dir")
+    build.add_argument("out_dir")
+    build.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    build.add_argument("--legacy-lexer", action="store_true")
+    build.add_argument("--layout", help="layout file to wrap pages in")
+    build.add_argument(
+        "--force", action="store_true", help="ignore the build manifest"
+    )
+    build.add_argument("--ir-cache", help="directory to cache the IR of pages in")
+    build.add_argument(
+        "--minify", action="store_true", help="collapse whitespace outside <pre>"
+    )
+    build.add_argument(
+        "--gzip",
+        type=int,
+        metavar="LEVEL",
+        help="also write a .gz of every file at this zlib level (1-9)",
+    )
+    build.add_argument(
+        "--site-url", help="where the site is served, for feed.xml and sitemap.xml"
+    )
+
+    watch = commands.add_parser("watch", help="rebuild pages as they are saved")
+    watch.add_argument("src_dir")
+    watch.add_argument("out_dir")
+    watch.add_argument("--interval", type=float, default=0.025)
+    watch.add_argument("--debounce", type=float, default=0.03)
+    watch.add_argument("--legacy-lexer", action="store_true")
+    watch.add_argument("--layout", help="layout file to wrap pages in")
+    watch.add_argument("--ir-cache", help="directory to cache the IR of pages in")
+    watch.add_argument(
+        "--minify", action="store_true", help="collapse whitespace outside <pre>"
+    )
+    watch.add_argument(
+        "--gzip",
+        type=int,
+        metavar="LEVEL",
+        help="also write a .gz of every file at this zlib level (1-9)",
+    )
+    watch.add_argument(
+        "--site-url", help="where the site is served, for feed.xml and sitemap.xml"
+    )
+
+    opts = args.parse_args(argv)
+    engine = "legacy" if opts.legacy_lexer else "fast"
+
+    if opts.command == "watch":
+        try:
+            watch_site(
+                opts.src_dir,
+                opts.out_dir,
+                opts.interval,
+                opts.debounce,
+                engine,
+                opts.layout,
+                opts.ir_cache,
+                opts.minify,
+                opts.gzip,
+                opts.site_url,
+            )
+        except KeyboardInterrupt:
+            pass
+
+        return 0
+
+    start = time.perf_counter()
+    results = build_site(
+        opts.src_dir,
+        opts.out_dir,
+        opts.jobs,
+        engine,
+        use_cache=not opts.force,
+        layout=opts.layout,
+        ir_cache=opts.ir_cache,
+        minify_html=opts.minify,
+        gzip_level=opts.gzip,
+        site_url=opts.site_url,
+    )
+    print_summary(results, time.perf_counter() - start)
+
+    failed = any(result.error or result.diagnostics for result in results)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+#   \title      client.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Compile a page through a running compile server, a drop in
+#               for core.py <in> <out> in editors and pre-commit hooks
+#
+#   \license    MIT
+
+
+# only the standard library is imported here, the whole point is to not pay
+# for loading the compiler on every call
+import json
+import os
+import socket
+import sys
+
+
+def socket_path() -> str:
+    """
+        where the server listens, $PQUILL_SOCKET or a per user socket in
+        $TMPDIR, tempfile.gettempdir() would cost more than the compile
+    """
+    return os.environ.get("PQUILL_SOCKET") or os.path.join(
+        os.environ.get("TMPDIR", "/tmp"), f"pquill-{os.getuid()}.sock"
+    )
+
+
+def encode(message: dict) -> bytes:
+    """
+        one message per line, json never puts a raw newline inside a string
+    """
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def request(message: dict, path=None) -> dict:
+    """
+        send a single request and wait for its reply
+    args
+        message     {"path": ...} or {"text": ...}, see server.compile_request
+        path        the socket, None for socket_path()
+    returns
+        dict        the reply
+    raises
+        OSError     when there is no server listening
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path or socket_path())
+        sock.sendall(encode(message))
+
+        with sock.makefile("rb") as replies:
+            line = replies.readline()
+
+    if not line:
+        raise ConnectionError("the server hung up without a reply")
+
+    return json.loads(line)
+
+
+def option(argv: list, name: str) -> str:
+    # the value after --name, None when it is not there
+    if name in argv:
+        return argv[argv.index(name) + 1]
+
+    return None
+
+
+def compile_locally(argv: list) -> None:
+    """
+        no server, hand the page to core.py the slow way
+    """
+    core = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core.py")
+
+    sys.stdout.flush()
+    os.execv(sys.executable, [sys.executable, core] + argv)
+
+
+def main(argv: list) -> int:
+    # client.py <source> <target> [--socket <path>] [--layout <file>]
+    #           [--legacy-lexer] [--no-fallback]
+    # a source of - reads stdin, a target of - writes stdout
+    if len(argv) < 2:
+        print("usage: client.py <source> <target> [options]", file=sys.stderr)
+        return 2
+
+    source, target = argv[:2]
+    layout = option(argv, "--layout")
+
+    message = {"engine": "legacy" if "--legacy-lexer" in argv else "fast"}
+    if source == "-":
+        message["text"] = sys.stdin.read()
+    else:
+        message["path"] = os.path.abspath(source)
+    if layout:
+        message["layout"] = os.path.abspath(layout)
+
+    try:
+        reply = request(message, option(argv, "--socket"))
+
+    except (FileNotFoundError, ConnectionRefusedError) as error:
+        # core.py cannot read stdin, so piped pages need the server
+        if "--no-fallback" in argv or source == "-":
+            print(f"client.py: no compile server: {error}", file=sys.stderr)
+            return 2
+
+        fallback = [source, target]
+        if layout:
+            fallback += ["--layout", layout]
+        if "--legacy-lexer" in argv:
+            fallback.append("--legacy-lexer")
+
+        compile_locally(fallback)
+
+    if "error" in reply:
+        print(f"{source}: {reply['error']}", file=sys.stderr)
+        return 1
+
+    if target == "-":
+        sys.stdout.write(reply["html"])
+    else:
+        with open(target, "w") as out:
+            out.write(reply["html"])
+
+    for error in reply["diagnostics"]:
+        print(
+            f"{source}:{error['line']}:{error['column']}: {error['message']}",
+            file=sys.stderr,
+        )
+
+    return 1 if reply["diagnostics"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -9,19 +9,94 @@
 #   \license    MIT
 
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
+from collections import deque
+import multiprocessing
 from enum import Enum
+import datetime
+import heapq
+import json
+import mmap
+import io
+import time
 import sys
+import os
+import re
+
+from escape import SPECIAL, escape_attr, escape_text
+import highlight
+import template
+import minify
+
+
+__version__ = "0.2.0"
+
+# where pages expect to find the stylesheet, relative to the html file
+STYLESHEET = "../styles/skeleton.css"
+
+# how much of the source file the streaming lexer pulls in per read()
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# render_parallel() hands every worker this many chunks on average, so one
+# slow chunk does not hold the rest of the page up
+CHUNKS_PER_JOB = 4
+
+# the PageParser render_parallel() is working on. the workers are forked
+# after it is set and read their chunk of its IR and how it is configured out
+# of here, pickling the IR over to them would cost several times what
+# rendering it does
+_parallel_parser = None
+
+# characters that mean a line might have inline markup in it, or something
+# that has to be escaped
+INLINE_TRIGGER = re.compile(r"[*\[\]`\\&<>]")
+
+# what a backslash can escape inside a line
+INLINE_ESCAPABLE = frozenset("\\`*_[](){}#+-.!<>")
+
+# a list marker, "1." or "-"/"*"/"+" and a space, with the indentation in front
+LIST_MARKER = re.compile(r"[ \t]*(\d+\.|[-*+][ \t])")
+
+# a list_item token split up into indentation, number or bullet, and text
+LIST_ITEM = re.compile(r"([ \t]*)(?:(\d+)\.|[-*+])[ \t]?")
+
+# how many columns a tab indents a list item
+TAB_WIDTH = 4
+
+# heading levels that make it into the table of contents
+TOC_DEPTHS = range(2, 5)
+
+# what gets squashed into a "-" when a heading becomes an id
+SLUG_STRIP = re.compile(r"[\W_]+")
+
+# a word as far as the search index is concerned
+SEARCH_TERM = re.compile(r"\w{2,}")
+
+# characters that can start a token, the fast lexer skips everything else
+# in one search instead of stepping over it a char at a time
+LEX_TRIGGER = re.compile(r"[\n\r]+|[#\\`\d/A-Za-z\t*\[+-]")
+
+# a page option, "\o title: ..." or "\o {...}", see parse_option()
+OPTION = re.compile(r"\\o(?:[ \t{]|$)")
+
+# the same two patterns for lexing the bytes of a mapped source
+LEX_TRIGGER_BYTES = re.compile(LEX_TRIGGER.pattern.encode())
+LIST_MARKER_BYTES = re.compile(LIST_MARKER.pattern.encode())
 
 
 class DocNodeType(Enum):
     list_item_comment = object()
     code_block = object()
     identifier = object()
+    unsafe_text = object()
+    inline_code = object()
     paragraph = object()
     list_item = object()
+    emphasis = object()
     comment = object()
     heading = object()
+    strong = object()
     newline = object()
     anchor = object()
     _list = object()
@@ -30,25 +105,100 @@ class DocNodeType(Enum):
     root = object()
 
 
-class PageLexerError(object):
+@dataclass(init=True, slots=True)
+class PageLexerError:
     """
-        A parser error type
+    Something the lexer could not make sense of, it skips to the next line
+    and carries on, so one page can have any number of these
     args
-        message     Explaining what error the
-        position    position of the cursor
-        line        line where the error occurred
+        message     what went wrong
+        position    offset of the offending char in the source, in bytes when
+                    the source was mapped
+        line        line it is on, counting from 1
+        column      column it is at, counting from 1
     """
 
-    def __init__(self, message: str, position: int, line: int):
-        self.position = position
-        self.message = message
-        self.line = line
+    message: str
+    position: int
+    line: int
+    column: int
 
     def __str__(self):
-        return f"PageLexerError(l{self.line}:c{self.position}): " + self.message
+        return f"{self.line}:{self.column}: {self.message}"
 
 
-@dataclass(init=True)
+@dataclass(init=True, slots=True)
+class PageMeta:
+    """
+    What the \\o options at the top of a page say about it
+    args
+        title   what the page is called, over its first heading and file name
+        date    when it was published, YYYY-MM-DD, dated pages go in the feed
+        tags    what the page is about, every tag gets a page listing its pages
+        draft   the page is compiled but left out of the built site
+    """
+
+    title: str = None
+    date: str = None
+    tags: list = field(default_factory=list)
+    draft: bool = False
+
+
+def parse_option(text: str, meta: PageMeta) -> None:
+    """
+        read what comes after one \\o into meta, either "key: value" or a
+        json object of them
+            \\o title: Writing a compiler
+            \\o tags: python, lexers
+            \\o {"date": "2024-03-01", "draft": true}
+    raises
+        ValueError  the option is not one we know or its value does not fit
+    """
+    text = text.strip()
+
+    if text.startswith("{"):
+        options = json.loads(text)
+        if not isinstance(options, dict):
+            raise ValueError("\\o {...} has to be a json object")
+    else:
+        key, colon, value = text.partition(":")
+        if not colon:
+            raise ValueError(f"\\o expects key: value, not {text!r}")
+        options = {key.strip(): value.strip()}
+
+    for key, value in options.items():
+        if key == "title":
+            meta.title = str(value)
+
+        elif key == "date":
+            try:
+                meta.date = datetime.date.fromisoformat(str(value)).isoformat()
+            except ValueError:
+                raise ValueError(f"date is YYYY-MM-DD, not {value!r}")
+
+        elif key == "tags":
+            tags = value if isinstance(value, list) else str(value).split(",")
+            tags = [str(tag).strip() for tag in tags]
+            # a tag given twice is still one tag, or the page is listed twice
+            meta.tags = list(dict.fromkeys(tag for tag in tags if tag))
+
+        elif key == "draft":
+            if not isinstance(value, bool):
+                if str(value).lower() not in ("true", "false", "yes", "no"):
+                    raise ValueError(f"draft is true or false, not {value!r}")
+                value = str(value).lower() in ("true", "yes")
+            meta.draft = value
+
+        else:
+            raise ValueError(f"unknown option {key!r}")
+
+
+# successors of every leaf, a shared tuple so text nodes do not each carry
+# their own empty list around
+NO_SUCCESSORS = ()
+
+
+@dataclass(init=True, slots=True)
 class DocToken:
     """
     Defining what a parser token looks like
@@ -64,7 +214,7 @@ class DocToken:
         return {"type": str(self.type), "value": self.value}
 
 
-@dataclass(init=True)
+@dataclass(init=True, slots=True)
 class DocNode(object):
     # I dont think that i fucked up the order on this
     type: DocNodeType
@@ -72,16 +222,15 @@ class DocNode(object):
     depth: int = field(default=1)
     ordered: bool = True
     text: str = ""
+    indent: int = 0
 
     def __post_init__(self):
-        assert DocNodeType, "DocnodeType not defined"
-
-        # implement defualts
-        if not bool(self.successors):
-            self.successors = []
-
-        if not bool(self.ordered):
-            self.ordered = True
+        # implement defualts, text nodes never get children
+        if not self.successors:
+            if self.type is DocNodeType.text:
+                self.successors = NO_SUCCESSORS
+            else:
+                self.successors = []
 
         if not bool(self.text):
             self.text = ""
@@ -97,328 +246,1400 @@ class DocNode(object):
             "text": self.text,
             "depth": self.depth,
             "ordered": self.ordered,
+            "indent": self.indent,
+        }
+
+
+@dataclass(init=True)
+class PageStats:
+    """
+    What compiling a page cost, hand one to PageParser to have it filled in
+    args
+        phases          phase name -> seconds spent in it
+        tokens          DocNodeType name -> how many items the lexer produced
+        nodes           DocNodeType name -> IR nodes that were rendered
+        output_bytes    size of the html, utf-8
+        slowest         (seconds, type, html bytes, text) of the slowest blocks
+        keep            how many of the slowest blocks to hold on to
+    """
+
+    phases: dict = field(default_factory=dict)
+    tokens: dict = field(default_factory=dict)
+    nodes: dict = field(default_factory=dict)
+    output_bytes: int = 0
+    slowest: list = field(default_factory=list)
+    keep: int = 5
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def timed(self, name: str, func):
+        """
+            wrap func so the time spent in it goes to the phase name, for
+            work the lexer calls back into like make_node()
+        """
+        phases = self.phases
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            result = func(*args)
+            phases[name] = phases.get(name, 0.0) + clock() - start
+            return result
+
+        return timed
+
+    def count_tokens(self, make_token):
+        """
+            wrap a make_token factory so every item the lexer finds is counted
+        """
+        tokens = self.tokens
+
+        def counted(type: DocNodeType, value: str):
+            tokens[type.name] = tokens.get(type.name, 0) + 1
+            return make_token(type, value)
+
+        return counted
+
+    def count_nodes(self, node: DocNode) -> None:
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+            self.nodes[node.type.name] = self.nodes.get(node.type.name, 0) + 1
+            stack.extend(node.successors)
+
+    def add_block(self, seconds: float, node: DocNode, size: int) -> None:
+        """
+            remember node if it is one of the slowest blocks so far
+        """
+        # the first bit of text under the block, to tell which one it was
+        first = node
+        while first.successors:
+            first = first.successors[0]
+
+        entry = (seconds, node.type.name, size, first.text[:40])
+
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def merge(self, other: "PageStats") -> None:
+        """
+            add in what another PageStats counted, a worker's part of the page
+        """
+        for name, seconds in other.phases.items():
+            self.add_phase(name, seconds)
+
+        for counts, more in ((self.tokens, other.tokens), (self.nodes, other.nodes)):
+            for name, count in more.items():
+                counts[name] = counts.get(name, 0) + count
+
+        self.output_bytes += other.output_bytes
+
+        for entry in other.slowest:
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    def as_dict(self) -> dict:
+        return {
+            "phases": self.phases,
+            "tokens": self.tokens,
+            "nodes": self.nodes,
+            "output_bytes": self.output_bytes,
+            "slowest": [
+                {"seconds": seconds, "type": type, "bytes": size, "text": text}
+                for seconds, type, size, text in sorted(self.slowest, reverse=True)
+            ],
         }
 
+    def __str__(self):
+        lines = ["phases"]
+        for name, seconds in self.phases.items():
+            lines.append(f"  {name:16}{seconds * 1000:10.3f}ms")
+
+        for title, counts in (("tokens", self.tokens), ("nodes", self.nodes)):
+            lines.append(title)
+            for name, count in sorted(counts.items()):
+                lines.append(f"  {name:16}{count:10}")
+
+        lines.append(f"output {self.output_bytes} bytes")
+
+        lines.append("slowest blocks")
+        for seconds, type, size, text in sorted(self.slowest, reverse=True):
+            lines.append(f"  {seconds * 1000:8.3f}ms  {type:12}{size:8}B  {text!r}")
+
+        return "\n".join(lines)
+
+
+def plain_text(nodes: list) -> str:
+    """
+        the text under some inline nodes with the markup left out, walked
+        with a stack of iterators so any depth of nesting is fine
+    """
+    text = []
+    stack = [iter(nodes)]
+
+    while stack:
+        node = next(stack[-1], None)
+
+        if node is None:
+            stack.pop()
+
+        elif node.type in (
+            DocNodeType.text,
+            DocNodeType.unsafe_text,
+            DocNodeType.inline_code,
+        ):
+            text.append(node.text)
+
+        else:
+            stack.append(iter(node.successors))
+
+    return "".join(text)
+
+
+@dataclass(init=True, slots=True)
+class PageOutline:
+    """
+    The headings of a page, PageParser fills one in while it renders
+    args
+        headings    (depth, slug, text) for every heading, in page order
+        slugs       slug -> how many headings asked for it
+        index       also collect search terms, off unless a site is being built
+        terms       the words of every section, terms[0] is the text before
+                    the first heading and terms[n] the section under headings[n - 1]
+    """
+
+    headings: list = field(default_factory=list)
+    slugs: dict = field(default_factory=dict)
+    index: bool = False
+    terms: list = field(default_factory=lambda: [set()])
+
+    def add_heading(self, depth: int, text: str) -> str:
+        """
+            record a heading and start a new section
+        returns
+            str     an id for the heading, unique within the page
+        """
+        text = text.strip()
+        slug = base = SLUG_STRIP.sub("-", text.lower()).strip("-") or "section"
+
+        # the second "Usage" becomes usage-2, and so on
+        while slug in self.slugs:
+            self.slugs[base] += 1
+            slug = f"{base}-{self.slugs[base]}"
+
+        self.slugs[slug] = 1
+        self.headings.append((depth, slug, text))
+
+        if self.index:
+            self.terms.append(set(SEARCH_TERM.findall(text.lower())))
+
+        return slug
+
+    def add_text(self, nodes: list) -> None:
+        """
+            index the words under some inline nodes in the current section
+        """
+        self.terms[-1].update(SEARCH_TERM.findall(plain_text(nodes).lower()))
+
+    def title(self) -> str:
+        """
+            the text of the first h1, None if the page has none
+        """
+        for depth, slug, text in self.headings:
+            if depth == 1:
+                return text
+
+        return None
+
+    def toc(self) -> str:
+        """
+            a nested list linking to the headings in TOC_DEPTHS, empty if
+            there are too few of them to be worth a table of contents
+        """
+        headings = [entry for entry in self.headings if entry[0] in TOC_DEPTHS]
+        if len(headings) < 2:
+            return ""
+
+        html = ["<nav class='toc'>"]
+        open_depths = []
+
+        for depth, slug, text in headings:
+            while open_depths and open_depths[-1] > depth:
+                html.append("</li></ul>")
+                open_depths.pop()
+
+            if open_depths and open_depths[-1] == depth:
+                html.append("</li>")
+            else:
+                html.append("<ul>")
+                open_depths.append(depth)
+
+            html.append(f"<li><a href='#{slug}'>{escape_text(text)}</a>")
+
+        html.append("</li></ul>" * len(open_depths))
+        html.append("</nav>")
+
+        return "".join(html)
+
+    def as_dict(self) -> dict:
+        return {
+            "title": self.title(),
+            "headings": self.headings,
+            "terms": [sorted(terms) for terms in self.terms],
+        }
+
+
+class InlineParser(object):
+    """
+    turns the text of a paragraph, list item or heading into inline nodes,
+    [text](url) anchors, **strong**, *emphasis* and `code`
+
+    text with &, < or > in it becomes unsafe_text instead of text, so the
+    renderer only has to escape the few runs that need it and can write
+    every other text node as is
+
+    everything is done in one pass over the text. "*", "**" and "[" are
+    pushed as literal text nodes and their index in out is put on a stack per
+    kind, a closer pops the nearest opener and folds everything after it
+    into the new node. openers that end up inside get dropped from the stacks
+    and stay literal, so every node is folded at most once and a line full of
+    unmatched delimiters stays linear
+    out             finished nodes and not yet matched delimiters
+    pending         text that has not been turned into a node yet
+    openers         delimiter -> stack of indexes into out
+    missing_ticks   backtick run lengths we know have no closer
+    no_paren        there is no ")" left in the text
+    unsafe          pending has something in it that needs escaping
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.out = []
+        self.pending = []
+        self.openers = {"*": [], "**": [], "[": []}
+        self.missing_ticks = set()
+        self.no_paren = False
+        self.unsafe = False
+
+    def parse(self, text: str) -> list:
+        """
+        args
+            text    a single line of text
+        returns
+            list    DocNodes, a single text node when there is no markup
+        """
+        if INLINE_TRIGGER.search(text) is None:
+            return [DocNode(DocNodeType.text, text=text)]
+
+        self.__init__()
+        self.text = text
+
+        search = INLINE_TRIGGER.search
+        pending = self.pending
+        length = len(text)
+        pos = 0
+
+        while pos < length:
+            match = search(text, pos)
+            if match is None:
+                pending.append(text[pos:])
+                break
+
+            index = match.start()
+            if index > pos:
+                pending.append(text[pos:index])
+
+            char = text[index]
+
+            if char == "\\":
+                if index + 1 < length and text[index + 1] in INLINE_ESCAPABLE:
+                    pending.append(text[index + 1])
+                    self.unsafe |= text[index + 1] in SPECIAL
+                    pos = index + 2
+                else:
+                    pending.append(char)
+                    pos = index + 1
+
+            elif char in SPECIAL:
+                pending.append(char)
+                self.unsafe = True
+                pos = index + 1
+
+            elif char == "`":
+                pos = self.code_span(index)
+
+            elif char == "*":
+                pos = self.emphasis(index)
+
+            elif char == "[":
+                self.push_opener("[", char)
+                pos = index + 1
+
+            else:
+                pos = self.close_link(index)
+
+        self.flush()
+        return self.merge_text(self.out)
+
+    def flush(self) -> None:
+        if self.pending:
+            type = DocNodeType.unsafe_text if self.unsafe else DocNodeType.text
+            self.out.append(DocNode(type, text="".join(self.pending)))
+            self.pending.clear()
+            self.unsafe = False
+
+    def merge_text(self, nodes: list) -> list:
+        """
+            glue runs of text nodes (left over delimiters mostly) back together,
+            the run is unsafe_text if any part of it was
+        """
+        merged = []
+        run = []
+        type = DocNodeType.text
+
+        for node in nodes:
+            if node.type is DocNodeType.text or node.type is DocNodeType.unsafe_text:
+                run.append(node.text)
+                if node.type is DocNodeType.unsafe_text:
+                    type = DocNodeType.unsafe_text
+                continue
+
+            if run:
+                merged.append(DocNode(type, text="".join(run)))
+                run.clear()
+                type = DocNodeType.text
+
+            merged.append(node)
+
+        if run:
+            merged.append(DocNode(type, text="".join(run)))
+
+        return merged
+
+    def push_opener(self, kind: str, literal: str) -> None:
+        self.flush()
+        self.openers[kind].append(len(self.out))
+        self.out.append(DocNode(DocNodeType.text, text=literal))
+
+    def close(self, kind: str, type: DocNodeType, text="") -> None:
+        """
+            fold everything after the nearest kind opener into a type node
+        """
+        self.flush()
+
+        start = self.openers[kind].pop()
+        node = DocNode(type, self.merge_text(self.out[start + 1 :]), text=text)
+        del self.out[start:]
+
+        # openers inside the new node can not be closed anymore
+        for stack in self.openers.values():
+            while stack and stack[-1] > start:
+                stack.pop()
+
+        self.out.append(node)
+
+    def code_span(self, index: int) -> int:
+        """
+            `code`, closed by a run of exactly as many backticks
+        returns
+            int     where to carry on scanning
+        """
+        text = self.text
+        end = index
+        while end < len(text) and text[end] == "`":
+            end += 1
+
+        ticks = end - index
+        closer = None
+        if ticks not in self.missing_ticks:
+            closer = re.compile(f"(?<!`){'`' * ticks}(?!`)").search(text, end)
+
+        if closer is None:
+            # a later run of the same length would not find one either
+            self.missing_ticks.add(ticks)
+            self.pending.append(text[index:end])
+            return end
+
+        code = text[end : closer.start()]
+        if len(code) > 2 and code[0] == " " and code[-1] == " ":
+            code = code[1:-1]
+
+        self.flush()
+        self.out.append(DocNode(DocNodeType.inline_code, text=code))
+
+        return closer.end()
+
+    def emphasis(self, index: int) -> int:
+        """
+            a run of "*", closes what it can and opens with the rest
+        returns
+            int     where to carry on scanning
+        """
+        text = self.text
+        end = index
+        while end < len(text) and text[end] == "*":
+            end += 1
+
+        before = text[index - 1] if index > 0 else " "
+        after = text[end] if end < len(text) else " "
+        remaining = end - index
+
+        if not before.isspace():
+            em, strong = self.openers["*"], self.openers["**"]
+
+            while remaining:
+                em_at = em[-1] if em else -1
+                strong_at = strong[-1] if strong and remaining >= 2 else -1
+
+                if em_at < 0 and strong_at < 0:
+                    break
+
+                # close the innermost one first
+                if strong_at > em_at:
+                    self.close("**", DocNodeType.strong)
+                    remaining -= 2
+                else:
+                    self.close("*", DocNodeType.emphasis)
+                    remaining -= 1
+
+        if remaining and not after.isspace():
+            while remaining >= 2:
+                self.push_opener("**", "**")
+                remaining -= 2
+
+            if remaining:
+                self.push_opener("*", "*")
+
+        elif remaining:
+            self.pending.append("*" * remaining)
+
+        return end
+
+    def close_link(self, index: int) -> int:
+        """
+            "]", a link if there is an open "[" and "(url)" right after
+        returns
+            int     where to carry on scanning
+        """
+        text = self.text
+
+        if not self.openers["["]:
+            self.pending.append("]")
+            return index + 1
+
+        end = -1
+        if text.startswith("(", index + 1) and not self.no_paren:
+            end = text.find(")", index + 2)
+            self.no_paren = end == -1
+
+        if end == -1:
+            # [text] without a url, the "[" is just text from now on
+            self.openers["["].pop()
+            self.pending.append("]")
+            return index + 1
+
+        self.close("[", DocNodeType.anchor, text=text[index + 2 : end].strip())
+
+        # a link can't have a link in it, so like CommonMark the "[" around
+        # this one can't be closed anymore and stay text
+        self.openers["["].clear()
+
+        return end + 1
+
 
 class PageParser(object):
-    def __init__(self, doc_nodes):
+    def __init__(
+        self,
+        doc_nodes=None,
+        stats=None,
+        layout=None,
+        slots=None,
+        outline=None,
+        assets=None,
+        h1_title=False,
+    ):
         self.doc_nodes: list = doc_nodes
         self.page: list = []
         self.tree = DocNode(DocNodeType.root)
 
-        # the LIFO queue "defer_queue" is made to close outer-scope tag at the end of render
-        # the way this works is, we have a queue (start)div->div->body   |  (end)div,div,body
-        # queue div,div,body
-        #       and since we want to use pop() we will have to revere the list
-        # queue(reversed) body,div,div
-        #       when we pop it will be div,div,body
-        self.defer_queue = []
+        # when set, a PageStats that the render fills in
+        self.stats = stats
+
+        # splits paragraph, list item and heading text into inline nodes
+        self.inline = InlineParser()
+
+        # where add_html_block() sends fragments, render_to() points this at
+        # the output stream so the page is never held in memory
+        self.sink = self.page.append
+
+        # headings seen so far, for their ids and the table of contents
+        self.outline = outline or PageOutline()
+
+        # the page is wrapped in a layout, the closing tags come from there too
+        self.layout = layout or template.load_layout()
 
-    def prepare_lifo(self) -> None:
-        self.defer_queue.reverse()
+        # what goes into the layout slots besides the page itself
+        self.slots = {"stylesheet": STYLESHEET, "title": "", "meta": ""}
+        self.slots.update(slots or {})
 
-    def get_next_defer(self) -> object:
-        item = self.defer_queue.pop()
-        return item
+        # the title is text, the other slots are html
+        self.slots["title"] = escape_text(self.slots["title"])
 
-    def add_defer_item(self, item: str) -> None:
-        assert isinstance(item, str), "defer item was not str"
-        self.defer_queue.append(item)
+        # the title in slots only stands in for the first h1 of the page, for
+        # pages without a \o title
+        self.h1_title = h1_title
+
+        # when set, an assets.PageAssets that links go through, so links to
+        # local files point at their fingerprinted copies
+        self.assets = assets
+
+        # the page so far and where it goes once the head can be filled in,
+        # for a layout with a {{ toc }} in front of the content or a title
+        # that is still waiting on its h1
+        self.held = None
+        self.held_sink = None
 
     def add_html_block(self, tag) -> None:
-        self.page.append(tag)
+        self.sink(tag)
 
     def create_html_block(self, start, body, end) -> None:
         return start + body + end
 
-    def define_list_item(self, text) -> None:
-        index_after_depth = text.index(".")
-        depth = int(text[0])
+    def define_list_item(self, text) -> tuple:
+        """
+            split a list_item token up
+        args
+            text    the token, "  2. some text" or "- some text"
+        returns
+            (indent, ordered, number, text)  indent in columns, number is the
+                                             value of an ordered item, 0 for bullets
+        """
+        match = LIST_ITEM.match(text)
+        if match is None:
+            raise ValueError(f"not a list item {text!r}")
 
-        assert depth
-        assert index_after_depth
+        indent = len(match.group(1).expandtabs(TAB_WIDTH))
+        number = match.group(2)
+        list_text = text[match.end() :]
 
-        list_text = text[index_after_depth + 2 :]
+        if number is None:
+            return (indent, False, 0, list_text)
 
-        return (depth, list_text)
+        return (indent, True, int(number), list_text)
 
-    def init_page(self):
-        start_page = (
-            "<head>"
-            + "\n <meta name='viewport' content='width=device-width, initial-scale=1'>"
-            + "\n<link rel='stylesheet' href='../styles/skeleton.css'>"
-            + "\n</head>"
-            + "\n<body class='bod'>"
-        )
+    def init_page(self) -> None:
+        self.h1_title = self.h1_title and "title" in self.layout.slots
+        waiting = self.h1_title and (True, "title") in self.layout.prologue
+
+        if not self.layout.held and not waiting:
+            self.add_html_block(self.layout.head(self.slots))
+            return
+
+        # the head needs more of the page, so the page waits for it
+        self.held = []
+        self.held_sink = self.sink
+        self.sink = self.held.append
+
+    def release_page(self, final=False) -> None:
+        """
+            write the head and the page held back behind it, once nothing the
+            head needs is missing. a {{ toc }} in the head waits for the end
+        """
+        if self.h1_title or (self.layout.held and not final):
+            return
+
+        self.sink = self.held_sink
+        self.add_html_block(self.layout.head(self.slots))
+        self.add_html_block("".join(self.held))
+        self.held = self.held_sink = None
+
+    def finish_page(self) -> None:
+        # by now every heading has been seen
+        if "toc" in self.layout.slots:
+            self.slots["toc"] = self.outline.toc()
+
+        # render_parallel() only sees the headings of its workers here
+        if self.h1_title:
+            title = self.outline.title()
+            if title is not None:
+                self.slots["title"] = escape_text(title)
+            self.h1_title = False
+
+        if self.held is not None:
+            self.release_page(final=True)
+
+        self.add_html_block(self.layout.tail(self.slots))
+
+    def create_ir(self, lexer=None) -> None:
+        if self.stats is None:
+            self.tree.successors.extend(self.iter_ir(lexer))
+            return
+
+        start = time.perf_counter()
+        made = self.stats.phases.get("ir", 0.0)
+        self.tree.successors.extend(self.iter_ir(lexer))
+
+        # with a lexer make_node() was timed on its own, the rest is lexing
+        made = self.stats.phases.get("ir", 0.0) - made
+        phase = "ir" if lexer is None else "lex"
+        self.stats.add_phase(phase, time.perf_counter() - start - made)
+
+    def make_node(self, type: DocNodeType, value: str) -> DocNode:
+        """
+            turn what the lexer found into an IR node
+        this has the same signature as DocToken so a PageLexer can call it in
+        place of building tokens, see iter_ir()
+        returns
+            DocNode     None for tokens we do not render
+        """
+        if type is DocNodeType.list_item:
+
+            # here we reuse the depth of the node to specify the list item value
+            indent, ordered, number, text = self.define_list_item(value)
+
+            return DocNode(
+                DocNodeType.list_item,
+                self.inline.parse(text),
+                depth=number,
+                ordered=ordered,
+                indent=indent,
+            )
+
+        elif type is DocNodeType.heading:
+            depth = value.count("#")
+
+            # here like we mentioned later in the file we can strip out the "#"
+            # we dont strip it when we translate the header into HTML because
+            # that would be a waste of cycles, you would have to do it in multiple places
+            return DocNode(
+                DocNodeType.heading, self.inline.parse(value.strip("#")), depth=depth
+            )
+
+        elif type is DocNodeType.paragraph:
+            return DocNode(DocNodeType.paragraph, self.inline.parse(value))
+
+        elif type is DocNodeType.code_block:
+            # the first line is what came after ```, the language if any
+            lang, newline, code = value.partition("\n")
+            if not newline:
+                lang, code = "", value
+
+            return DocNode(
+                DocNodeType.code_block,
+                [DocNode(DocNodeType.text, text=code)],
+                text=lang.strip(),
+            )
+
+        elif type is DocNodeType.text:
+            return DocNode(DocNodeType.text, [DocNode(DocNodeType.text, text=value)])
+
+        return None
+
+    def iter_ir(self, lexer=None):
+        """
+            build the top-level IR nodes
+        without a lexer the nodes come from doc_nodes, which can be a list or the
+        generator from PageLexer.iter_tokens(). with a lexer the two passes are
+        fused, the lexer calls make_node() directly and no DocToken is built.
+        a _list is held back until something other than a list_item shows up
+        so that consecutive items still end up under one _list
+        args
+            lexer   PageLexer to pull nodes straight out of
+        yields
+            DocNode     a finished top-level node
+        """
+        make_node = self.make_node
+        if self.stats is not None:
+            # fused, the lexer calls make_node() so it is timed on its own
+            if lexer is not None:
+                self.stats.add_phase("lex", 0.0)
+                make_node = self.stats.timed("ir", make_node)
+            make_node = self.stats.count_tokens(make_node)
+
+        if lexer is not None:
+            nodes = lexer.iter_tokens(make_node)
+        else:
+            nodes = (make_node(token.type, token.value) for token in self.doc_nodes)
+
+        # the lists that are open right now, outermost first. an item either
+        # goes into the list on top, opens a list under the last item on top
+        # or closes lists until one is indented as far as it is. every list
+        # is pushed and popped once, so long outlines stay linear
+        open_lists = []
+
+        for node in nodes:
+            # tokens we do not render do not close an open list
+            if node is None:
+                continue
 
-        self.add_html_block(start_page)
-        self.add_html_block("<body>")
-        self.add_html_block("<div class='page-container'>")
+            if node.type is DocNodeType.list_item:
+                while len(open_lists) > 1 and node.indent < open_lists[-1].indent:
+                    # indented less than the list on top but still past the
+                    # one under it, it goes with the items on top
+                    if node.indent > open_lists[-2].indent:
+                        break
+                    open_lists.pop()
+
+                if not open_lists:
+                    open_lists.append(self.open_list(node))
+
+                elif node.indent > open_lists[-1].indent:
+                    parent = open_lists[-1].successors[-1]
+                    nested = self.open_list(node, len(open_lists) + 1)
+
+                    parent.successors.append(nested)
+                    open_lists.append(nested)
+
+                # "1." after "-" on the same level starts a new list
+                elif node.ordered is not open_lists[-1].ordered:
+                    if len(open_lists) == 1:
+                        yield open_lists.pop()
+                        open_lists.append(self.open_list(node))
+                    else:
+                        parent = open_lists[-2].successors[-1]
+                        sibling = self.open_list(node, len(open_lists))
 
-        # make sure we close this at the end of scope
-        self.add_defer_item("</body>")
-        self.add_defer_item("</div>")
+                        parent.successors.append(sibling)
+                        open_lists[-1] = sibling
 
-    def create_ir(self) -> None:
+                open_lists[-1].successors.append(node)
 
-        for idx, token in enumerate(self.doc_nodes):
-            if token.type is DocNodeType.list_item:
+                continue
 
-                # if the we don't already have a list in the tree
-                # then go ahead and create one
-                if self.tree.successors[-1].type is not DocNodeType._list:
+            # anything that is not a list_item closes the list in front of it
+            if open_lists:
+                yield open_lists[0]
+                open_lists.clear()
 
-                    # grab the depth and the text for the list item
-                    depth, text = self.define_list_item(token.value)
+            yield node
 
-                    node = DocNode(
-                        DocNodeType._list,
-                        [
-                            DocNode(
-                                DocNodeType.list_item,
-                                [DocNode(DocNodeType.text, text=text)],
-                            )
-                        ],
-                    )
+        if open_lists:
+            yield open_lists[0]
 
-                    node.depth = depth
-                    self.tree.successors.append(node)
+    def open_list(self, item: DocNode, depth=1) -> DocNode:
+        """
+            an empty _list for item to go in
+        args
+            item    first list_item of the list
+            depth   how deeply the list is nested, 1 is top-level
+        """
+        return DocNode(
+            DocNodeType._list, depth=depth, ordered=item.ordered, indent=item.indent
+        )
 
-                    continue
+    def render(self, streaming=False, lexer=None) -> str:
+        """
+            render the page
+        args
+            streaming   render each top-level node as soon as iter_ir() hands it
+                        over instead of building self.tree first, use this with
+                        PageLexer.iter_tokens() to keep the IR out of memory
+            lexer       build the IR straight out of this PageLexer instead of
+                        going through doc_nodes, see iter_ir()
+        returns
+            str     the html page
+        """
 
-                # if we dont need to create the head of the list
-                # then we can append to the _list behind it
-                elif token.type is DocNodeType.list_item:
+        if streaming:
+            source = "ir" if lexer is None else "lex"
+            self.render_nodes(self.iter_ir(lexer), source=source)
+        else:
+            self.create_ir(lexer)
+            self.render_nodes(self.tree.successors)
 
-                    # grab the depth and the text for the list item
-                    depth, text = self.define_list_item(token.value)
+        return "".join(self.page)
 
-                    node = DocNode(
-                        DocNodeType.list_item,
-                        [DocNode(type=DocNodeType.text, text=text)],
-                    )
+    def render_parallel(self, jobs: int, lexer=None) -> str:
+        """
+            render() with the top-level nodes split into contiguous chunks that
+        jobs worker processes render, the html is joined back together in page
+        order and is byte for byte what render() gives. blocks render on their
+        own except for heading ids, so the ids are worked out here first and
+        every chunk starts from the ids that came before it
+        args
+            jobs    worker processes, the page renders in this process where
+                    processes cannot be forked
+            lexer   build the IR straight out of this PageLexer instead of
+                    going through doc_nodes, see iter_ir()
+        returns
+            str     the html page
+        """
+        global _parallel_parser
 
-                    node.depth = depth
+        self.create_ir(lexer)
+        nodes = self.tree.successors
 
-                    # append to _list and freak out if there is not one
-                    assert (
-                        self.tree.successors[-1].type is DocNodeType._list
-                    ), f"expected _list found {self.tree.successors[-1].type}"
+        chunks = min(len(nodes), jobs * CHUNKS_PER_JOB)
+        forks = "fork" in multiprocessing.get_all_start_methods()
 
-                    self.tree.successors[-1].successors.append(node)
+        if jobs < 2 or chunks < 2 or not forks:
+            self.render_nodes(nodes)
+            return "".join(self.page)
 
-                    continue
+        start = time.perf_counter()
+        bounds = [len(nodes) * chunk // chunks for chunk in range(chunks + 1)]
 
-                else:
-                    # unreachable
-                    raise
-
-            elif token.type is DocNodeType.heading:
-                depth = token.value.count("#")
-                print("DEPTH", depth, token.value)
-
-                # here like we mentioned later in the file we can strip out the "#"
-                # we dont strip it when we translate the header into HTML because
-                # that would be a waste of cycles, you would have to do it in multiple places
-                node = DocNode(
-                    DocNodeType.heading,
-                    [
-                        DocNode(
-                            DocNodeType.text, text=token.value.strip("#"), depth=depth
-                        )
-                    ],
-                )
+        # the heading ids that are taken where every chunk starts
+        slugs = []
+        taken = PageOutline(slugs=dict(self.outline.slugs))
+        for first, last in zip(bounds, bounds[1:]):
+            slugs.append(dict(taken.slugs))
 
-                self.tree.successors.append(node)
-                continue
+            for node in nodes[first:last]:
+                if node.type is DocNodeType.heading:
+                    taken.add_heading(node.depth, plain_text(node.successors))
 
-            elif token.type is DocNodeType.paragraph:
-                self.tree.successors.append(
-                    DocNode(
-                        DocNodeType.paragraph,
-                        [DocNode(DocNodeType.text, text=token.value)],
-                    )
-                )
-            elif token.type is DocNodeType.code_block:
-                self.tree.successors.append(
-                    DocNode(
-                        DocNodeType.code_block,
-                        [DocNode(DocNodeType.text, text=token.value)],
-                    )
-                )
+        _parallel_parser = self
+        context = multiprocessing.get_context("fork")
 
-            elif token.type is DocNodeType.text:
-                self.tree.successors.append(
-                    DocNode(
-                        DocNodeType.text, [DocNode(DocNodeType.text, text=token.value)]
-                    )
+        try:
+            self.init_page()
+
+            with ProcessPoolExecutor(jobs, mp_context=context) as pool:
+                rendered = pool.map(
+                    render_chunk,
+                    bounds,
+                    bounds[1:],
+                    slugs,
+                    [self.outline.index] * chunks,
+                    [self.stats is not None] * chunks,
                 )
-            else:
-                pass
 
-    def render(self) -> str:
+                for html, headings, terms, stats, used in rendered:
+                    self.add_html_block(html)
+
+                    # the workers copied what the chunk links to already
+                    if self.assets is not None:
+                        self.assets.used.update(used)
+
+                    # the blocks and nodes, the whole page is counted below
+                    if stats is not None:
+                        self.stats.merge(stats)
+
+                    self.outline.headings.extend(headings)
+                    if self.outline.index:
+                        self.outline.terms[-1].update(terms[0])
+                        self.outline.terms.extend(terms[1:])
+
+            self.outline.slugs = taken.slugs
+            self.finish_page()
+
+        finally:
+            _parallel_parser = None
+
+        html = "".join(self.page)
+
+        if self.stats is not None:
+            self.stats.output_bytes += len(html.encode())
+            self.stats.add_phase("parallel render", time.perf_counter() - start)
+
+        return html
+
+    def render_to(self, stream, lexer=None) -> int:
+        """
+            render the page straight into a file-like object
+        fragments are written as the IR is walked and the IR is built node by
+        node, so at most one block is held in memory on top of what the stream
+        buffers. stream can be sys.stdout to pipe the page somewhere else
+        args
+            stream      anything with a write(str)
+            lexer       build the IR straight out of this PageLexer instead of
+                        going through doc_nodes, see iter_ir()
+        returns
+            int     number of top-level nodes rendered
+        """
+        self.sink = stream.write
+
+        try:
+            return self.render_nodes(
+                self.iter_ir(lexer), source="ir" if lexer is None else "lex"
+            )
+        finally:
+            self.sink = self.page.append
+
+    def render_nodes(self, nodes, phase="render", source=None) -> int:
         """
-        TODO: redo this
+            render the layout around every node in nodes through add_html_block()
+        args
+            nodes   top-level DocNodes, a list or the iter_ir() generator
+            phase   what to call the time spent rendering in the stats
+            source  what to call the time spent waiting on nodes for the next
+                    node when it is a generator, "lex" for a fused lexer,
+                    make_node() is timed into "ir" on its own
+        returns
+            int     number of nodes rendered
         """
+        if self.stats is not None:
+            return self.render_nodes_with_stats(nodes, phase, source)
 
-        self.create_ir()
         self.init_page()
 
-        headline = False
-        for idx, child in enumerate(self.tree.successors):
-            if "-v" in sys.argv:
-                print("COMPILING    ", hex(id(child)), "  ", child.type)
+        count = 0
+        for idx, child in enumerate(nodes):
+            self.render_node(child)
+            count += 1
+
+            if self.held is not None:
+                self.release_page()
 
-            # Headings
-            if child.type is DocNodeType.heading:
-                # ensure depth
-                assert child.depth, "No Depth found for header"
-                # ensure text node
-                assert bool(child.successors), "header had no text successors"
-                # DocNode
-                assert isinstance(
-                    child.successors[0], DocNode
-                ), f"Could not find successors Text for Header of depth {child.depth}"
+        self.finish_page()
 
-                text = child.successors[0]
+        return count
 
-                if text.depth == 1:
+    def render_nodes_with_stats(self, nodes, phase: str, source=None) -> int:
+        """
+            render_nodes() that also times every block and counts the output,
+            kept apart so the plain render does not pay for any of it
+        """
+        stats = self.stats
+        sink = self.sink
+        written = [0]
 
-                    #TODO: fix text.text naming wat
-                    line = self.create_html_block(
-                        f"<h{text.depth}>",
-                        text.text,
-                        f"</h{text.depth}>",
-                    )
+        def counted(tag: str) -> None:
+            written[0] += len(tag.encode())
+            sink(tag)
 
-                    self.add_html_block(line)
+        self.sink = counted
+        start = time.perf_counter()
 
-                    continue
+        # time spent getting the next node out of nodes, and how much of it
+        # make_node() already put in "ir"
+        waited = 0.0
+        made = stats.phases.get("ir", 0.0)
+        nodes = iter(nodes)
 
-                if text.depth == 1:
-                    PageHeading = "<div class='PageHeadline'>"
-                    PageHeadingEnd = "</div>"
+        try:
+            self.init_page()
 
-                    # closing tag at end of scope
-                    self.add_html_block("<div class='ArticleText'>")
-                    self.add_defer_item("</div>")
+            count = 0
+            while True:
+                wait_start = time.perf_counter()
+                child = next(nodes, None)
+                waited += time.perf_counter() - wait_start
 
-                    heading = f"<h{text.depth}>"
-                    end = f"</h{text.depth}>"
+                if child is None:
+                    break
 
-                    line = PageHeading + heading + text.text + end + PageHeadingEnd
+                # a held back page is only written, and counted, at the end
+                held = self.held
+                before = written[0] if held is None else len(held)
+                block_start = time.perf_counter()
 
-                    self.add_html_block(line)
-                    continue
+                self.render_node(child)
 
-                line = self.create_html_block(
-                    f"<h{text.depth}>",
-                    child.successors[0].text,
-                    f"</h{text.depth}>",
-                )
+                seconds = time.perf_counter() - block_start
+                if held is None:
+                    size = written[0] - before
+                else:
+                    size = sum(len(html.encode()) for html in held[before:])
+                stats.add_block(seconds, child, size)
+                stats.count_nodes(child)
+                count += 1
+
+                if held is not None:
+                    self.release_page()
+
+            self.finish_page()
+
+        finally:
+            self.sink = sink
+
+        if source is not None:
+            stats.add_phase(source, waited - (stats.phases.get("ir", 0.0) - made))
+
+        stats.output_bytes += written[0]
+        stats.add_phase(phase, time.perf_counter() - start - waited)
+
+        return count
+
+    def render_inline(self, nodes: list) -> str:
+        """
+            html for the inline nodes under a paragraph, list item or heading
+        """
+        # almost every line is a single run of plain text, InlineParser
+        # already told us whether it has anything to escape
+        if len(nodes) == 1:
+            if nodes[0].type is DocNodeType.text:
+                return nodes[0].text
+
+            if nodes[0].type is DocNodeType.unsafe_text:
+                return escape_text(nodes[0].text)
+
+        # a stack of iterators like render_list, markup can nest as deep as
+        # the page likes, every entry has the tag that closes it
+        html = []
+        stack = [(iter(nodes), "")]
+
+        while stack:
+            node = next(stack[-1][0], None)
+
+            if node is None:
+                html.append(stack.pop()[1])
+
+            elif node.type is DocNodeType.text:
+                html.append(node.text)
+
+            elif node.type is DocNodeType.unsafe_text:
+                html.append(escape_text(node.text))
+
+            elif node.type is DocNodeType.strong:
+                html.append("<strong>")
+                stack.append((iter(node.successors), "</strong>"))
+
+            elif node.type is DocNodeType.emphasis:
+                html.append("<em>")
+                stack.append((iter(node.successors), "</em>"))
+
+            elif node.type is DocNodeType.inline_code:
+                html.append(f"<code>{escape_text(node.text)}</code>")
+
+            elif node.type is DocNodeType.anchor:
+                href = node.text if self.assets is None else self.assets.url(node.text)
+                html.append(f"<a href='{escape_attr(href)}'>")
+                stack.append((iter(node.successors), "</a>"))
+
+            else:
+                raise ValueError(f"unknown inline type {node.type}")
+
+        return "".join(html)
+
+    def render_list(self, root: DocNode) -> None:
+        """
+            render a _list and everything nested under it
+        this walks the lists with a stack of iterators instead of recursing,
+        every entry has the tag that closes it once it runs out
+        """
+        tag = "ol" if root.ordered else "ul"
+
+        self.add_html_block(f"<{tag}>")
+        stack = [(iter(root.successors), f"</{tag}>")]
+
+        while stack:
+            node = next(stack[-1][0], None)
 
-                self.add_html_block(line)
-                continue
+            if node is None:
+                self.add_html_block(stack.pop()[1])
 
-            elif child.type is DocNodeType._list:
-                self.add_html_block("<ol>")
+            elif node.type is DocNodeType.list_item:
+                # nested lists come after the inline nodes of an item
+                successors = node.successors
+                split = len(successors)
+                while split and successors[split - 1].type is DocNodeType._list:
+                    split -= 1
 
-                for list_item in child.successors:
+                body = self.render_inline(successors[:split])
+                if self.outline.index:
+                    self.outline.add_text(successors[:split])
 
-                    # ensure there is a test node avaliable
-                    assert bool(list_item.successors), "no list text successor found"
+                if node.ordered:
+                    self.add_html_block(f"<li value='{node.depth}'>{body}")
+                else:
+                    self.add_html_block(f"<li>{body}")
 
-                    if list_item.type is DocNodeType.list_item:
-                        assert (
-                            list_item.successors[0].type is DocNodeType.text
-                        ), f"successors type for list was not text, found {list_item.successors[0].type}"
+                stack.append((iter(successors[split:]), "</li>"))
 
-                        body = list_item.successors[0].text
+            elif node.type is DocNodeType._list:
+                tag = "ol" if node.ordered else "ul"
 
-                        line = self.create_html_block(
-                            f"<li value='{list_item.depth}'>", body, "</li>"
-                        )
+                self.add_html_block(f"<{tag}>")
+                stack.append((iter(node.successors), f"</{tag}>"))
 
-                        self.add_html_block(line)
+            else:
+                raise ValueError(f"unknown list type {node.type}")
 
-                self.add_html_block("</ol>")
+    def render_node(self, child: DocNode) -> None:
+        """
+            render a single top-level node into the page
+        """
+        # Headings
+        if child.type is DocNodeType.heading:
+            # ensure depth
+            assert child.depth, "No Depth found for header"
+            # ensure text node
+            assert bool(child.successors), "header had no text successors"
+            # DocNode
+            assert isinstance(
+                child.successors[0], DocNode
+            ), f"Could not find successors Text for Header of depth {child.depth}"
 
-                continue
+            # the heading level lives on the heading, the text is inline nodes
+            depth = child.depth
+            text = self.render_inline(child.successors)
+            plain = plain_text(child.successors)
+            slug = self.outline.add_heading(depth, plain)
 
-            elif child.type is DocNodeType.paragraph:
-                block = child.successors[0].text
+            if depth == 1 and self.h1_title:
+                self.slots["title"] = escape_text(plain.strip())
+                self.h1_title = False
 
-                line = self.create_html_block("<p>", block, "</p>")
+            line = self.create_html_block(
+                f"<h{depth} id='{slug}'>",
+                text,
+                f"</h{depth}>",
+            )
 
-                self.add_html_block(line)
-                continue
+            self.add_html_block(line)
+            return
 
-            elif child.type is DocNodeType.code_block:
-                # check string DocNode access
-                assert bool(child.successors[0].text)
+        elif child.type is DocNodeType._list:
+            self.render_list(child)
 
-                # access string once and only once
-                block = child.successors[0].text
+            return
 
-                # find the first new line to rid ```<lang>
-                index = block.find("\n")
+        elif child.type is DocNodeType.paragraph:
+            block = self.render_inline(child.successors)
+            if self.outline.index:
+                self.outline.add_text(child.successors)
 
-                # grab the rest of the block
-                string = block[index:]
+            line = self.create_html_block("<p>", block, "</p>")
 
-                # create code_block
-                line = self.create_html_block(
-                    "<pre>",
-                    string,
-                    "</pre>",
-                )
+            self.add_html_block(line)
+            return
 
-                # wrap code block in div
-                line = self.create_html_block(
-                    "<div class='code_block'>", line, "</div>"
-                )
+        elif child.type is DocNodeType.code_block:
+            # access string once and only once
+            block = child.successors[0].text
 
-                self.add_html_block(line)
+            # the language lives on the code_block, anything we do not know
+            # how to highlight is only escaped
+            string = highlight.highlight(child.text, block) if child.text else None
+            if string is None:
+                string = escape_text(block)
 
-                continue
+            # create code_block
+            line = self.create_html_block(
+                "<pre>\n",
+                string,
+                "</pre>",
+            )
 
-            else:
-                raise ValueError(f"unknown type {child.type}")
+            # wrap code block in div
+            line = self.create_html_block(
+                "<div class='code_block'>", line, "</div>"
+            )
 
-        # reverse lifo
-        self.prepare_lifo()
+            self.add_html_block(line)
 
-        # finish off page
-        for i in range(0, len(self.defer_queue)):
-            item = self.get_next_defer()
-            self.add_html_block(item)
+            return
 
-        return "".join(self.page)
+        else:
+            raise ValueError(f"unknown type {child.type}")
 
 
 class PageLexer(object):
     """
     our global lexer object
     lookahead_ptr   a pointer to look ahead of the cursor temporarily
-    _has_errors     defining what the parser ran into during scans
+    errors          PageLexerErrors for everything we had to skip over
     file_buff       text from the source file
     column          what column are we on in a line
     doc_nodes          list of tokens we have collected in scans
     cursor          where we are in the source file
     line            what line are we on, primarily used with column
     fd              a hidden file descriptor for our source file
+    chunk_size      when set, file_buff is a window over fd that is refilled
+                    chunk_size characters at a time instead of read() up front
+    offset          where file_buff starts in the source
+    offset_lines    newlines in the source before file_buff
+    engine          "fast" slices whole lines out with str.find, "legacy" is the
+                    original char by char scanner, both give the same tokens
+    mapped          file_buff is an mmap (or bytes) that is lexed in place, only
+                    the tokens are decoded, see iter_tokens_mapped
+    meta            PageMeta out of the options at the top of the page, read
+                    as soon as the lexer is made, see read_front_matter()
     """
 
-    def __init__(self, file_buff):
-        self.file_buff = file_buff.read()
+    def __init__(self, file_buff, chunk_size=None, engine="fast", meta=None):
+        assert engine in ("fast", "legacy"), f"unknown lexer engine {engine}"
+
+        self.mapped = isinstance(file_buff, (mmap.mmap, bytes))
+        assert not self.mapped or (
+            engine == "fast" and not chunk_size
+        ), "a mapped source is only lexed by the fast engine, and all at once"
+
+        self.chunk_size = chunk_size
+        self.engine = engine
+        if self.mapped:
+            self.file_buff = file_buff
+        else:
+            self.file_buff = "" if chunk_size else file_buff.read()
         self.lookahead_ptr = 0
-        self._has_errors = []
+        self.errors = []
+        self.offset = 0
+        self.offset_lines = 0
+        self._line_mark = (0, 0)
+        self._pending = deque()
+        self._eof = not chunk_size
         self.fd = file_buff
+        self.make_token = DocToken
         self.doc_nodes = []
         self.cursor = 0
         self.column = 0
         self.line = 0
 
+        self.meta = PageMeta() if meta is None else meta
+        self.read_front_matter()
+
+    def read_front_matter(self) -> None:
+        """
+            parse the \\o lines at the top of the page into meta, so it is
+        known before the body is lexed or anything is rendered. blank lines
+        between them are skipped, the body starts at the first line that is
+        neither. the same for every engine, mapped or not
+        """
+        newline = b"\n" if self.mapped else "\n"
+
+        while True:
+            cursor = self.cursor
+
+            if self.chunk_size:
+                end = self.find_in_window("\n", cursor)
+            else:
+                end = self.file_buff.find(newline, cursor)
+
+            if end == -1:
+                end = len(self.file_buff)
+
+            line = self.file_buff[cursor:end]
+            if self.mapped:
+                # see take_line_mapped(), a mapped source keeps its \r\n
+                line = line.decode("utf-8", "replace").removesuffix("\r")
+
+            if OPTION.match(line):
+                try:
+                    parse_option(line[2:], self.meta)
+                except ValueError as err:
+                    self.add_error(str(err), cursor)
+
+            elif line.rstrip("\r") or end == len(self.file_buff):
+                return
+
+            self.cursor = end + 1
+            self.line += 1
+
+    def fill_window(self, index: int) -> bool:
+        """
+            pull chunks from fd until index falls inside the window
+        args
+            index   cursor relative position we need to be able to read
+        returns
+            whether index is inside the window, False means EOF
+        """
+        while index >= len(self.file_buff):
+            if self._eof:
+                return False
+
+            chunk = self.fd.read(self.chunk_size)
+            if not chunk:
+                self._eof = True
+                return False
+
+            self.file_buff += chunk
+
+        return True
+
+    def compact_window(self) -> None:
+        """
+            drop everything before the cursor's line so the window stays
+            around one chunk, list items look back to the start of the line
+        """
+        if self.cursor >= self.chunk_size:
+            start = self.file_buff.rfind("\n", 0, self.cursor) + 1
+            if start:
+                self.offset += start
+                self.offset_lines += self.file_buff.count("\n", 0, start)
+                self._line_mark = (0, 0)
+
+                self.file_buff = self.file_buff[start:]
+                self.cursor -= start
+
+    def location(self, cursor: int) -> tuple:
+        """
+            where cursor is in the source
+        newlines are counted from the last place we were asked about, errors
+        come in page order so this stays linear however many there are
+        returns
+            (line, column)  both counting from 1
+        """
+        mark, lines = self._line_mark
+        if cursor < mark:
+            mark, lines = 0, 0
+
+        if self.mapped:
+            return self.location_mapped(cursor, mark, lines)
+
+        lines += self.file_buff.count("\n", mark, cursor)
+        self._line_mark = (cursor, lines)
+
+        # the window always starts at the start of a line
+        column = cursor - self.file_buff.rfind("\n", 0, cursor)
+
+        return self.offset_lines + lines + 1, column
+
+    def location_mapped(self, cursor: int, mark: int, lines: int) -> tuple:
+        """
+            location() for a mapped source, cursor is a byte offset but the
+        column counts chars like it does for a str
+        """
+        buff = self.file_buff
+
+        # an mmap has no count(), only the stretch since the mark is copied
+        lines += buff[mark:cursor].count(b"\n")
+        self._line_mark = (cursor, lines)
+
+        line_start = buff.rfind(b"\n", 0, cursor) + 1
+        column = len(buff[line_start:cursor].decode("utf-8", "replace")) + 1
+
+        return lines + 1, column
+
+    def add_error(self, message: str, cursor: int) -> None:
+        line, column = self.location(cursor)
+        self.errors.append(PageLexerError(message, self.offset + cursor, line, column))
+
+    def option_error(self, option: str, cursor: int) -> None:
+        """
+            a \\ that is not followed by an option we know, or a \\o that
+            came after the front matter
+        """
+        if option == "o":
+            self.add_error("\\o options go at the top of the page", cursor)
+        elif option and not option.isspace():
+            self.add_error(f"unknown option \\{option}", cursor)
+        else:
+            self.add_error("\\ without an option after it", cursor)
+
+    def list_item_start(self, cursor: int) -> int:
+        """
+            is there a list item at cursor
+        args
+            cursor  a digit, bullet or the indentation in front of one
+        returns
+            int     where its token starts, the start of the line when it is
+                    only indented by whitespace, -1 when this is no list item
+        """
+        # make sure the whole line is in the window
+        self.find_in_window("\n", cursor)
+
+        match = LIST_MARKER.match(self.file_buff, cursor)
+        if match is None:
+            return -1
+
+        line_start = self.file_buff.rfind("\n", 0, cursor) + 1
+        if not self.file_buff[line_start:cursor].strip(" \t"):
+            return line_start
+
+        # numbers after other junk on a line always counted as a list item
+        if match.group(1)[0].isdigit():
+            return match.start(1)
+
+        return -1
+
     def parse_between_chars(self, string: str, start: str, end: str) -> str:
         """
             I only need to support 1 chacter indexing
@@ -442,15 +1663,13 @@ class PageLexer(object):
         )
 
     def check_lookahead_bounds(self) -> bool:
-        return (
-            True if (self.lookahead_ptr + self.cursor >= len(self.file_buff)) else False
-        )
+        return not self.fill_window(self.lookahead_ptr + self.cursor)
 
     def advance_column_counter(self, amount=1) -> None:
         self.column += amount
 
     def check_bound_with_int(self, control: int) -> bool:
-        return True if control >= len(self.file_buff) else False
+        return not self.fill_window(control)
 
 
     def advance_line_counter(self, amount=1) -> None:
@@ -497,8 +1716,8 @@ class PageLexer(object):
             # if grab_string happens to touch the edge of the file buffer
             if self.check_lookahead_bounds():
 
-                # grab the last char
-                result.append(self.file_buff[-1])
+                # the last char is already in result, everything up to
+                # the edge of the buffer has been appended
 
                 # advance cursor and reset column counter
                 self.advance_line_counter()
@@ -535,7 +1754,7 @@ class PageLexer(object):
         value=None,
     ) -> None:
         """
-        add a token to the token to the token buffer
+        add a token to the pending buffer, iter_tokens() hands these out
         modes:
             insert  slot in a token at an index
             append  stick it at the end of the buffer
@@ -549,7 +1768,7 @@ class PageLexer(object):
             Nothing
         """
 
-        self.doc_nodes.append(DocToken(type, value))
+        self._pending.append(self.make_token(type, value))
 
     def peek(self) -> str:
         """
@@ -559,6 +1778,7 @@ class PageLexer(object):
         returns
             the next char in the file buffer
         """
+        self.fill_window(self.cursor + 1)
         return self.file_buff[self.cursor + 1]
 
     def peek_width(self, amount=2) -> str:
@@ -571,17 +1791,24 @@ class PageLexer(object):
         """
         assert amount != 0, "you cannot peek ahead 0"
 
+        self.fill_window(self.cursor + amount - 1)
         return self.file_buff[self.cursor : self.cursor + amount]
 
-    def read_block(self) -> str:
+    def read_block(self, fence=None) -> str:
         """
-            collecting a full string either to a new line or to EOF
+            collecting a code block up to the closing ``` or to EOF, single
+            and double backticks are part of the block
         attrs
-            in class
+            fence   where the opening ``` is, to point at if it never closes
         Returns
             str     full string to collect
         """
         # store the current char that is a char
+        if not self.fill_window(self.cursor):
+            # the page ends right after the ```
+            self.add_error("code block is never closed", fence)
+            return ""
+
         block: list = []
         block.append(self.file_buff[self.cursor])
 
@@ -594,46 +1821,381 @@ class PageLexer(object):
             # if grab_string happens to touch the edge of the file buffer
             if self.check_bound_with_int(lookahead_cursor):
 
-                # grab the last char
-                block.append(self.file_buff[-1])
+                # the last char is already in the block
+                self.add_error("code block is never closed", fence)
 
                 self.cursor = (lookahead_cursor) - 1
 
                 # give the resulting block back
                 return "".join(block)
 
-            try:
-                # if we reached the end of the line then we return the result
-                if self.file_buff[lookahead_cursor] == "`":
+            char = self.file_buff[lookahead_cursor]
+
+            # only a full ``` closes the block
+            if char == "`":
+                self.fill_window(lookahead_cursor + 2)
+
+                if self.file_buff[lookahead_cursor : lookahead_cursor + 3] == "```":
+                    # leave the cursor on the last backtick
+                    self.cursor = lookahead_cursor + 2
+                    self.advance_column_counter(2)
+
+                    # we should have the last char at this point
+                    return "".join(block)
+
+            # get the next char
+            block.append(char)
+
+            # the next char
+            self.lookahead_ptr += 1
+
+    def lex_page(self) -> list:
+        self.doc_nodes.extend(self.iter_tokens())
+        return self.doc_nodes
+
+    def iter_tokens(self, make_token=DocToken):
+        """
+            lex the page one token at a time
+        when the lexer was built with chunk_size only a window of the source is
+        kept around, so tokens should be consumed as they come out
+        args
+            make_token  called with (type, value) for everything we find,
+                        PageParser.make_node builds IR nodes here instead
+        yields
+            whatever make_token returned, DocToken by default
+        """
+        self.make_token = make_token
+
+        if self.engine == "legacy":
+            return self.iter_tokens_legacy()
+
+        if self.mapped:
+            return self.iter_tokens_mapped()
+
+        return self.iter_tokens_fast()
+
+    def find_in_window(self, sub: str, start: int) -> int:
+        """
+            str.find that pulls in more of the source until sub shows up
+        args
+            sub     what we are looking for
+            start   where to start looking in the window
+        returns
+            index of sub in the window, -1 if it is not before EOF
+        """
+        while True:
+            index = self.file_buff.find(sub, start)
+
+            if index != -1 or self._eof:
+                return index
 
-                    # reset the position cursor
-                    self.cursor = lookahead_cursor
+            # sub might straddle the chunk we are about to read
+            start = max(start, len(self.file_buff) - len(sub) + 1)
+            self.fill_window(len(self.file_buff))
 
-                    if self.peek_width() == "``":
-                        self.advance_cursor(2)
-                        self.advance_column_counter(2)
+    def take_line(self, cursor: int) -> str:
+        """
+            slice from cursor to the end of the line, the fast grab_string
+        the cursor is left on the first char of the next line
+        returns
+            str     the line without its newline
+        """
+        end = self.file_buff.find("\n", cursor)
+
+        if end == -1 and not self._eof:
+            end = self.find_in_window("\n", cursor)
+
+        if end == -1:
+            line = self.file_buff[cursor:]
+            self.cursor = len(self.file_buff)
+        else:
+            line = self.file_buff[cursor:end]
+            self.cursor = end + 1
+
+        self.line += 1
+        self.column = 0
+
+        return line
+
+    def iter_tokens_fast(self):
+        """
+            the same scan as iter_tokens_legacy, but every token is found with a
+        single regex/str.find and sliced out of file_buff in one go
+        yields
+            make_token(type, value)
+        """
+        search = LEX_TRIGGER.search
+        take_line = self.take_line
+        make_token = self.make_token
+        chunked = bool(self.chunk_size)
+
+        heading = DocNodeType.heading
+        paragraph = DocNodeType.paragraph
+        list_item = DocNodeType.list_item
+        code_block = DocNodeType.code_block
+
+        while True:
+            if chunked:
+                self.compact_window()
+
+            # skip straight to the next char that can start something
+            match = search(self.file_buff, self.cursor)
+
+            if match is None:
+                if self._eof:
+                    break
 
-                        # we should have the last char at this point
-                        return "".join(block)
+                self.cursor = len(self.file_buff)
+                self.fill_window(self.cursor)
+                continue
+
+            cursor = match.start()
+            char = match.group()
+
+            # everything below looks at most two chars ahead
+            if chunked:
+                self.fill_window(cursor + 2)
+            buff = self.file_buff
+
+            # a whole run of blank lines at once
+            if char[0] == "\n" or char[0] == "\r":
+                self.line += len(char)
+                self.column = 0
+                self.cursor = match.end()
+
+            elif char == "#":
+                yield make_token(heading, take_line(cursor))
+
+            # letters, tabs and inline markup start a paragraph,
+            # unless the tab or "*" is the start of a list item
+            elif char.isalpha() or char == "[":
+                yield make_token(paragraph, take_line(cursor))
+
+            elif char == "\t" or char == "*":
+                start = self.list_item_start(cursor)
+                if start == -1:
+                    yield make_token(paragraph, take_line(cursor))
+                else:
+                    yield make_token(list_item, take_line(start))
+
+            elif char == "-" or char == "+":
+                start = self.list_item_start(cursor)
+                if start == -1:
+                    self.cursor = cursor + 1
+                else:
+                    yield make_token(list_item, take_line(start))
+
+            elif char == "\\":
+                option = buff[cursor + 1 : cursor + 2]
+
+                if option == "c":
+                    self.cursor = cursor + 1
+                else:
+                    # drop the rest of the line and carry on with the next one
+                    self.option_error(option, cursor)
+                    take_line(cursor)
 
+            elif char == "`":
+                if buff.startswith("```", cursor):
+                    start = cursor + 3
+                    end = self.find_in_window("```", start + 1)
+
+                    buff = self.file_buff
+                    if end == -1:
+                        self.add_error("code block is never closed", cursor)
+                        block = buff[start:]
+                        self.cursor = len(buff)
                     else:
-                        continue
+                        block = buff[start:end]
+                        self.cursor = end + 3
+
+                    self.line += block.count("\n")
+                    yield make_token(code_block, block)
+                else:
+                    # a code span at the start of a line
+                    yield make_token(paragraph, take_line(cursor))
+
+            elif char == "/":
+                # comments are thrown away
+                if buff.startswith("//", cursor):
+                    take_line(cursor)
+                elif cursor + 1 == len(buff):
+                    # the window was filled two chars ahead, so this is EOF
+                    self.add_error("page ends in a lone /", cursor)
+                    self.cursor = cursor + 1
+                else:
+                    yield make_token(paragraph, take_line(cursor))
+
+            # ordered list, what is left are digits
+            else:
+                start = self.list_item_start(cursor)
+                if start == -1:
+                    self.cursor = cursor + 1
+                else:
+                    yield make_token(list_item, take_line(start))
 
-                # get the next char
-                block.append(self.file_buff[lookahead_cursor])
+    def list_item_start_mapped(self, cursor: int) -> int:
+        """
+            list_item_start() over the bytes of a mapped source
+        """
+        buff = self.file_buff
 
-                # the next char
-                self.lookahead_ptr += 1
+        match = LIST_MARKER_BYTES.match(buff, cursor)
+        if match is None:
+            return -1
 
-            except:
-                raise
+        line_start = buff.rfind(b"\n", 0, cursor) + 1
+        if not buff[line_start:cursor].strip(b" \t"):
+            return line_start
 
-        # return the level of header
-        self.cursor = lookahead_cursor
+        if match.group(1)[:1].isdigit():
+            return match.start(1)
 
-    def lex_page(self) -> list:
+        return -1
+
+    def take_line_mapped(self, cursor: int) -> str:
+        """
+            take_line() over the bytes of a mapped source, only the line is decoded
+        returns
+            str     the line without its "\\n", or its "\\r\\n" when the file
+                    was saved on windows
+        """
+        buff = self.file_buff
+        end = buff.find(b"\n", cursor)
+
+        if end == -1:
+            end = len(buff)
+        self.cursor = end + 1
+
+        if end > cursor and buff[end - 1] == 13:
+            end -= 1
+
+        self.line += 1
+        self.column = 0
+
+        return buff[cursor:end].decode()
+
+    def iter_tokens_mapped(self):
+        """
+            iter_tokens_fast() over an mmap of the source, nothing is copied out
+        of the map but the bytes of the tokens that come out, so a page of any
+        size starts lexing at once and only costs the memory of what is kept.
+        gives the same tokens as lexing the file opened as text, "\\r\\n" line
+        ends included, a lone "\\r" is not taken for a newline
+        yields
+            make_token(type, value)
+        """
+        buff = self.file_buff
+        search = LEX_TRIGGER_BYTES.search
+        take_line = self.take_line_mapped
+        list_item_start = self.list_item_start_mapped
+        make_token = self.make_token
+
+        heading = DocNodeType.heading
+        paragraph = DocNodeType.paragraph
+        list_item = DocNodeType.list_item
+        code_block = DocNodeType.code_block
+
+        while True:
+            match = search(buff, self.cursor)
+            if match is None:
+                break
+
+            cursor = match.start()
+            char = match.group()
+
+            # indexing bytes gives an int, 10 and 13 are "\n" and "\r"
+            if char[0] == 10 or char[0] == 13:
+                self.line += len(char)
+                self.column = 0
+                self.cursor = match.end()
+
+            elif char == b"#":
+                yield make_token(heading, take_line(cursor))
+
+            elif char.isalpha() or char == b"[":
+                yield make_token(paragraph, take_line(cursor))
+
+            elif char == b"\t" or char == b"*":
+                start = list_item_start(cursor)
+                if start == -1:
+                    yield make_token(paragraph, take_line(cursor))
+                else:
+                    yield make_token(list_item, take_line(start))
+
+            elif char == b"-" or char == b"+":
+                start = list_item_start(cursor)
+                if start == -1:
+                    self.cursor = cursor + 1
+                else:
+                    yield make_token(list_item, take_line(start))
+
+            elif char == b"\\":
+                option = buff[cursor + 1 : cursor + 2]
+
+                if option == b"c":
+                    self.cursor = cursor + 1
+                else:
+                    # the option can be more than one byte long
+                    option = buff[cursor + 1 : cursor + 5].decode("utf-8", "replace")
+                    self.option_error(option[:1], cursor)
+                    take_line(cursor)
+
+            elif char == b"`":
+                if buff[cursor + 1 : cursor + 3] == b"``":
+                    start = cursor + 3
+                    end = buff.find(b"```", start + 1)
+
+                    if end == -1:
+                        self.add_error("code block is never closed", cursor)
+                        end = len(buff)
+                        self.cursor = end
+                    else:
+                        self.cursor = end + 3
+
+                    block = buff[start:end]
+                    if b"\r\n" in block:
+                        block = block.replace(b"\r\n", b"\n")
+
+                    self.line += block.count(b"\n")
+                    yield make_token(code_block, block.decode())
+                else:
+                    yield make_token(paragraph, take_line(cursor))
+
+            elif char == b"/":
+                if buff[cursor + 1 : cursor + 2] == b"/":
+                    take_line(cursor)
+                elif cursor + 1 == len(buff):
+                    self.add_error("page ends in a lone /", cursor)
+                    self.cursor = cursor + 1
+                else:
+                    yield make_token(paragraph, take_line(cursor))
+
+            else:
+                start = list_item_start(cursor)
+                if start == -1:
+                    self.cursor = cursor + 1
+                else:
+                    yield make_token(list_item, take_line(start))
+
+    def iter_tokens_legacy(self):
+        """
+            the original char by char scanner, kept around to diff the fast
+        lexer against
+        yields
+            DocToken
+        """
         while True:
 
+            # make sure peek()/peek_width() have something to look at
+            if self.chunk_size:
+                self.compact_window()
+                self.fill_window(self.cursor + 2)
+
+            # hand out whatever the last step produced
+            while self._pending:
+                yield self._pending.popleft()
+
             # detecting the bounds of the line
             # if our cursor exceeds the bounds of the file_buff we can exit the parser
             if self.check_bound_with_int(self.cursor):
@@ -656,38 +2218,49 @@ class PageLexer(object):
                 assert heading, "grab_string() l659 returned nothing"
                 assert heading.__contains__("#"), "heading did not contain #"
 
-                self.add_token(DocNodeType["heading"], heading)
+                self.add_token(DocNodeType.heading, heading)
 
             elif char == "\\":
-
-                if self.peek() == "o":
-                    # self.add_option()
-                    ...
+                option = self.peek_width(2)[1:]
 
                 # Githug embeds
-                elif self.peek() == "c":
+                if option == "c":
                     # self.add_option()
                     ...
 
                 else:
-                    raise Exception(f"Unknown Option: {self.peek()}")
+                    # skip the line, the advance below steps over its newline
+                    self.option_error(option, self.cursor)
+                    self.grab_string()
 
             elif char == "`":
-                if self.peek_width(2) == "``":
+                if self.peek_width(3) == "```":
+                    fence = self.cursor
+
                     # move two more characters forward
                     self.advance_cursor(3)
                     self.advance_column_counter(3)
-                    block = self.read_block().replace("<", "&lt;").replace(">", "&gt;")
-                    self.add_token(DocNodeType["code_block"], block)
+                    self.add_token(DocNodeType.code_block, self.read_block(fence))
+
+                else:
+                    # a code span at the start of a line
+                    self.add_token(DocNodeType.paragraph, self.grab_string())
+
+            elif char.isdigit() or char in ("+", "*", "\t"):
+                # ordered list or bullets, grab_string from where the
+                # indentation of the item starts
+                start = self.list_item_start(self.cursor)
 
-            elif char.isdigit():
-                # ordered list
-                if self.peek() == ".":
+                if start != -1:
+                    self.cursor = start
                     item = self.grab_string()
                     assert item, "item returned nothing l690"
 
-                    # here we reuse the size of the node to specify the list item value
-                    self.add_token(DocNodeType["list_item"], item)
+                    self.add_token(DocNodeType.list_item, item)
+
+                elif char in ("*", "\t"):
+                    paragraph = self.grab_string()
+                    self.add_token(DocNodeType.paragraph, paragraph)
 
             #elif char == "[":
                 # check for ()
@@ -695,61 +2268,333 @@ class PageLexer(object):
                 # check for next ]
 
             elif char == "-":
-                if self.peek_width(2) == "//":
+                start = self.list_item_start(self.cursor)
+
+                if start != -1:
+                    self.cursor = start
+                    self.add_token(DocNodeType.list_item, self.grab_string())
+
+                elif self.peek_width(2) == "//":
                     # grab that comment
                     option = self.grab_string()[1:]
                     assert option, "string returned nothing"
 
                     # add a list-comment token
-                    self.add_token(DocNodeType["list_item_comment"], option)
+                    self.add_token(DocNodeType.list_item_comment, option)
 
             # grab comment or paragraph
             elif char == "/":
+                # the page can end right after the /, there is nothing to peek
+                if self.check_bound_with_int(self.cursor + 1):
+                    self.add_error("page ends in a lone /", self.cursor)
+
                 # make sure that the next char in the line is a comment
-                if self.peek() == "/":
+                elif self.peek() == "/":
 
                     # we have to advance the cursor here because otherwise we would
                     # have an infinite loop
                     self.advance_cursor()
                     self.advance_column_counter()
 
-                    # throw away string to seek to a good point in the file
+                    # throw away string to seek to a good point in the file,
+                    # the advance below steps over the newline it stopped on
                     _ = self.grab_string()
 
-                    continue
-
-                # grab the full string any way, so that we don't consider '/' a comment
-                paragraph = self.grab_string()
-                assert string, "string returned nothing"
-                self.add_token(DocNodeType["paragraph"], paragraph)
+                else:
+                    # grab the full string any way, so that we don't consider '/' a comment
+                    paragraph = self.grab_string()
+                    assert paragraph, "string returned nothing"
+                    self.add_token(DocNodeType.paragraph, paragraph)
 
-            # here we can just grab a full string
-            elif self.is_char(char) or char == "\t":
+            # here we can just grab a full string, inline markup
+            # like *emphasis* or [links](...) can start one too
+            elif self.is_char(char) or char == "[":
 
                 paragraph = self.grab_string()
                 assert paragraph
 
-                self.add_token(DocNodeType["paragraph"], paragraph)
+                self.add_token(DocNodeType.paragraph, paragraph)
 
             # go to the next char at the top of the scope
             self.advance_cursor()
             self.advance_column_counter()
 
-        return self.doc_nodes
+
+def render_chunk(
+    first: int, last: int, slugs: dict, index: bool, timed=False
+) -> tuple:
+    """
+        render nodes[first:last] of the page render_parallel() is working on,
+        this runs in a forked worker
+    args
+        slugs   the heading ids taken before this chunk
+        index   collect search terms as well
+        timed   time every block and count the nodes like render_nodes()
+                does with stats
+    returns
+        (html, headings, terms, stats, used)    the html and what the chunk adds
+                                                to the PageOutline, terms[0]
+                                                belongs to the section the chunk
+                                                starts in. stats is a PageStats
+                                                of the blocks if timed, used the
+                                                assets the chunk linked to
+    """
+    page = _parallel_parser
+    outline = PageOutline(slugs=slugs, index=index)
+    parser = PageParser(layout=page.layout, outline=outline, assets=page.assets)
+    stats = PageStats() if timed else None
+
+    # the worker's copy of the assets may have been used by an earlier chunk
+    if page.assets is not None:
+        page.assets.used = {}
+
+    for node in page.tree.successors[first:last]:
+        if stats is None:
+            parser.render_node(node)
+            continue
+
+        mark = len(parser.page)
+        start = time.perf_counter()
+
+        parser.render_node(node)
+
+        seconds = time.perf_counter() - start
+        size = sum(len(html.encode()) for html in parser.page[mark:])
+        stats.add_block(seconds, node, size)
+        stats.count_nodes(node)
+
+    used = page.assets.used if page.assets is not None else {}
+
+    return "".join(parser.page), outline.headings, outline.terms, stats, used
+
+
+def page_title(source: str) -> str:
+    """
+        what a page is called when nothing else says so, "subnetting.md" -> "subnetting"
+    """
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def map_source(fd):
+    """
+        map a source file opened in binary mode for PageLexer
+    returns
+        mmap    read only map of the whole file, b"" for an empty file as
+                those cannot be mapped
+    """
+    if os.fstat(fd.fileno()).st_size == 0:
+        return b""
+
+    return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def compile_page(
+    source: str,
+    engine="fast",
+    layout=None,
+    slots=None,
+    outline=None,
+    errors=None,
+    assets=None,
+    meta=None,
+) -> str:
+    """
+        run a single source file through the lexer and parser
+    args
+        source  path to the markdown file
+        engine  which PageLexer engine to use
+        layout  PageTemplate to wrap the page in, None for the default layout
+        slots   values for the layout slots, the title defaults to the first
+                h1 of the page and then page_title()
+        outline PageOutline to collect the headings in
+        errors  list the PageLexerErrors of the page are added to
+        assets  assets.PageAssets to rewrite links to local files with
+        meta    PageMeta to read the front matter of the page into, its title
+                wins over the one in slots
+    returns
+        str     the html page
+    """
+    slots = dict({"title": page_title(source)}, **(slots or {}))
+
+    with open(source, "r") as fd:
+        page = PageLexer(fd, engine=engine, meta=meta)
+        if page.meta.title:
+            slots["title"] = page.meta.title
+
+        parser = PageParser(
+            layout=layout,
+            slots=slots,
+            outline=outline,
+            assets=assets,
+            h1_title=not page.meta.title,
+        )
+        html = parser.render(lexer=page)
+
+    if errors is not None:
+        errors.extend(page.errors)
+
+    return html
+
+
+def compile_text(
+    text: str,
+    engine="fast",
+    layout=None,
+    slots=None,
+    outline=None,
+    errors=None,
+    meta=None,
+) -> str:
+    """
+        compile_page() for markdown that is already in memory, the arguments
+        are the same except there is no file to take a title from
+    """
+    page = PageLexer(io.StringIO(text), engine=engine, meta=meta)
+    if page.meta.title:
+        slots = dict(slots or {}, title=page.meta.title)
+
+    parser = PageParser(
+        layout=layout, slots=slots, outline=outline, h1_title=not page.meta.title
+    )
+    html = parser.render(lexer=page)
+
+    if errors is not None:
+        errors.extend(page.errors)
+
+    return html
 
 
 if __name__ == "__main__":
-    with open(sys.argv[1], "r") as fd:
-        page = PageLexer(fd)
+    # core.py build <src_dir> <out_dir> [-j N]
+    # core.py watch <src_dir> <out_dir>
+    if len(sys.argv) > 1 and sys.argv[1] in ("build", "watch"):
+        import build
+
+        sys.exit(build.main(sys.argv[1:]))
+
+    # core.py serve [--socket <path>] [-j N], see client.py for the other end
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        import server
+
+        sys.exit(server.main(sys.argv[2:]))
+
+    # core.py dev <src_dir> [--port N], a live preview of src_dir
+    if len(sys.argv) > 1 and sys.argv[1] == "dev":
+        import devserver
+
+        sys.exit(devserver.main(sys.argv[2:]))
+
+    engine = "legacy" if "--legacy-lexer" in sys.argv else "fast"
+
+    # --stream only keeps a window of the source in memory
+    chunk_size = STREAM_CHUNK_SIZE if "--stream" in sys.argv else None
+
+    # --mmap lexes the source where it lies instead of reading it in
+    mapped = "--mmap" in sys.argv
+    if mapped and (chunk_size or engine == "legacy"):
+        sys.exit("--mmap does not go with --stream or --legacy-lexer")
+
+    # --jobs <n> renders chunks of a huge page in n worker processes
+    jobs = 1
+    if "--jobs" in sys.argv:
+        jobs = int(sys.argv[sys.argv.index("--jobs") + 1])
+
+    # an output path of - sends the page to stdout, so it can be piped on
+    target = sys.argv[2]
+    log = sys.stderr if target == "-" else sys.stdout
+
+    # --layout <file> wraps the page in another layout
+    layout = None
+    if "--layout" in sys.argv:
+        layout = template.load_layout(sys.argv[sys.argv.index("--layout") + 1])
+
+        # a {{ toc }} before content holds the page back, which streaming can't
+        if chunk_size and layout.held:
+            sys.exit(f"{layout.source}: --stream needs {{{{ toc }}}} after content")
 
-        with open(sys.argv[2], "w+") as fd:
+    slots = {"title": page_title(sys.argv[1])}
+
+    # --stats prints where the time went, --stats-json the same as JSON
+    stats = None
+    if "--stats" in sys.argv or "--stats-json" in sys.argv:
+        stats = PageStats()
+
+    with open(sys.argv[1], "rb" if mapped else "r") as fd:
+        page = PageLexer(map_source(fd) if mapped else fd, chunk_size, engine)
+        if page.meta.title:
+            slots["title"] = page.meta.title
+
+
+        # --minify collapses whitespace on the way out, --gzip <level> gzips a
+        # copy of the page into <output>.gz as it is written
+        writers = []
+        out = sys.stdout if target == "-" else open(target, "w+")
+        stream = out
+        gzip_fd = None
+
+        if "--gzip" in sys.argv:
+            if target == "-":
+                sys.exit("--gzip needs an output file")
+
+            gzip_fd = open(target + ".gz", "wb")
+            level = int(sys.argv[sys.argv.index("--gzip") + 1])
+            stream = minify.GzipWriter(stream, gzip_fd, level)
+            writers.append(stream)
+
+        if "--minify" in sys.argv:
+            stream = minify.MinifyingWriter(stream)
+            writers.append(stream)
+
+        # --debug keeps the token list around so it can be dumped,
+        # otherwise the lexer feeds the IR directly
+        if "--debug" in sys.argv:
+            start = time.perf_counter()
             tokens = page.lex_page()
-            parser = PageParser(tokens)
-            final = parser.render()
-            if "--debug" in sys.argv:
-                for node in page.doc_nodes:
-                    print(node)
-            print("Nodes Processed:", len(page.doc_nodes))
-            fd.write(final)  # pyright: ignore
-
-    sys.exit(0)
+            if stats is not None:
+                stats.add_phase("lex", time.perf_counter() - start)
+
+            parser = PageParser(
+                tokens,
+                stats=stats,
+                layout=layout,
+                slots=slots,
+                h1_title=not page.meta.title,
+            )
+            stream.write(parser.render())
+            for node in page.doc_nodes:
+                print(node, file=log)
+            print("Nodes Processed:", len(page.doc_nodes), file=log)
+
+        else:
+            parser = PageParser(
+                stats=stats, layout=layout, slots=slots, h1_title=not page.meta.title
+            )
+
+            if jobs > 1:
+                stream.write(parser.render_parallel(jobs, lexer=page))
+                count = len(parser.tree.successors)
+            else:
+                count = parser.render_to(stream, lexer=page)
+
+            print("Nodes Processed:", count, file=log)
+
+    # the minifier holds on to the end of the page, it goes first
+    for writer in reversed(writers):
+        writer.close()
+
+    if gzip_fd is not None:
+        gzip_fd.close()
+    if out is not sys.stdout:
+        out.close()
+
+    # everything the lexer had to skip, the page is written out regardless
+    for error in page.errors:
+        print(f"{sys.argv[1]}:{error}", file=sys.stderr)
+
+    if "--stats" in sys.argv:
+        print(stats, file=log)
+
+    if "--stats-json" in sys.argv:
+        print(json.dumps(stats.as_dict(), indent=1), file=log)
+
+    sys.exit(1 if page.errors else 0)
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+
+#   \title      devserver.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       A live preview server, pages are compiled when they are asked
+#               for and open tabs reload when their source changes
+#
+#   \license    MIT
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from dataclasses import asdict, dataclass
+from urllib.parse import unquote, urlsplit
+import argparse
+import mimetypes
+import posixpath
+import traceback
+import threading
+import time
+import sys
+import os
+
+from escape import escape_text
+import siteindex
+import template
+import build
+import core
+
+
+# served as /styles/, the stylesheet link of every page points in here
+STYLES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "styles"
+)
+
+# where pages are told the stylesheet is, whatever directory they are in
+STYLESHEET_URL = "/styles/" + os.path.basename(core.STYLESHEET)
+
+# the server-sent event stream every page listens on
+EVENTS_URL = "/__pquill/events"
+
+# goes into the meta slot of every page, reloads the tab when the server says
+# its page (or everything, "*") changed. "/" is the same page as "/index.html"
+RELOAD_SCRIPT = (
+    f"\n<script>new EventSource('{EVENTS_URL}').onmessage = function (event) {{"
+    " var page = location.pathname.replace(/\\/$/, '/index.html');"
+    " if (event.data === '*' || event.data === page) location.reload(); };"
+    "</script>"
+)
+
+# seconds between two comments on an idle event stream, so a tab that went
+# away is noticed by the write failing
+KEEPALIVE = 15.0
+
+
+@dataclass(init=True, slots=True)
+class DevPage:
+    """
+    A compiled page and what it was compiled from
+    args
+        signature   (mtime_ns, size, inode) of the source, see build.snapshot()
+        layout      the PageTemplate the html was rendered with
+        nodes       top-level IR of the page
+        blocks      (token type, token value) -> the IR node built for it
+        html        the rendered page
+        outline     PageOutline.as_dict() of the page
+        diagnostics PageLexerErrors of the page
+        meta        PageMeta out of the front matter of the page
+    """
+
+    signature: tuple
+    layout: template.PageTemplate
+    nodes: list
+    blocks: dict
+    html: bytes
+    outline: dict
+    diagnostics: list
+    meta: core.PageMeta
+
+
+class ReusingParser(core.PageParser):
+    """
+    A PageParser that hands back the IR node it built last time for a token it
+    has seen before, so after an edit only the lines that changed are parsed
+    previous   blocks of the last compile of the page
+    blocks     what this compile built, the previous blocks for the next one
+    """
+
+    def __init__(self, previous: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.previous = previous
+        self.blocks = {}
+
+    def make_node(self, type: core.DocNodeType, value: str) -> core.DocNode:
+        # iter_ir() hangs nested lists off list items, those are always new
+        if type is core.DocNodeType.list_item:
+            return super().make_node(type, value)
+
+        key = (type, value)
+        node = self.previous.get(key)
+
+        if node is None:
+            node = super().make_node(type, value)
+
+        self.blocks[key] = node
+
+        return node
+
+
+class DevSite(object):
+    """
+    The pages of a source directory, compiled on demand and kept in memory
+    src_dir     directory the pages are in
+    layout      layout file to wrap pages in, None for the default
+    engine      which PageLexer engine to use
+    pages       page -> DevPage
+    changes     (generation, url) of recent changes, newest last
+    generation  bumped on every change, event streams wait on it
+    """
+
+    def __init__(self, src_dir: str, layout=None, engine="fast"):
+        self.src_dir = src_dir
+        self.layout = layout
+        self.engine = engine
+        self.pages = {}
+        self.changes = deque(maxlen=256)
+        self.generation = 0
+
+        # compiles share the highlight and layout caches, one at a time
+        self.lock = threading.Lock()
+        self.changed = threading.Condition()
+
+    def compile(self, page: str) -> DevPage:
+        """
+            the page, compiled again only if its source or the layout changed
+        when only the layout changed the IR is rendered again without lexing,
+        when the source changed the blocks that did not are reused
+        raises
+            FileNotFoundError   there is no such page
+        """
+        path = os.path.join(self.src_dir, page)
+
+        with self.lock:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            layout = template.load_layout(self.layout)
+
+            cached = self.pages.get(page)
+            if cached and cached.signature == signature and cached.layout is layout:
+                return cached
+
+            start = time.perf_counter()
+            slots = {
+                "stylesheet": STYLESHEET_URL,
+                "title": core.page_title(page),
+                "meta": RELOAD_SCRIPT,
+            }
+            outline = core.PageOutline(index=True)
+
+            if cached and cached.signature == signature:
+                meta = cached.meta
+                if meta.title:
+                    slots["title"] = meta.title
+
+                parser = core.PageParser(
+                    layout=layout, slots=slots, outline=outline, h1_title=not meta.title
+                )
+                parser.render_nodes(cached.nodes)
+                nodes, blocks = cached.nodes, cached.blocks
+                diagnostics = cached.diagnostics
+                how = "rendered"
+
+            else:
+                previous = cached.blocks if cached else {}
+
+                with open(path, "r") as fd:
+                    # the front matter is read here, before the head is rendered
+                    lexer = core.PageLexer(fd, engine=self.engine)
+                    meta = lexer.meta
+                    if meta.title:
+                        slots["title"] = meta.title
+
+                    parser = ReusingParser(
+                        previous,
+                        layout=layout,
+                        slots=slots,
+                        outline=outline,
+                        h1_title=not meta.title,
+                    )
+                    parser.create_ir(lexer)
+                    parser.render_nodes(parser.tree.successors)
+
+                nodes, blocks = parser.tree.successors, parser.blocks
+                diagnostics = lexer.errors
+                kept = set(map(id, previous.values()))
+                reused = sum(id(node) in kept for node in nodes)
+                how = f"compiled ({reused}/{len(nodes)} blocks reused)"
+
+            compiled = DevPage(
+                signature,
+                layout,
+                nodes,
+                blocks,
+                "".join(parser.page).encode(),
+                outline.as_dict(),
+                diagnostics,
+                meta,
+            )
+            self.pages[page] = compiled
+
+        print(f"{how} {page} in {(time.perf_counter() - start) * 1000:.2f}ms")
+        for error in diagnostics:
+            print(f"{page}:{error}")
+
+        return compiled
+
+    def outlines(self) -> dict:
+        """
+            outlines of every page, compiling the ones that are not up to date
+        """
+        outlines = {}
+
+        for page in build.snapshot(self.src_dir):
+            try:
+                outlines[page] = self.compile(page).outline
+            except (FileNotFoundError, ValueError):
+                # gone, or broken, asking for the page itself says why
+                continue
+
+        return outlines
+
+    def metas(self) -> dict:
+        """
+            front matter of every page outlines() compiled, as dicts
+        """
+        with self.lock:
+            pages = list(self.pages.items())
+
+        return {page: asdict(compiled.meta) for page, compiled in pages}
+
+    def notify(self, url: str) -> None:
+        with self.changed:
+            self.generation += 1
+            self.changes.append((self.generation, url))
+            self.changed.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> list:
+        """
+            block until something changes after generation seen
+        returns
+            list    (generation, url) of the changes, empty on timeout
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.generation != seen, timeout)
+
+            return [change for change in self.changes if change[0] > seen]
+
+    def shared_files(self) -> dict:
+        """
+            stat of the files every page depends on, the layout and the styles
+        """
+        paths = [os.path.abspath(self.layout or template.DEFAULT_LAYOUT)]
+        for root, dirs, files in os.walk(STYLES_DIR):
+            paths.extend(os.path.join(root, name) for name in files)
+
+        shared = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            shared[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return shared
+
+    def watch(self, interval: float) -> None:
+        """
+            poll for changes and tell the open tabs, pages are not compiled
+            here, the tab asking for its page again does that
+        """
+        known = build.snapshot(self.src_dir)
+        shared = self.shared_files()
+
+        while True:
+            time.sleep(interval)
+
+            current = build.snapshot(self.src_dir)
+            current_shared = self.shared_files()
+
+            # a new or removed page changes the index of every page
+            if current_shared != shared or current.keys() != known.keys():
+                self.notify("*")
+
+            else:
+                changed = [
+                    page for page in current if current[page] != known[page]
+                ]
+                for page in changed:
+                    self.notify("/" + siteindex.page_url(page))
+                if changed:
+                    self.notify("/" + siteindex.SITE_INDEX)
+
+            known, shared = current, current_shared
+
+
+class DevHandler(BaseHTTPRequestHandler):
+    """
+    Serves the pages of server.site, the styles and whatever else is in src_dir
+    """
+
+    server_version = f"pquill/{core.__version__}"
+
+    def do_GET(self) -> None:
+        site = self.server.site
+        path = posixpath.normpath(unquote(urlsplit(self.path).path))
+
+        if path == EVENTS_URL:
+            return self.send_events()
+
+        path = path.lstrip("/")
+        if not path or path == ".":
+            path = siteindex.SITE_INDEX
+
+        # nothing outside the two directories we serve
+        if path == ".." or path.startswith("../"):
+            return self.send_error(404)
+
+        if path.endswith(".html"):
+            page = path[: -len(".html")].replace("/", os.sep) + ".md"
+
+            try:
+                return self.send_body(site.compile(page).html, "text/html")
+            except FileNotFoundError:
+                pass
+            except Exception as err:
+                return self.send_failure(page, err)
+
+            try:
+                return self.send_generated(path)
+            except FileNotFoundError:
+                pass
+            except Exception as err:
+                return self.send_failure(path, err)
+
+        if path == siteindex.SEARCH_INDEX:
+            outlines = site.outlines()
+            search = siteindex.search_json(outlines, site.metas())
+            return self.send_body(search.encode(), "application/json")
+
+        if path.startswith("styles/"):
+            return self.send_file(os.path.join(STYLES_DIR, path[len("styles/") :]))
+
+        return self.send_file(os.path.join(site.src_dir, path))
+
+    def send_generated(self, path: str) -> None:
+        """
+            the site index or the page of a tag, if path is one of them
+        raises
+            FileNotFoundError   path is neither
+        """
+        site = self.server.site
+
+        if path == siteindex.SITE_INDEX:
+            outlines = site.outlines()
+            html = siteindex.index_page(
+                outlines,
+                template.load_layout(site.layout),
+                {"stylesheet": STYLESHEET_URL, "meta": RELOAD_SCRIPT},
+                site.metas(),
+            )
+            return self.send_body(html.encode(), "text/html")
+
+        if path.startswith(siteindex.TAGS_DIR + "/"):
+            outlines = site.outlines()
+            metas = site.metas()
+
+            for tag, pages in siteindex.tagged(metas).items():
+                if siteindex.tag_url(tag) == path:
+                    html = siteindex.tag_page(
+                        tag,
+                        pages,
+                        outlines,
+                        metas,
+                        template.load_layout(site.layout),
+                        {"stylesheet": STYLESHEET_URL, "meta": RELOAD_SCRIPT},
+                    )
+                    return self.send_body(html.encode(), "text/html")
+
+        raise FileNotFoundError(path)
+
+    def send_failure(self, name: str, err: Exception) -> None:
+        """
+            a 500 page saying why name did not compile. it is not put in the
+            layout, which could be what is broken, but it listens for changes
+            like every page so the tab reloads once the source is fixed
+        """
+        print(f"error: {name}: {type(err).__name__}: {err}", file=sys.stderr)
+
+        trace = "".join(traceback.format_exception(err))
+        body = (
+            f"<!DOCTYPE html>\n<html><head><title>{escape_text(name)}</title>"
+            f"{RELOAD_SCRIPT}</head><body><h1>{escape_text(name)} did not compile"
+            f"</h1><pre>{escape_text(trace)}</pre></body></html>\n"
+        )
+        self.send_body(body.encode(), "text/html", 500)
+
+    def send_body(self, body: bytes, content_type: str, status=200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+
+        # always ask again, the page might have changed since
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, path: str) -> None:
+        try:
+            with open(path, "rb") as fd:
+                body = fd.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return self.send_error(404)
+
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.send_body(body, content_type)
+
+    def send_events(self) -> None:
+        """
+            a server-sent event stream, one event per changed url
+        """
+        site = self.server.site
+        seen = site.generation
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+
+        try:
+            while True:
+                changes = site.wait(seen, KEEPALIVE)
+
+                if not changes:
+                    self.wfile.write(b": keepalive\n\n")
+
+                for seen, url in changes:
+                    self.wfile.write(f"data: {url}\n\n".encode())
+
+                self.wfile.flush()
+
+        except (BrokenPipeError, ConnectionResetError):
+            # the tab was closed or reloaded
+            pass
+
+    def log_message(self, format, *args) -> None:
+        # compiles are logged by DevSite, every stylesheet hit is just noise
+        pass
+
+
+def main(argv: list) -> int:
+    args = argparse.ArgumentParser(prog="core.py dev")
+    args.add_argument("src_dir")
+    args.add_argument("--host", default="127.0.0.1")
+    args.add_argument("--port", type=int, default=8000)
+    args.add_argument("--interval", type=float, default=0.1)
+    args.add_argument("--legacy-lexer", action="store_true")
+    args.add_argument("--layout", help="layout file to wrap pages in")
+
+    opts = args.parse_args(argv)
+    engine = "legacy" if opts.legacy_lexer else "fast"
+
+    site = DevSite(opts.src_dir, opts.layout, engine)
+
+    server = ThreadingHTTPServer((opts.host, opts.port), DevHandler)
+    server.daemon_threads = True
+    server.site = site
+
+    watcher = threading.Thread(target=site.watch, args=(opts.interval,), daemon=True)
+    watcher.start()
+
+    print(f"serving {opts.src_dir} on http://{opts.host}:{opts.port}/", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+#   \title      escape.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Escaping text and attribute values for html
+#
+#   \license    MIT
+
+
+# characters that have to be escaped in text
+SPECIAL = frozenset("&<>")
+
+# almost no text has anything to escape in it, so both functions check with
+# "in" first, which is a memchr() per character and much cheaper than
+# building a new string. when there is something to escape, chained
+# replace() calls beat str.translate() by ~9x, translate() looks every
+# character up in the table once it has to grow the string
+#
+# core.InlineParser looks for these while it scans for markup anyway, only
+# the text it marks as unsafe_text comes here
+
+
+def escape_text(text: str) -> str:
+    """
+        text that goes between tags
+    """
+    if "&" in text or "<" in text or ">" in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    return text
+
+
+def escape_attr(value: str) -> str:
+    """
+        an attribute value, quoted with either kind of quote
+    """
+    value = escape_text(value)
+
+    if "'" in value or '"' in value:
+        return value.replace("'", "&#39;").replace('"', "&quot;")
+
+    return value
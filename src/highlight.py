@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+#   \title      highlight.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       A small syntax highlighter for fenced code blocks
+#
+#   \license    MIT
+
+
+from escape import escape_text
+import threading
+import hashlib
+import re
+
+
+# how many highlighted blocks to keep around, oldest goes first
+CACHE_SIZE = 4096
+
+# names a ```<lang> line can use for a language
+ALIASES = {
+    "python": "python",
+    "py": "python",
+    "c": "c",
+    "h": "c",
+    "shell": "shell",
+    "bash": "shell",
+    "sh": "shell",
+    "console": "shell",
+    "yaml": "yaml",
+    "yml": "yaml",
+}
+
+
+def words(*names: str) -> str:
+    return r"\b(?:" + "|".join(names) + r")\b"
+
+
+# every language is a list of (class, pattern), earlier rules win where two
+# could match at the same place. the class ends up as <span class='...'> and
+# the patterns must not have capturing groups of their own. a string or
+# comment that is never closed runs to the end of its line or the block, a
+# rule that could fail after scanning ahead would scan again from every
+# later place it can start and take quadratic time
+RULES = {
+    "python": [
+        ("c", r"#[^\n]*"),
+        (
+            "s",
+            r"(?:\b[rRbBuUfF]{1,2})?(?:\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?'''"
+            r"|\"(?:\\.?|[^\"\\\n])*(?:\"|$)|'(?:\\.?|[^'\\\n])*(?:'|$))",
+        ),
+        ("p", r"@[\w.]+"),
+        (
+            "k",
+            words(
+                "False", "None", "True", "and", "as", "assert", "async", "await",
+                "break", "class", "continue", "def", "del", "elif", "else",
+                "except", "finally", "for", "from", "global", "if", "import",
+                "in", "is", "lambda", "nonlocal", "not", "or", "pass", "raise",
+                "return", "try", "while", "with", "yield",
+            ),
+        ),
+        (
+            "b",
+            words(
+                "self", "cls", "print", "len", "range", "enumerate", "isinstance",
+                "str", "int", "float", "bool", "list", "dict", "set", "tuple",
+                "object", "super", "open", "iter", "next", "type",
+            ),
+        ),
+        ("n", r"\b(?:0[xXoObB][\da-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?j?)"),
+    ],
+    "c": [
+        # an unclosed /* runs to the end, or every /* after it would scan
+        # to the end again
+        ("c", r"//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)"),
+        ("p", r"^[ \t]*#[ \t]*\w+"),
+        ("s", r"\"(?:\\.?|[^\"\\\n])*(?:\"|$)|'(?:\\.?|[^'\\\n])*(?:'|$)"),
+        (
+            "k",
+            words(
+                "auto", "break", "case", "const", "continue", "default", "do",
+                "else", "enum", "extern", "for", "goto", "if", "inline",
+                "register", "restrict", "return", "sizeof", "static", "struct",
+                "switch", "typedef", "union", "volatile", "while",
+            ),
+        ),
+        (
+            "b",
+            words(
+                "void", "char", "short", "int", "long", "float", "double",
+                "signed", "unsigned", "_Bool", "bool", "size_t", "ssize_t",
+                r"u?int(?:8|16|32|64)_t", "NULL",
+            ),
+        ),
+        ("n", r"\b(?:0[xX][\da-fA-F]+|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)[uUlLfF]*"),
+    ],
+    "shell": [
+        ("c", r"(?:^|(?<=[ \t]))#[^\n]*"),
+        ("s", r"\"(?:\\[\s\S]?|[^\"\\])*(?:\"|\Z)|'[^']*'"),
+        ("v", r"\$(?:\{[^}\n]*\}?|\w+|[@*#?$!-])"),
+        (
+            "k",
+            words(
+                "if", "then", "else", "elif", "fi", "for", "while", "until", "do",
+                "done", "case", "esac", "in", "function", "return", "select",
+            ),
+        ),
+        (
+            "b",
+            words(
+                "echo", "cd", "export", "local", "read", "set", "unset", "source",
+                "exit", "sudo", "printf", "test", "shift", "eval", "exec",
+            ),
+        ),
+    ],
+    "yaml": [
+        ("c", r"(?:^|(?<=[ \t]))#[^\n]*"),
+        ("s", r"\"(?:\\.?|[^\"\\\n])*(?:\"|$)|'(?:''|[^'\n])*'"),
+        ("v", r"(?<![\w.-])[\w.-]+(?=[ \t]*:(?:[ \t]|$))"),
+        ("p", r"^(?:---|\.\.\.)$|[&*][\w-]+|![\w!]*"),
+        (
+            "k",
+            words("true", "false", "null", "yes", "no", "on", "off", "True", "False"),
+        ),
+        ("n", r"(?<![\w.-])[+-]?\d+(?:\.\d+)?(?![\w.-])"),
+    ],
+}
+
+# language -> the rules above compiled into one pattern, filled in on first use
+_compiled = {}
+
+# digest of (lang, code) -> html, see highlight()
+_highlighted = {}
+
+# the compile server highlights from more than one thread
+_highlighted_lock = threading.Lock()
+
+
+def compile_rules(lang: str) -> re.Pattern:
+    """
+        one alternation for the whole language, so a block is highlighted in
+        a single finditer() instead of one pass per rule
+    """
+    pattern = _compiled.get(lang)
+
+    if pattern is None:
+        pattern = re.compile(
+            "|".join(f"(?P<{name}>{rule})" for name, rule in RULES[lang]),
+            re.MULTILINE,
+        )
+        _compiled[lang] = pattern
+
+    return pattern
+
+
+def highlight(lang: str, code: str) -> str:
+    """
+        escape code and wrap what it recognizes in spans
+    args
+        lang    what came after the ``` fence, case does not matter
+        code    the code block, not escaped yet
+    returns
+        str     html for inside the <pre>, None if lang is not a language we know
+    """
+    lang = ALIASES.get(lang.lower())
+    if lang is None:
+        return None
+
+    # the same snippet tends to show up on more than one page
+    key = hashlib.blake2b(f"{lang}\0{code}".encode(), digest_size=16).digest()
+
+    html = _highlighted.get(key)
+    if html is not None:
+        return html
+
+    html = []
+    last = 0
+
+    for match in compile_rules(lang).finditer(code):
+        start, end = match.span()
+        if start == end:
+            continue
+
+        html.append(escape_text(code[last:start]))
+        html.append(
+            f"<span class='{match.lastgroup}'>{escape_text(match.group())}</span>"
+        )
+        last = end
+
+    html.append(escape_text(code[last:]))
+    html = "".join(html)
+
+    with _highlighted_lock:
+        if len(_highlighted) >= CACHE_SIZE:
+            del _highlighted[next(iter(_highlighted))]
+
+        _highlighted[key] = html
+
+    return html
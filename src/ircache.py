@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+
+#   \title      ircache.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       A compact binary form of the IR, so unchanged pages can go
+#               straight to the renderer without being lexed and parsed
+#
+#   \license    MIT
+
+
+from itertools import accumulate
+import hashlib
+import re
+import io
+import os
+
+import core
+
+
+# hash of core.py for this process, the IR changes whenever it does
+_core_digest = None
+
+# first bytes of every cached page
+MAGIC = b"PQIR"
+
+# bumped whenever the layout below changes, older files are not read
+IR_VERSION = 1
+
+# node type <-> code, the types that show up most come first so their header
+# fits in one byte. new types go on the end, removing one needs IR_VERSION bumped
+TYPES = (
+    core.DocNodeType.text,
+    core.DocNodeType.unsafe_text,
+    core.DocNodeType.paragraph,
+    core.DocNodeType.list_item,
+    core.DocNodeType.heading,
+    core.DocNodeType._list,
+    core.DocNodeType.code_block,
+    core.DocNodeType.inline_code,
+    core.DocNodeType.emphasis,
+    core.DocNodeType.strong,
+    core.DocNodeType.anchor,
+    core.DocNodeType.list_item_comment,
+    core.DocNodeType.identifier,
+    core.DocNodeType.comment,
+    core.DocNodeType.newline,
+    core.DocNodeType.tab,
+    core.DocNodeType.root,
+)
+CODES = {type: code for code, type in enumerate(TYPES)}
+
+# the low bits of a node header, the type code sits above them. a field that
+# is left out has the DocNode default
+HAS_TEXT = 1
+HAS_SUCCESSORS = 2
+HAS_NUMBERS = 4
+UNORDERED = 8
+FLAG_BITS = 4
+
+# the bytes of a varint that say another byte follows
+CONTINUED = re.compile(rb"[\x80-\xff]+")
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """
+        7 bits at a time, lowest first, the top bit says another byte follows
+    """
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+
+    out.append(value)
+
+
+def decode_varints(data: bytes) -> list:
+    """
+        every varint in data. most are a single byte and are copied over in
+        bulk, only the numbers over 127 are put together in python
+    """
+    values = []
+    last = 0
+
+    for match in CONTINUED.finditer(data):
+        start, end = match.span()
+        values += data[last:start]
+        values.append(join_varint(data[start : end + 1]))
+        last = end + 1
+
+    values += data[last:]
+
+    return values
+
+
+def join_varint(raw: bytes) -> int:
+    value = 0
+    for shift, byte in enumerate(raw):
+        value |= (byte & 0x7F) << (7 * shift)
+
+    return value
+
+
+def dumps(nodes: list, errors=()) -> bytes:
+    """
+        serialize the top-level IR of a page
+    args
+        nodes   PageParser.tree.successors
+        errors  PageLexerErrors of the page, they come back with the nodes
+    returns
+        bytes   MAGIC, IR_VERSION, the number of strings, the byte length of
+                the string table and the table itself, every string one after
+                the other in utf-8. what is left is varints, the length of
+                every string in chars, then the errors and the nodes. a node
+                is its header, text, depth and indent, successor count and
+                successors, with only the fields the header says are there
+    """
+    strings = {}
+    fields = bytearray()
+
+    def string(text: str) -> int:
+        """
+            0 is the next string in the table, the table is in the order
+            strings are first used so this is almost always a single byte.
+            anything else is the index of a string that was used before, plus 1
+        """
+        index = strings.get(text)
+        if index is None:
+            strings[text] = len(strings)
+            return 0
+
+        return index + 1
+
+    encode_varint(len(errors), fields)
+    for error in errors:
+        for value in (string(error.message), error.position, error.line, error.column):
+            encode_varint(value, fields)
+
+    encode_varint(len(nodes), fields)
+
+    # preorder, a node is followed by its successors
+    stack = [iter(nodes)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+
+        header = CODES[node.type] << FLAG_BITS
+        if node.text:
+            header |= HAS_TEXT
+        if node.successors:
+            header |= HAS_SUCCESSORS
+        if node.depth != 1 or node.indent:
+            header |= HAS_NUMBERS
+        if not node.ordered:
+            header |= UNORDERED
+
+        encode_varint(header, fields)
+
+        if node.text:
+            encode_varint(string(node.text), fields)
+        if node.depth != 1 or node.indent:
+            encode_varint(node.depth, fields)
+            encode_varint(node.indent, fields)
+        if node.successors:
+            encode_varint(len(node.successors), fields)
+            stack.append(iter(node.successors))
+
+    table = "".join(strings).encode()
+
+    out = bytearray(MAGIC)
+    encode_varint(IR_VERSION, out)
+    encode_varint(len(strings), out)
+    encode_varint(len(table), out)
+    out += table
+
+    for text in strings:
+        encode_varint(len(text), out)
+
+    return bytes(out + fields)
+
+
+def loads(data: bytes) -> tuple:
+    """
+        the other end of dumps()
+    returns
+        (nodes, errors)
+    raises
+        ValueError  data is not a cached page of this IR_VERSION
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("not a cached page")
+
+    view = memoryview(data)
+    position = len(MAGIC)
+
+    def read_varint() -> int:
+        nonlocal position
+        value = shift = 0
+
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    try:
+        version = read_varint()
+        if version != IR_VERSION:
+            raise ValueError(f"cached page is version {version}, not {IR_VERSION}")
+
+        count = read_varint()
+        size = read_varint()
+        table = str(view[position : position + size], "utf-8")
+        values = decode_varints(view[position + size :])
+
+        # the table is decoded in one go and cut up by the lengths in chars
+        ends = list(accumulate(values[:count]))
+        strings = [table[start:end] for start, end in zip([0] + ends, ends)]
+
+        return read_page(values, count, strings)
+
+    # AttributeError is successors on a node type that never has any, they
+    # share one empty tuple
+    except (IndexError, StopIteration, UnicodeDecodeError, AttributeError):
+        raise ValueError("cached page is corrupt or cut short")
+
+
+def read_page(values: list, index: int, strings: list) -> tuple:
+    """
+        put the errors and nodes back together, see loads()
+    args
+        values  every varint after the string table
+        index   where the errors start in values
+        strings the string table
+    """
+    DocNode = core.DocNode
+    types = TYPES
+
+    # see string() in dumps()
+    following = iter(strings).__next__
+
+    errors = []
+    for _ in range(values[index]):
+        message = values[index + 1]
+        message = strings[message - 1] if message else following()
+
+        errors.append(
+            core.PageLexerError(
+                message, values[index + 2], values[index + 3], values[index + 4]
+            )
+        )
+        index += 4
+
+    nodes = []
+    count = values[index + 1]
+    index += 2
+
+    # (list to fill, how many successors are still to come)
+    stack = [(nodes, count)]
+    while stack:
+        parent, remaining = stack.pop()
+        if not remaining:
+            continue
+        stack.append((parent, remaining - 1))
+
+        header = values[index]
+        index += 1
+
+        text = ""
+        if header & HAS_TEXT:
+            text = values[index]
+            text = strings[text - 1] if text else following()
+            index += 1
+
+        depth, indent = 1, 0
+        if header & HAS_NUMBERS:
+            depth, indent = values[index], values[index + 1]
+            index += 2
+
+        node = DocNode(
+            types[header >> FLAG_BITS],
+            None,
+            depth,
+            not header & UNORDERED,
+            text,
+            indent,
+        )
+        parent.append(node)
+
+        if header & HAS_SUCCESSORS:
+            stack.append((node.successors, values[index]))
+            index += 1
+
+    if index != len(values):
+        raise ValueError("cached page has bytes left over")
+
+    return nodes, errors
+
+
+def compiler_salt(engine: str) -> str:
+    """
+        what besides the source the IR depends on, the lexer engine and the
+        lexer and parser, which all live in core.py
+    """
+    global _core_digest
+
+    if _core_digest is None:
+        with open(core.__file__, "rb") as fd:
+            _core_digest = hashlib.blake2b(fd.read(), digest_size=20).hexdigest()
+
+    return f"{engine}\0{_core_digest}"
+
+
+def cache_key(source: bytes, salt="") -> str:
+    """
+        name of the cache file for a source, salt is whatever else the IR
+        depends on, the lexer engine and the compiler for a start
+    """
+    digest = hashlib.blake2b(source, digest_size=20)
+    digest.update(f"\0{IR_VERSION}\0{salt}".encode())
+
+    return digest.hexdigest() + ".pqir"
+
+
+def load(cache_dir: str, key: str) -> tuple:
+    """
+        read a cached page
+    returns
+        (nodes, errors), None if it is not cached or cannot be read
+    """
+    try:
+        with open(os.path.join(cache_dir, key), "rb") as fd:
+            return loads(fd.read())
+
+    except (OSError, ValueError):
+        return None
+
+
+def save(cache_dir: str, key: str, nodes: list, errors=()) -> None:
+    path = os.path.join(cache_dir, key)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # write then rename, two builds sharing the cache never see half a page
+    with open(f"{path}.{os.getpid()}.tmp", "wb") as fd:
+        fd.write(dumps(nodes, errors))
+
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+
+def compile_page(
+    source: str,
+    cache_dir: str,
+    engine="fast",
+    layout=None,
+    slots=None,
+    outline=None,
+    errors=None,
+    assets=None,
+    meta=None,
+) -> str:
+    """
+        core.compile_page() that takes the IR out of cache_dir when the source
+        was compiled before, and puts it there when it was not
+    args
+        cache_dir   where the cached pages live, made if it is not there
+        the rest are the same as core.compile_page()
+    returns
+        str     the html page
+    """
+    with open(source, "rb") as fd:
+        data = fd.read()
+
+    key = cache_key(data, compiler_salt(engine))
+    cached = load(cache_dir, key)
+
+    # the front matter is not part of the IR, it is only a few lines to read
+    # again and the title has to be in the slots before anything is rendered
+    text = io.StringIO(data.decode(), newline=None)
+    page = core.PageLexer(text, engine=engine, meta=meta)
+
+    slots = dict({"title": core.page_title(source)}, **(slots or {}))
+    if page.meta.title:
+        slots["title"] = page.meta.title
+
+    parser = core.PageParser(
+        layout=layout,
+        slots=slots,
+        outline=outline,
+        assets=assets,
+        h1_title=not page.meta.title,
+    )
+
+    if cached is None:
+        parser.create_ir(page)
+
+        nodes, page_errors = parser.tree.successors, page.errors
+        save(cache_dir, key, nodes, page_errors)
+    else:
+        nodes, page_errors = cached
+
+    parser.render_nodes(nodes)
+
+    if errors is not None:
+        errors.extend(page_errors)
+
+    return "".join(parser.page)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+#   \title      minify.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Shrink pages for deploy, whitespace collapsed outside <pre>
+#               and a gzipped copy for servers that hand those out as is
+#
+#   \license    MIT
+
+
+import zlib
+import re
+
+
+# zlib level used when none is given, the most there is since pages are
+# compressed once and downloaded many times
+GZIP_LEVEL = 9
+
+# elements whose whitespace is part of their content
+PRESERVED = ("pre", "textarea", "script", "style")
+
+# the content of a preserved element, between its open and close tag
+PRESERVE = re.compile(
+    rf"(<({'|'.join(PRESERVED)})\b[^>]*>)(.*?)(?=</\2\s*>)", re.DOTALL | re.IGNORECASE
+)
+
+# where a preserved element starts and ends, for MinifyingWriter
+OPEN_PRESERVED = re.compile(rf"<({'|'.join(PRESERVED)})\b", re.IGNORECASE)
+CLOSE_PRESERVED = {
+    name: re.compile(rf"</{name}\s*>", re.IGNORECASE) for name in PRESERVED
+}
+
+SPACE = re.compile(r"\s+")
+
+# whitespace next to a block level tag never renders as anything
+BLOCK_TAGS = (
+    "html", "head", "body", "title", "meta", "link", "div", "p", "ul", "ol",
+    "li", "nav", "pre", "table", "thead", "tbody", "tr", "td", "th", "header",
+    "footer", "main", "section", "article", "h1", "h2", "h3", "h4", "h5", "h6",
+)
+BLOCK_GAP = re.compile(rf" ?(</?(?:{'|'.join(BLOCK_TAGS)})\b[^>]*>) ?", re.IGNORECASE)
+
+
+def squeeze(html: str) -> str:
+    return BLOCK_GAP.sub(r"\1", SPACE.sub(" ", html))
+
+
+def minify(html: str) -> str:
+    """
+        collapse every run of whitespace into one space, and drop it next to
+        block level tags, the content of <pre> and the like is left alone
+    """
+    out = []
+    last = 0
+
+    for match in PRESERVE.finditer(html):
+        out.append(squeeze(html[last : match.end(1)]))
+        out.append(match.group(3))
+        last = match.end()
+
+    out.append(squeeze(html[last:]))
+
+    return "".join(out)
+
+
+class MinifyingWriter(object):
+    """
+    A file-like object that minifies what is written to it on the way through
+    to stream, what comes out is what minify() gives for the whole page
+    stream      where the minified html goes
+    buffer      what has not been safe to minify yet
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ""
+
+    def cut(self) -> int:
+        """
+            how much of the buffer can be minified on its own, the end of a
+            tag that is not followed by whitespace and is not inside a
+            preserved element. neither side of such a cut can change what
+            minify() does to the other
+        """
+        buff = self.buffer
+        limit = len(buff) - 1
+
+        # preserved elements, the same ones minify() would find
+        spans = []
+        opened = OPEN_PRESERVED.search(buff)
+        while opened:
+            closing = CLOSE_PRESERVED[opened.group(1).lower()]
+            closed = closing.search(buff, opened.end())
+            if not closed:
+                limit = opened.start() - 1
+                break
+
+            spans.append((opened.start(), closed.end() - 1))
+            opened = OPEN_PRESERVED.search(buff, closed.end())
+
+        if limit < 1:
+            return 0
+
+        end = buff.rfind(">", 0, limit)
+        while end != -1:
+            inside = [start for start, last in spans if start <= end < last]
+            if inside:
+                end = buff.rfind(">", 0, inside[0])
+            elif buff[end + 1].isspace():
+                end = buff.rfind(">", 0, end)
+            else:
+                break
+
+        return end + 1
+
+    def write(self, html: str) -> int:
+        self.buffer += html
+
+        cut = self.cut()
+        if cut:
+            self.stream.write(minify(self.buffer[:cut]))
+            self.buffer = self.buffer[cut:]
+
+        return len(html)
+
+    def close(self) -> None:
+        self.stream.write(minify(self.buffer))
+        self.buffer = ""
+
+
+class GzipWriter(object):
+    """
+    A file-like object that passes html on to stream and gzips a copy of it
+    into gzip_fd as it goes, so the page is never held in memory to compress
+    stream      where the html goes
+    gzip_fd     binary file the gzip is written to
+    """
+
+    def __init__(self, stream, gzip_fd, level=GZIP_LEVEL):
+        self.stream = stream
+        self.gzip_fd = gzip_fd
+
+        # wbits over 16 writes a gzip header and trailer, the mtime in the
+        # header is left at 0 so the same page always gzips to the same bytes
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, html: str) -> int:
+        self.stream.write(html)
+        self.gzip_fd.write(self.compressor.compress(html.encode()))
+
+        return len(html)
+
+    def close(self) -> None:
+        self.gzip_fd.write(self.compressor.flush())
+
+
+def gzip_bytes(data: bytes, level=GZIP_LEVEL) -> bytes:
+    """
+        gzip data the way GzipWriter does
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    return compressor.compress(data) + compressor.flush()
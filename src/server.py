@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+#   \title      server.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       A compile server on a unix socket, so the compiler, layouts and
+#               highlighter stay warm between compiles
+#
+#   \license    MIT
+
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+import argparse
+import asyncio
+import json
+import signal
+import stat
+import time
+import sys
+import os
+
+import client
+import template
+import core
+
+
+# the biggest request line we accept, a page is sent as one json string
+MAX_REQUEST = 64 * 1024 * 1024
+
+# threads compiles run in without -j, so a small page is not stuck behind a
+# big one that came in first on another connection
+COMPILE_THREADS = 4
+
+
+def compile_request(request: dict) -> dict:
+    """
+        compile the page a request asks for
+    args
+        request     {"path": markdown file} or {"text": markdown}, and optionally
+                    "title", "layout" (a layout file), "stylesheet" and "engine"
+    returns
+        dict        {"html": ..., "title": ..., "meta": PageMeta as a dict,
+                    "diagnostics": [PageLexerError as a dict, ...],
+                    "seconds": ...} or {"error": ...}
+    """
+    start = time.perf_counter()
+
+    try:
+        path = request.get("path")
+        text = request.get("text")
+        if (path is None) == (text is None):
+            raise ValueError('a request needs either "path" or "text"')
+
+        engine = request.get("engine", "fast")
+        if engine not in ("fast", "legacy"):
+            raise ValueError(f"unknown lexer engine {engine}")
+
+        slots = {
+            "title": request.get("title") or core.page_title(path or "untitled"),
+            "stylesheet": request.get("stylesheet") or core.STYLESHEET,
+        }
+
+        layout = template.load_layout(request.get("layout"))
+        outline = core.PageOutline()
+        errors = []
+        meta = core.PageMeta()
+
+        if path is not None:
+            html = core.compile_page(
+                path, engine, layout, slots, outline, errors, meta=meta
+            )
+        else:
+            html = core.compile_text(
+                text, engine, layout, slots, outline, errors, meta=meta
+            )
+
+    except Exception as err:
+        return {"error": f"{type(err).__name__}: {err}"}
+
+    return {
+        "html": html,
+        "title": meta.title or outline.title() or slots["title"],
+        "meta": asdict(meta),
+        "diagnostics": [asdict(error) for error in errors],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class CompileServer(object):
+    """
+    Answers compile requests on a unix socket
+    socket_path     where to listen
+    pool            where the compiles run, never on the event loop so it keeps
+                    taking requests. a ProcessPoolExecutor of jobs processes,
+                    or COMPILE_THREADS threads in this process for jobs=1,
+                    which keeps the caches warm for every compile
+    served          how many requests have been answered
+    """
+
+    def __init__(self, socket_path: str, jobs=1):
+        self.socket_path = socket_path
+        if jobs > 1:
+            self.pool = ProcessPoolExecutor(jobs)
+        else:
+            self.pool = ThreadPoolExecutor(COMPILE_THREADS)
+        self.served = 0
+
+    async def compile(self, request: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, compile_request, request)
+
+    async def handle(self, reader, writer) -> None:
+        """
+            one connection, any number of requests, one json line each, the
+            replies go back in the order the requests came in
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request is a json object")
+                except ValueError as err:
+                    reply = {"error": f"bad request: {err}"}
+                else:
+                    reply = await self.compile(request)
+
+                writer.write(client.encode(reply))
+                await writer.drain()
+                self.served += 1
+
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            # the client went away or sent more than MAX_REQUEST in one line
+            pass
+
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        # nobody else on the machine gets to have pages compiled by us, the
+        # socket is made without any access for them rather than chmodded
+        # after, which would leave a moment where anyone could connect
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(
+                self.handle, self.socket_path, limit=MAX_REQUEST
+            )
+        finally:
+            os.umask(umask)
+
+        os.chmod(self.socket_path, 0o600)
+        print(f"listening on {self.socket_path}", flush=True)
+
+        # a daemon started in the background ignores ^C, so both signals are
+        # taken over to shut down cleanly and take the socket with us
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+
+        async with server:
+            await stop.wait()
+
+    def run(self) -> None:
+        try:
+            asyncio.run(self.serve())
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.pool.shutdown()
+
+
+def claim_socket(path: str) -> None:
+    """
+        make way for a new server, a socket left behind by one that crashed
+        is removed but a live one is not, and nothing that is not a socket is
+    raises
+        RuntimeError    another server is answering on path, or path is
+                        something other than a socket
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{path} is there and is not a socket")
+
+    try:
+        client.request({"text": ""}, path)
+    except OSError:
+        os.unlink(path)
+        return
+
+    raise RuntimeError(f"a server is already listening on {path}")
+
+
+def main(argv: list) -> int:
+    args = argparse.ArgumentParser(prog="core.py serve")
+    args.add_argument("--socket", help="where to listen")
+    args.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="compile in this many worker processes instead of threads",
+    )
+
+    opts = args.parse_args(argv)
+    path = opts.socket or client.socket_path()
+
+    compile_server = CompileServer(path, opts.jobs)
+
+    try:
+        claim_socket(path)
+        compile_server.run()
+
+    except RuntimeError as err:
+        print(f"core.py serve: {err}", file=sys.stderr)
+        return 1
+
+    print(f"served {compile_server.served} requests")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+#   \title      siteindex.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       The site wide page listing, search index, tag pages, feed
+#               and sitemap
+#
+#   \license    MIT
+
+
+from escape import escape_attr, escape_text
+from urllib.parse import urljoin
+import json
+import os
+
+import core
+
+
+# written into the top of the output directory, unless a page is called that
+SITE_INDEX = "index.html"
+SEARCH_INDEX = "search.json"
+
+# bumped whenever the layout of search.json changes
+SEARCH_VERSION = 1
+
+# written when the build is told the url of the site, links in both have to
+# be absolute
+FEED = "feed.xml"
+SITEMAP = "sitemap.xml"
+
+# every tag gets a page in here listing its pages, tags/<slug>.html
+TAGS_DIR = "tags"
+
+# how many of the newest dated pages go into the feed
+FEED_ENTRIES = 20
+
+
+def page_url(page: str) -> str:
+    """
+        link to a page from the top of the site, "posts/a.md" -> "posts/a.html"
+    """
+    return os.path.splitext(page)[0].replace(os.sep, "/") + ".html"
+
+
+def page_name(page: str, outline: dict, meta=None) -> str:
+    """
+        the title out of the front matter, else the first heading, else the
+        file name
+    """
+    return (meta or {}).get("title") or outline.get("title") or core.page_title(page)
+
+
+def tag_url(tag: str) -> str:
+    """
+        link to the page of a tag from the top of the site
+    """
+    slug = core.SLUG_STRIP.sub("-", tag.lower()).strip("-") or "tag"
+
+    return f"{TAGS_DIR}/{slug}.html"
+
+
+def by_date(pages, metas: dict) -> list:
+    """
+        the dated pages out of pages, newest first
+    args
+        metas   page -> PageMeta as a dict
+    """
+    dated = [page for page in pages if metas.get(page, {}).get("date")]
+
+    # newest first, pages of the same day in name order
+    dated.sort()
+    dated.sort(key=lambda page: metas[page]["date"], reverse=True)
+
+    return dated
+
+
+def tagged(metas: dict) -> dict:
+    """
+        tag -> its pages, newest first and the undated ones after them
+    """
+    tags = {}
+
+    for page in sorted(metas):
+        for tag in metas[page].get("tags", []):
+            tags.setdefault(tag, []).append(page)
+
+    for tag, pages in tags.items():
+        dated = by_date(pages, metas)
+        tags[tag] = dated + [page for page in pages if page not in dated]
+
+    return tags
+
+
+def search_index(outlines: dict, metas=None) -> dict:
+    """
+        an inverted index over every section of every page
+    args
+        outlines    page -> PageOutline.as_dict()
+        metas       page -> PageMeta as a dict, for the titles
+    returns
+        dict    {"version": SEARCH_VERSION,
+                 "pages": [[url, title], ...],
+                 "sections": [[page number, heading id, heading], ...],
+                 "terms": {term: [section number, ...]}}
+                section 0 of a page is the text above its first heading and
+                has an empty id
+    """
+    pages = []
+    sections = []
+    terms = {}
+
+    for page in sorted(outlines):
+        outline = outlines[page]
+        page_no = len(pages)
+        name = page_name(page, outline, (metas or {}).get(page))
+        pages.append([page_url(page), name])
+
+        headings = [(None, "", "")] + [tuple(entry) for entry in outline["headings"]]
+
+        for (depth, slug, text), words in zip(headings, outline["terms"]):
+            section_no = len(sections)
+            sections.append([page_no, slug, text])
+
+            for word in words:
+                terms.setdefault(word, []).append(section_no)
+
+    return {
+        "version": SEARCH_VERSION,
+        "pages": pages,
+        "sections": sections,
+        "terms": terms,
+    }
+
+
+def index_page(outlines: dict, layout, slots=None, metas=None) -> str:
+    """
+        a page linking to every page and its top level sections
+    args
+        outlines    page -> PageOutline.as_dict()
+        layout      PageTemplate to wrap the listing in
+        slots       extra values for the layout slots
+        metas       page -> PageMeta as a dict, for the titles
+    returns
+        str     the html page
+    """
+    html = ["<h1 id='index'>Index</h1><ul class='site-index'>"]
+
+    for page in sorted(outlines):
+        outline = outlines[page]
+        url = escape_attr(page_url(page))
+        name = escape_text(page_name(page, outline, (metas or {}).get(page)))
+        html.append(f"<li><a href='{url}'>{name}</a>")
+
+        sections = [entry for entry in outline["headings"] if entry[0] == 2]
+        if sections:
+            html.append("<ul>")
+            for depth, slug, text in sections:
+                html.append(f"<li><a href='{url}#{slug}'>{escape_text(text)}</a></li>")
+            html.append("</ul>")
+
+        html.append("</li>")
+
+    html.append("</ul>")
+
+    tags = tagged(metas or {})
+    if tags:
+        html.append("<h2 id='tags'>Tags</h2><ul class='tag-list'>")
+        for tag in sorted(tags):
+            url = escape_attr(tag_url(tag))
+            html.append(f"<li><a href='{url}'>{escape_text(tag)}</a></li>")
+        html.append("</ul>")
+
+    slots = dict({"stylesheet": core.STYLESHEET, "title": "Index"}, **(slots or {}))
+
+    return layout.head(slots) + "".join(html) + layout.tail(slots)
+
+
+def search_json(outlines: dict, metas=None) -> str:
+    # no whitespace, this is fetched by every page that searches
+    index = search_index(outlines, metas)
+
+    return json.dumps(index, separators=(",", ":"), sort_keys=True)
+
+
+def tag_page(
+    tag: str, pages: list, outlines: dict, metas: dict, layout, slots=None
+) -> str:
+    """
+        a page linking to every page with tag, see tagged()
+    args
+        pages       the pages with the tag, in the order they are listed
+        slots       extra values for the layout slots, links in them have to
+                    climb out of TAGS_DIR
+    returns
+        str     the html page
+    """
+    html = [f"<h1 id='tag'>{escape_text(tag)}</h1><ul class='tag-index'>"]
+
+    for page in pages:
+        url = escape_attr("../" + page_url(page))
+        name = escape_text(page_name(page, outlines.get(page, {}), metas.get(page)))
+        html.append(f"<li><a href='{url}'>{name}</a>")
+
+        date = metas.get(page, {}).get("date")
+        if date:
+            html.append(f" <time datetime='{date}'>{date}</time>")
+
+        html.append("</li>")
+
+    html.append("</ul>")
+
+    # slots are html, the tag is text
+    slots = dict(
+        {"stylesheet": "../" + core.STYLESHEET, "title": escape_text(tag)},
+        **(slots or {}),
+    )
+
+    return layout.head(slots) + "".join(html) + layout.tail(slots)
+
+
+def feed_xml(outlines: dict, metas: dict, site_url: str, title=None) -> str:
+    """
+        an atom feed of the FEED_ENTRIES newest dated pages
+    args
+        site_url    where the top of the site is served, urls in a feed are
+                    absolute
+        title       what the feed is called, the site url if not given
+    """
+    site_url = site_url.rstrip("/") + "/"
+    pages = by_date(outlines, metas)[:FEED_ENTRIES]
+
+    # a day is all the front matter says, the feed wants a time as well
+    updated = metas[pages[0]]["date"] if pages else "1970-01-01"
+    name = escape_text(title or site_url)
+
+    xml = [
+        "<?xml version='1.0' encoding='utf-8'?>\n"
+        "<feed xmlns='http://www.w3.org/2005/Atom'>\n"
+        f"<title>{name}</title>\n"
+        f"<author><name>{name}</name></author>\n"
+        f"<id>{escape_text(site_url)}</id>\n"
+        f"<link href='{escape_attr(site_url)}'/>\n"
+        f"<link rel='self' href='{escape_attr(urljoin(site_url, FEED))}'/>\n"
+        f"<updated>{updated}T00:00:00Z</updated>\n"
+    ]
+
+    for page in pages:
+        meta = metas[page]
+        url = urljoin(site_url, page_url(page))
+        page_title = page_name(page, outlines[page], meta)
+
+        xml.append(
+            "<entry>\n"
+            f"<title>{escape_text(page_title)}</title>\n"
+            f"<id>{escape_text(url)}</id>\n"
+            f"<link href='{escape_attr(url)}'/>\n"
+            f"<updated>{meta['date']}T00:00:00Z</updated>\n"
+        )
+        for tag in meta.get("tags", []):
+            xml.append(f"<category term='{escape_attr(tag)}'/>\n")
+        xml.append("</entry>\n")
+
+    xml.append("</feed>\n")
+
+    return "".join(xml)
+
+
+def sitemap_xml(urls: list, metas: dict, site_url: str) -> str:
+    """
+        a sitemap of every url in urls
+    args
+        urls        (url relative to the top of the site, page or None)
+        site_url    where the top of the site is served
+    """
+    site_url = site_url.rstrip("/") + "/"
+    xml = [
+        "<?xml version='1.0' encoding='utf-8'?>\n"
+        "<urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>\n"
+    ]
+
+    for url, page in sorted(urls, key=lambda entry: entry[0]):
+        xml.append(f"<url><loc>{escape_text(urljoin(site_url, url))}</loc>")
+
+        date = metas.get(page, {}).get("date") if page else None
+        if date:
+            xml.append(f"<lastmod>{date}</lastmod>")
+
+        xml.append("</url>\n")
+
+    xml.append("</urlset>\n")
+
+    return "".join(xml)
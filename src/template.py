@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+#   \title      template.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Page layouts, parsed once into static chunks and slots
+#
+#   \license    MIT
+
+
+from dataclasses import dataclass
+import os
+import re
+
+
+# the layout used when a page does not ask for one
+DEFAULT_LAYOUT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "layouts", "default.html"
+)
+
+# {{ name }} in a layout is filled in per page
+SLOT = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# what a layout can ask for, content is where the rendered page goes
+SLOTS = frozenset(("content", "stylesheet", "title", "meta", "toc"))
+
+# slots that are only known once the page is rendered. a layout that puts
+# one before content has its page held back until it is rendered, so only
+# layouts with them after content can be streamed out as the page renders
+LATE_SLOTS = frozenset(("toc",))
+
+# parsed layouts for this process, path -> (mtime_ns, size, PageTemplate)
+_layouts = {}
+
+
+@dataclass(init=True, slots=True)
+class PageTemplate:
+    """
+    A layout split around its content slot
+    args
+        source      where the layout came from
+        prologue    static chunks and slot names that go before the page
+        epilogue    static chunks and slot names that go after the page
+        slots       every slot the layout uses besides content
+        held        a LATE_SLOTS slot comes before content, the head can only
+                    be filled in once the whole page is rendered
+    """
+
+    source: str
+    prologue: tuple
+    epilogue: tuple
+    slots: frozenset
+    held: bool = False
+
+    @classmethod
+    def parse(cls, text: str, source="<string>") -> "PageTemplate":
+        """
+            split a layout into static chunks and the slots between them
+        args
+            text        the layout
+            source      name to put in errors
+        returns
+            PageTemplate
+        """
+        # re.split() leaves the static chunks at even and slot names at odd indexes
+        parts = SLOT.split(text)
+        names = parts[1::2]
+
+        for match in SLOT.finditer(text):
+            if match.group(1) not in SLOTS:
+                line = text.count("\n", 0, match.start()) + 1
+                raise ValueError(f"{source}:{line}: unknown slot {match.group(0)}")
+
+        if names.count("content") != 1:
+            raise ValueError(f"{source}: needs exactly one {{{{ content }}}} slot")
+
+        split = names.index("content") * 2 + 1
+
+        return cls(
+            source,
+            cls.compact(parts[:split]),
+            cls.compact(parts[split + 1 :]),
+            frozenset(names) - {"content"},
+            bool(LATE_SLOTS.intersection(parts[1:split:2])),
+        )
+
+    @staticmethod
+    def compact(parts: list) -> tuple:
+        """
+            drop empty static chunks, so filling in only walks what is there
+        returns
+            tuple   (is_slot, text) pairs
+        """
+        return tuple(
+            (index % 2 == 1, part) for index, part in enumerate(parts) if part
+        )
+
+    @staticmethod
+    def fill(parts: tuple, values: dict) -> str:
+        return "".join(values.get(part, "") if slot else part for slot, part in parts)
+
+    def head(self, values: dict) -> str:
+        """
+            everything in front of the page, slots missing from values are left empty
+        """
+        return self.fill(self.prologue, values)
+
+    def tail(self, values: dict) -> str:
+        """
+            everything after the page, this is where the closing tags come from
+        """
+        return self.fill(self.epilogue, values)
+
+
+def load_layout(path=None) -> PageTemplate:
+    """
+        parse a layout file, or hand back the one this process already parsed
+    the cache is checked against the mtime and size of the file, so a running
+    watch picks up an edited layout without a restart
+    args
+        path    the layout file, None for DEFAULT_LAYOUT
+    returns
+        PageTemplate
+    """
+    path = os.path.abspath(path or DEFAULT_LAYOUT)
+    stat = os.stat(path)
+
+    cached = _layouts.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with open(path, "r") as fd:
+        layout = PageTemplate.parse(fd.read(), path)
+
+    _layouts[path] = (stat.st_mtime_ns, stat.st_size, layout)
+
+    return layout
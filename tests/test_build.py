@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+#   \title      test_build.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Batch builds of a directory of pages
+#
+#   \license    MIT
+
+
+import subprocess
+import signal
+import time
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import build
+import core
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+def test_removed_page_loses_its_output(tmp_path, use_cache):
+    src, out = tmp_path / "src", tmp_path / "out"
+    (src / "sub").mkdir(parents=True)
+    (src / "kept.md").write_text("# kept\n")
+    (src / "sub" / "gone.md").write_text("# gone\n")
+
+    build.build_site(str(src), str(out), jobs=1, gzip_level=6)
+    assert (out / "sub" / "gone.html").exists()
+    assert (out / "sub" / "gone.html.gz").exists()
+
+    (src / "sub" / "gone.md").unlink()
+    results = build.build_site(str(src), str(out), jobs=1, use_cache=use_cache)
+
+    assert [result.source for result in results] == [str(src / "kept.md")]
+    assert not (out / "sub" / "gone.html").exists()
+    assert not (out / "sub" / "gone.html.gz").exists()
+    assert (out / "kept.html").exists()
+
+
+def test_tag_page_escapes_the_tag(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    (src / "page.md").write_text("\\o tags: <b>&co\n# page\n")
+
+    build.build_site(str(src), str(out), jobs=1)
+
+    tags = list((out / "tags").iterdir())
+    assert len(tags) == 1
+
+    html = tags[0].read_text()
+    assert "<b>" not in html
+    assert "<title>&lt;b&gt;&amp;co</title>" in html
+
+
+def test_repeated_tag_lists_the_page_once(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    (src / "page.md").write_text("\\o tags: a, b, a\n# page\n")
+
+    build.build_site(str(src), str(out), jobs=1)
+
+    assert sorted(os.listdir(out / "tags")) == ["a.html", "b.html"]
+    assert (out / "tags" / "a.html").read_text().count("href='../page.html'") == 1
+
+
+def make_site(src) -> None:
+    (src / "sub").mkdir(parents=True)
+    (src / "a.md").write_text("# a\n\ntext\n")
+    (src / "b.md").write_text("# b\n\n[a](a.md)\n")
+    (src / "sub" / "c.md").write_text("# c\n\n- x\n- y\n")
+
+
+def built(results) -> dict:
+    # source name -> whether it came out of the manifest
+    return {os.path.basename(result.source): result.cached for result in results}
+
+
+def outputs(out) -> dict:
+    return {
+        str(path.relative_to(out)): path.read_bytes()
+        for path in sorted(out.rglob("*"))
+        if path.is_file() and path.name != build.CACHE_NAME
+    }
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_manifest_hits_and_misses(tmp_path, jobs):
+    src, out = tmp_path / "src", tmp_path / "out"
+    make_site(src)
+
+    first = build.build_site(str(src), str(out), jobs=jobs)
+    assert built(first) == {"a.md": False, "b.md": False, "c.md": False}
+    assert not any(result.error for result in first)
+    html = outputs(out)
+
+    # unchanged, or only touched, the source is not compiled again
+    os.utime(src / "a.md", ns=(1, 1))
+    again = build.build_site(str(src), str(out), jobs=jobs)
+    assert built(again) == {"a.md": True, "b.md": True, "c.md": True}
+    assert outputs(out) == html
+
+    (src / "sub" / "c.md").write_text("# c\n\nchanged\n")
+    changed = build.build_site(str(src), str(out), jobs=jobs)
+    assert built(changed) == {"a.md": True, "b.md": True, "c.md": False}
+    assert b"changed" in (out / "sub" / "c.html").read_bytes()
+
+    # a missing output is written again even though the source is the same
+    (out / "a.html").unlink()
+    missing = build.build_site(str(src), str(out), jobs=jobs)
+    assert built(missing) == {"a.md": False, "b.md": True, "c.md": True}
+    assert (out / "a.html").exists()
+
+    forced = build.build_site(str(src), str(out), jobs=jobs, use_cache=False)
+    assert not any(built(forced).values())
+
+
+def test_layout_change_misses(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    make_site(src)
+    layout = tmp_path / "layout.html"
+    layout.write_text("<title>{{ title }}</title>{{ content }}")
+
+    build.build_site(str(src), str(out), jobs=1, layout=str(layout))
+    hit = build.build_site(str(src), str(out), jobs=1, layout=str(layout))
+    assert all(built(hit).values())
+
+    layout.write_text("<title>{{ title }}</title><main>{{ content }}</main>")
+    miss = build.build_site(str(src), str(out), jobs=1, layout=str(layout))
+    assert not any(built(miss).values())
+    assert (out / "a.html").read_text().startswith("<title>a</title><main>")
+
+
+def test_compiler_change_misses(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    make_site(src)
+
+    build.build_site(str(src), str(out), jobs=1)
+    assert all(built(build.build_site(str(src), str(out), jobs=1)).values())
+
+    monkeypatch.setattr(build, "compiler_digest", lambda: "edited")
+    assert not any(built(build.build_site(str(src), str(out), jobs=1)).values())
+    assert all(built(build.build_site(str(src), str(out), jobs=1)).values())
+
+    monkeypatch.setattr(core, "__version__", core.__version__ + ".1")
+    assert not any(built(build.build_site(str(src), str(out), jobs=1)).values())
+
+
+def test_parallel_build_is_the_serial_build(tmp_path):
+    src = tmp_path / "src"
+    make_site(src)
+    for index in range(20):
+        (src / f"page{index}.md").write_text(f"# page {index}\n\n## part\n\ntext\n")
+
+    build.build_site(str(src), str(tmp_path / "serial"), jobs=1)
+    build.build_site(str(src), str(tmp_path / "parallel"), jobs=4)
+
+    assert outputs(tmp_path / "serial") == outputs(tmp_path / "parallel")
+
+
+def test_find_pages_and_snapshot_agree(tmp_path):
+    src = tmp_path / "src"
+    for name in [
+        "page.md",
+        "sub/page.md",
+        "sub/deeper/page.md",
+        ".hidden.md",
+        "sub/.hidden.md",
+        "#page.md#",
+        "#page.md",
+        "~page.md",
+        "page.md~",
+        "page.markdown",
+        ".git/page.md",
+        "sub/.drafts/page.md",
+        "dir.md/page.md",
+    ]:
+        path = src / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("# page\n")
+
+    expected = [
+        "dir.md/page.md",
+        "page.md",
+        "sub/deeper/page.md",
+        "sub/page.md",
+    ]
+    expected = [name.replace("/", os.sep) for name in expected]
+
+    assert build.find_pages(str(src)) == expected
+    assert sorted(build.snapshot(str(src))) == expected
+
+
+def wait_for(check, what: str) -> None:
+    deadline = time.monotonic() + 10
+    while not check():
+        assert time.monotonic() < deadline, what
+        time.sleep(0.01)
+
+
+def test_watch(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    make_site(src)
+    core_py = os.path.join(os.path.dirname(__file__), "..", "src", "core.py")
+
+    process = subprocess.Popen(
+        [sys.executable, core_py, "watch", str(src), str(out)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    try:
+        # pages saved before the watch took its first look are not rebuilt
+        for line in process.stdout:
+            if line.startswith("watching"):
+                break
+        assert (out / "sub" / "c.html").exists()
+
+        (src / ".new.md").write_text("# hidden\n")
+        (src / "new.md").write_text("# new\n")
+        wait_for(lambda: (out / "new.html").exists(), "new page not built")
+
+        (src / "a.md").write_text("# a\n\nedited\n")
+        wait_for(lambda: b"edited" in (out / "a.html").read_bytes(), "not rebuilt")
+
+        (src / "sub" / "c.md").unlink()
+        wait_for(lambda: not (out / "sub" / "c.html").exists(), "output not removed")
+
+        assert process.poll() is None
+        assert not (out / ".new.html").exists()
+
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(10)
+
+    assert process.returncode == 0
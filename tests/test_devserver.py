@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+#   \title      test_devserver.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       The live preview server, over real HTTP
+#
+#   \license    MIT
+
+
+from http.server import ThreadingHTTPServer
+import urllib.request
+import urllib.error
+import threading
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import devserver
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """
+        a dev server on src_dir, hands back a function that GETs a path
+        from it as (status, body)
+    """
+    servers = []
+
+    def start(layout=None):
+        site = devserver.DevSite(str(tmp_path / "src"), layout)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), devserver.DevHandler)
+        server.daemon_threads = True
+        server.site = site
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        def get(path: str) -> tuple:
+            url = f"http://127.0.0.1:{server.server_port}{path}"
+            try:
+                with urllib.request.urlopen(url, timeout=10) as response:
+                    return response.status, response.read().decode()
+            except urllib.error.HTTPError as err:
+                return err.code, err.read().decode()
+
+        return get
+
+    (tmp_path / "src").mkdir()
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_page(tmp_path, serve):
+    (tmp_path / "src" / "page.md").write_text("# hello\n")
+    get = serve()
+
+    status, body = get("/page.html")
+
+    assert status == 200
+    assert "<h1 id='hello'> hello</h1>" in body
+    assert devserver.RELOAD_SCRIPT in body
+
+
+def test_page_that_is_not_utf8(tmp_path, serve):
+    (tmp_path / "src" / "page.md").write_bytes(b"# caf\xe9\n")
+    get = serve()
+
+    status, body = get("/page.html")
+
+    assert status == 500
+    assert "UnicodeDecodeError" in body
+    assert devserver.RELOAD_SCRIPT in body
+
+    # the index leaves the broken page out instead of failing too
+    assert get("/")[0] == 200
+
+    (tmp_path / "src" / "page.md").write_text("# café\n")
+    assert get("/page.html")[0] == 200
+
+
+def test_broken_layout(tmp_path, serve):
+    (tmp_path / "src" / "page.md").write_text("# hello\n")
+    layout = tmp_path / "layout.html"
+    layout.write_text("<html>{{ title }}</html>")
+    get = serve(str(layout))
+
+    for path in ("/page.html", "/"):
+        status, body = get(path)
+
+        assert status == 500
+        assert "content" in body
+        assert devserver.RELOAD_SCRIPT in body
+
+    layout.write_text("<html>{{ content }}{{ meta }}</html>")
+    assert get("/page.html")[0] == 200
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+#   \title      test_escape.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       The escaping fast path against a plain table driven escape
+#
+#   \license    MIT
+
+
+import itertools
+import html
+import sys
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from escape import escape_attr, escape_text
+import template
+import core
+
+
+# escaping the slow and obvious way, one lookup per character
+TEXT_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+ATTR_TABLE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", "'": "&#39;", '"': "&quot;"}
+)
+
+# every special character, and one that is not, in every order up to three long
+CHARS = "&<>\"'a"
+STRINGS = [
+    "".join(chars)
+    for length in range(4)
+    for chars in itertools.product(CHARS, repeat=length)
+]
+
+
+@pytest.mark.parametrize("text", STRINGS)
+def test_escape_text(text):
+    escaped = escape_text(text)
+
+    assert escaped == text.translate(TEXT_TABLE)
+    assert html.unescape(escaped) == text
+
+
+@pytest.mark.parametrize("text", STRINGS)
+def test_escape_attr(text):
+    escaped = escape_attr(text)
+
+    assert escaped == text.translate(ATTR_TABLE)
+    assert html.unescape(escaped) == text
+    assert "'" not in escaped and '"' not in escaped
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "plain", "&amp;", "&lt;already&gt;", "x" * 1000 + "&", "é€𝄞 <b>"],
+)
+def test_escape_longer(text):
+    assert escape_text(text) == text.translate(TEXT_TABLE)
+    assert escape_attr(text) == text.translate(ATTR_TABLE)
+
+
+def test_nothing_to_escape_is_the_same_string():
+    text = "nothing to see here"
+
+    assert escape_text(text) is text
+    assert escape_attr(text) is text
+
+
+@pytest.mark.parametrize("text", STRINGS)
+def test_paragraph_text(text):
+    # the parser only escapes the runs it marked unsafe_text, quotes are
+    # left alone outside of attributes
+    parser = core.PageParser(layout=template.PageTemplate.parse("{{ content }}"))
+    page = "x " + text + "\n"
+    html_page = parser.render(lexer=core.PageLexer(io.StringIO(page)))
+
+    assert html_page == "<p>" + ("x " + text).translate(TEXT_TABLE) + "</p>"
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+#   \title      test_highlight.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Highlighting fenced code blocks, the rules of every language
+#               and the cache
+#
+#   \license    MIT
+
+
+import time
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import highlight
+
+
+def span(kind: str, html: str) -> str:
+    return f"<span class='{kind}'>{html}</span>"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    highlight._highlighted.clear()
+    yield
+    highlight._highlighted.clear()
+
+
+@pytest.mark.parametrize(
+    "lang, code, html",
+    [
+        (
+            "python",
+            "@dec.x\nclass A(object): pass\nx = 0x1F, 2.5e3j, None # c\n",
+            span("p", "@dec.x")
+            + "\n"
+            + span("k", "class")
+            + " A("
+            + span("b", "object")
+            + "): "
+            + span("k", "pass")
+            + "\nx = "
+            + span("n", "0x1F")
+            + ", "
+            + span("n", "2.5e3j")
+            + ", "
+            + span("k", "None")
+            + " "
+            + span("c", "# c")
+            + "\n",
+        ),
+        (
+            "python",
+            "s = r'\\d' + \"\"\"a\n'b'\"\"\"",
+            "s = " + span("s", "r'\\d'") + " + " + span("s", '"""a\n\'b\'"""'),
+        ),
+        (
+            "c",
+            "#include <stdio.h>\nint main(void) { return 0x1Fu; } /* x\ny */\n",
+            span("p", "#include")
+            + " &lt;stdio.h&gt;\n"
+            + span("b", "int")
+            + " main("
+            + span("b", "void")
+            + ") { "
+            + span("k", "return")
+            + " "
+            + span("n", "0x1Fu")
+            + "; } "
+            + span("c", "/* x\ny */")
+            + "\n",
+        ),
+        (
+            "shell",
+            "echo \"$HOME\" 'a' ${PATH} $1 # note\nif x; then exit; fi",
+            span("b", "echo")
+            + " "
+            + span("s", '"$HOME"')
+            + " "
+            + span("s", "'a'")
+            + " "
+            + span("v", "${PATH}")
+            + " "
+            + span("v", "$1")
+            + " "
+            + span("c", "# note")
+            + "\n"
+            + span("k", "if")
+            + " x; "
+            + span("k", "then")
+            + " "
+            + span("b", "exit")
+            + "; "
+            + span("k", "fi"),
+        ),
+        (
+            "yaml",
+            "key: 'it''s' # c\n---\nlist: &a [yes, 12]\nref: *a\n",
+            span("v", "key")
+            + ": "
+            + span("s", "'it''s'")
+            + " "
+            + span("c", "# c")
+            + "\n"
+            + span("p", "---")
+            + "\n"
+            + span("v", "list")
+            + ": "
+            + span("p", "&amp;a")
+            + " ["
+            + span("k", "yes")
+            + ", "
+            + span("n", "12")
+            + "]\n"
+            + span("v", "ref")
+            + ": "
+            + span("p", "*a")
+            + "\n",
+        ),
+    ],
+)
+def test_rules(lang, code, html):
+    assert highlight.highlight(lang, code) == html
+
+
+@pytest.mark.parametrize(
+    "lang, code, html",
+    [
+        (
+            "python",
+            'x = "<a>" # &c',
+            "x = " + span("s", '"&lt;a&gt;"') + " " + span("c", "# &amp;c"),
+        ),
+        ("c", "/* <b> & */ a<b", span("c", "/* &lt;b&gt; &amp; */") + " a&lt;b"),
+        ("c", "'<' \"&\"", span("s", "'&lt;'") + " " + span("s", '"&amp;"')),
+        (
+            "shell",
+            'echo "a & <b>"',
+            span("b", "echo") + " " + span("s", '"a &amp; &lt;b&gt;"'),
+        ),
+        (
+            "yaml",
+            'k: "<v>" # &',
+            span("v", "k")
+            + ": "
+            + span("s", '"&lt;v&gt;"')
+            + " "
+            + span("c", "# &amp;"),
+        ),
+        ("yaml", "&a <x>", span("p", "&amp;a") + " &lt;x&gt;"),
+    ],
+)
+def test_escaping(lang, code, html):
+    # quotes are left as they are, the html never puts code in an attribute
+    assert highlight.highlight(lang, code) == html
+
+
+@pytest.mark.parametrize(
+    "lang, code, html",
+    [
+        ("c", "x /* a < b\nc", "x " + span("c", "/* a &lt; b\nc")),
+        ("c", 'x = "a\\" b\ny', "x = " + span("s", '"a\\" b') + "\ny"),
+        ("python", "x = 'it\\", "x = " + span("s", "'it\\")),
+        (
+            "shell",
+            "echo ${PATH\nls",
+            span("b", "echo") + " " + span("v", "${PATH") + "\nls",
+        ),
+    ],
+)
+def test_unclosed(lang, code, html):
+    # runs to the end of the line, or the block for a comment
+    assert highlight.highlight(lang, code) == html
+
+
+@pytest.mark.parametrize(
+    "alias", ["py", "Python", "h", "C", "bash", "SH", "console", "yml"]
+)
+def test_aliases(alias):
+    assert highlight.highlight(alias, "x") == "x"
+
+
+def test_unknown_language():
+    assert highlight.highlight("brainfuck", "+[<]") is None
+    assert highlight.highlight("", "x") is None
+
+
+@pytest.mark.parametrize(
+    "lang, opener",
+    [
+        ("c", "/* x "),
+        ("c", '"\\'),
+        ("python", '"\\'),
+        ("python", "'\\"),
+        ("shell", '"\\'),
+        ("shell", "${"),
+        ("yaml", '"\\'),
+        ("yaml", "0x"),
+    ],
+)
+def test_unclosed_is_linear(lang, opener):
+    # quadratic would be 10^10 steps for this, far past the limit
+    start = time.perf_counter()
+    html = highlight.highlight(lang, opener * 100_000)
+
+    assert time.perf_counter() - start < 2
+    assert html.count("<span") <= 1
+
+
+def test_cache():
+    code = "int x = 1; /* <c> */"
+    html = highlight.highlight("c", code)
+
+    assert len(highlight._highlighted) == 1
+    assert highlight.highlight("h", code) is html
+
+    # the language is part of the key
+    assert highlight.highlight("python", code) != html
+    assert len(highlight._highlighted) == 2
+
+
+def test_cache_drops_the_oldest(monkeypatch):
+    monkeypatch.setattr(highlight, "CACHE_SIZE", 3)
+
+    first = highlight.highlight("c", "0")
+    for code in ("1", "2", "3"):
+        highlight.highlight("c", code)
+
+    assert len(highlight._highlighted) == 3
+    assert highlight.highlight("c", "0") is not first
+    assert highlight.highlight("c", "3") == span("n", "3")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+#   \title      test_ircache.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       The binary IR cache gives back exactly the IR it was given
+#
+#   \license    MIT
+
+
+import random
+import sys
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import ircache
+import core
+
+
+# lines random pages are made of, every kind of node, nested and unordered
+# lists, repeated strings and text that is not ascii
+LINES = (
+    "# heading",
+    "## heading *em* and **strong**",
+    "plain text",
+    "plain text",
+    "café, 𝄞 and € signs",
+    "a [link](https://example.com) and `code`",
+    "- item",
+    "  - nested item",
+    "    - deeper",
+    "1. first",
+    "2. second",
+    "\t* tab indented",
+    "10. ten",
+    "```py\nx = 'a' * 300\n```",
+    "// comment",
+    "\\z unknown option",
+    "<b> & </b>",
+    "",
+)
+
+
+def random_page(seed: int) -> str:
+    rnd = random.Random(seed)
+    lines = [rnd.choice(LINES) for _ in range(rnd.randint(0, 60))]
+
+    # long text, its length takes more than one varint byte
+    if rnd.random() < 0.3:
+        lines.append("long " * rnd.randint(30, 300))
+
+    return "\n".join(lines) + "\n"
+
+
+def parse(page: str) -> tuple:
+    lexer = core.PageLexer(io.StringIO(page))
+    parser = core.PageParser()
+    parser.create_ir(lexer)
+
+    return parser.tree.successors, lexer.errors
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_round_trip(seed):
+    page = random_page(seed)
+    nodes, errors = parse(page)
+
+    assert ircache.loads(ircache.dumps(nodes, errors)) == parse(page)
+
+
+def test_round_trip_keeps_every_field():
+    page = "\\z bad\n# title\n- a\n    - b\n  1. c\n3. d\n"
+    nodes, errors = parse(page)
+    loaded_nodes, loaded_errors = ircache.loads(ircache.dumps(nodes, errors))
+
+    assert loaded_errors == errors != []
+
+    stack = list(zip(nodes, loaded_nodes))
+    while stack:
+        node, loaded = stack.pop()
+        for name in ("type", "text", "depth", "ordered", "indent"):
+            assert getattr(node, name) == getattr(loaded, name)
+
+        assert len(node.successors) == len(loaded.successors)
+        stack.extend(zip(node.successors, loaded.successors))
+
+
+def test_truncated():
+    data = ircache.dumps(*parse(random_page(1) * 3))
+
+    for size in range(len(data)):
+        with pytest.raises(ValueError):
+            ircache.loads(data[:size])
+
+
+def test_corrupted():
+    data = ircache.dumps(*parse(random_page(2)))
+
+    with pytest.raises(ValueError):
+        ircache.loads(b"XXXX" + data[4:])
+
+    with pytest.raises(ValueError):
+        ircache.loads(data + b"\x00")
+
+    # a string table that is not utf-8
+    nodes = [core.DocNode(core.DocNodeType.paragraph, text="ab")]
+    broken = ircache.dumps(nodes).replace(b"ab", b"\xff\xfe")
+    with pytest.raises(ValueError):
+        ircache.loads(broken)
+
+    # anything else that is wrong either reads as some IR or is a ValueError
+    rnd = random.Random(3)
+    for _ in range(2000):
+        flipped = bytearray(data)
+        for _ in range(rnd.randint(1, 3)):
+            index = rnd.randrange(len(ircache.MAGIC), len(data))
+            flipped[index] ^= 1 << rnd.randrange(8)
+
+        try:
+            ircache.loads(bytes(flipped))
+        except ValueError:
+            pass
+
+
+def test_wrong_version(monkeypatch):
+    data = ircache.dumps(*parse(random_page(4)))
+    monkeypatch.setattr(ircache, "IR_VERSION", ircache.IR_VERSION + 1)
+
+    with pytest.raises(ValueError, match="version"):
+        ircache.loads(data)
+
+
+def test_cache_hit_renders_the_same(tmp_path):
+    source = tmp_path / "page.md"
+    source.write_text("\\o title: cached\n" + random_page(5) + "\\z bad\n")
+    cache_dir = str(tmp_path / "cache")
+
+    pages = []
+    for _ in range(2):
+        errors = []
+        outline = core.PageOutline(index=True)
+        html = ircache.compile_page(
+            str(source), cache_dir, outline=outline, errors=errors
+        )
+        pages.append((html, outline.as_dict(), errors))
+
+    assert len(os.listdir(cache_dir)) == 1
+    assert pages[0] == pages[1]
+    assert pages[0][0] == core.compile_page(str(source))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+#   \title      test_lexer.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Every lexer engine has to give the same tokens and errors as
+#               the legacy one for the same page
+#
+#   \license    MIT
+
+
+import random
+import sys
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import core
+
+
+# what random lines are made of, backticks included on purpose
+ALPHABET = "abcXYZ 12.#-\t()|+*<>&[]`é€𝄞\\"
+
+# window sizes for the chunked engine, small ones put every construct across
+# the edge of a chunk
+CHUNK_SIZES = (1, 3, 17)
+
+
+def random_line(rnd: random.Random) -> str:
+    kind = rnd.random()
+    text = "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 40)))
+
+    if kind < 0.1:
+        return "#" * rnd.randint(1, 4) + " heading " + text
+    if kind < 0.15:
+        indent = rnd.choice(["", "  ", "\t", "    "])
+        return indent + rnd.choice(["-", "*", "+", "12."]) + rnd.choice([" ", ""]) + "x"
+    if kind < 0.2:
+        return "// comment " + text
+    if kind < 0.3:
+        # backticks inside a block are code, only ``` closes it
+        body = rnd.choice(["a ` b", "``x``", "`", "``", "a``", ""]) + text
+        return f"```py\n{body}\n```"
+    if kind < 0.35:
+        return rnd.choice(["``code`` at the start", "`span` here", "``", "`"])
+    if kind < 0.4:
+        return rnd.choice(["\\z bad", "\\", "x \\q", "\\o title: t", "/", "/ x"])
+    if kind < 0.45:
+        return ""
+
+    return text
+
+
+def random_page(seed: int) -> str:
+    rnd = random.Random(seed)
+    page = "\n".join(random_line(rnd) for _ in range(rnd.randint(0, 40)))
+
+    if rnd.random() < 0.5:
+        page += "\n"
+    if rnd.random() < 0.2:
+        # the page ends in the middle of something
+        page += rnd.choice(["```py\nunclosed", "```", "``", "`", "\\", "/", "-"])
+
+    return page
+
+
+def lex(source, **kwargs) -> tuple:
+    lexer = core.PageLexer(source, **kwargs)
+    tokens = lexer.lex_page()
+
+    return tokens, [(error.message, error.line, error.column) for error in lexer.errors]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_engines_agree(seed):
+    page = random_page(seed)
+    expected = lex(io.StringIO(page), engine="legacy")
+
+    assert lex(io.StringIO(page), engine="fast") == expected
+
+    for size in CHUNK_SIZES:
+        assert lex(io.StringIO(page), chunk_size=size) == expected
+
+    assert lex(page.encode()) == expected
+    assert lex(page.replace("\n", "\r\n").encode()) == expected
+
+
+@pytest.mark.parametrize("engine", ["legacy", "fast"])
+def test_code_block_keeps_backticks(engine):
+    tokens, errors = lex(io.StringIO("```\na `b` ``c`` d\n```\n"), engine=engine)
+
+    assert tokens == [core.DocToken(core.DocNodeType.code_block, "\na `b` ``c`` d\n")]
+    assert errors == []
+
+
+@pytest.mark.parametrize("engine", ["legacy", "fast"])
+def test_code_span_starts_a_paragraph(engine):
+    tokens, errors = lex(io.StringIO("``code`` here\n"), engine=engine)
+
+    assert tokens == [core.DocToken(core.DocNodeType.paragraph, "``code`` here")]
+    assert errors == []
+
+
+@pytest.mark.parametrize(
+    "end", ["/", "\\", "\\o", "`", "``", "```", "```py\nunclosed", "#", "-", "1.", "*"]
+)
+def test_page_ends_mid_construct(end):
+    page = "a paragraph\n" + end
+    expected = lex(io.StringIO(page), engine="legacy")
+
+    assert lex(io.StringIO(page), engine="fast") == expected
+    assert lex(io.StringIO(page), chunk_size=1) == expected
+    assert lex(page.encode()) == expected
+
+
+def test_page_ends_in_a_slash():
+    tokens, errors = lex(io.StringIO("text\n/"), engine="legacy")
+
+    assert tokens == [core.DocToken(core.DocNodeType.paragraph, "text")]
+    assert errors == [("page ends in a lone /", 2, 1)]
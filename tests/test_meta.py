@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+#   \title      test_meta.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       The \o front matter of a page and the title it ends up with
+#
+#   \license    MIT
+
+
+import sys
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import template
+import core
+
+
+def meta_of(*options) -> core.PageMeta:
+    meta = core.PageMeta()
+    for option in options:
+        core.parse_option(option, meta)
+
+    return meta
+
+
+def test_options():
+    meta = meta_of(
+        " title: Writing a compiler ",
+        "date: 2024-03-01",
+        "tags: python,  lexers ,",
+        "draft: yes",
+    )
+
+    assert meta == core.PageMeta(
+        "Writing a compiler", "2024-03-01", ["python", "lexers"], True
+    )
+
+
+def test_json_options():
+    meta = meta_of(
+        '{"title": "T", "date": "2024-03-01", "tags": ["a", "b"], "draft": false}'
+    )
+
+    assert meta == core.PageMeta("T", "2024-03-01", ["a", "b"], False)
+
+
+@pytest.mark.parametrize(
+    "option",
+    [
+        "tags: a, b, a, b",
+        "tags: a,a,,b",
+        '{"tags": ["a", "b", " a ", "b"]}',
+    ],
+)
+def test_repeated_tags(option):
+    assert meta_of(option).tags == ["a", "b"]
+
+
+def test_later_option_wins():
+    meta = meta_of("tags: a", "tags: b", "title: one", "title: two")
+
+    assert meta.tags == ["b"]
+    assert meta.title == "two"
+
+
+@pytest.mark.parametrize(
+    "date", ["2024-02-30", "2024-13-01", "yesterday", "01/03/2024", "", "2024-3-1x"]
+)
+def test_bad_dates(date):
+    with pytest.raises(ValueError, match="date is YYYY-MM-DD"):
+        meta_of(f"date: {date}")
+
+
+@pytest.mark.parametrize(
+    "option, message",
+    [
+        ("author: me", "unknown option 'author'"),
+        ('{"title": "t", "Title": "u"}', "unknown option 'Title'"),
+        ("no colon here", "expects key: value"),
+        ("draft: maybe", "draft is true or false"),
+        ('{"draft": 1}', "draft is true or false"),
+        ('["title", "t"]', "expects key: value"),
+        ("{not json", "Expecting property name"),
+    ],
+)
+def test_bad_options(option, message):
+    with pytest.raises(ValueError, match=message):
+        meta_of(option)
+
+
+def test_bad_option_is_a_page_error():
+    page = core.PageLexer(io.StringIO("\\o date: soon\n\\o title: t\n# h\n"))
+
+    assert page.meta.title == "t"
+    assert page.meta.date is None
+    assert [error.message for error in page.errors] == [
+        "date is YYYY-MM-DD, not 'soon'"
+    ]
+
+
+def title_of(html: str) -> str:
+    return html[html.index("<title>") + 7 : html.index("</title>")]
+
+
+@pytest.mark.parametrize(
+    "page, title",
+    [
+        ("\\o title: From <options>\n# Heading\n", "From &lt;options&gt;"),
+        ("intro\n\n## sub\n\n# First *h1* & co\n\n# second\n", "First h1 &amp; co"),
+        ("## only an h2\n", "page"),
+        ("", "page"),
+    ],
+)
+def test_title(tmp_path, page, title):
+    source = tmp_path / "page.md"
+    source.write_text(page)
+
+    assert title_of(core.compile_page(str(source))) == title
+    assert title_of(core.compile_text(page, slots={"title": "page"})) == title
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_title_from_a_late_h1(jobs):
+    # the head is held back until the h1 turns up, the page is the same
+    page = "text\n\n" * 100 + "# Late\n\n" + "more\n\n" * 100
+    parser = core.PageParser(slots={"title": "page"}, h1_title=True)
+    html = parser.render_parallel(jobs, core.PageLexer(io.StringIO(page)))
+
+    expected = core.PageParser(slots={"title": "Late"}).render(
+        lexer=core.PageLexer(io.StringIO(page))
+    )
+    assert html == expected
+
+    out = io.StringIO()
+    core.PageParser(slots={"title": "page"}, h1_title=True).render_to(
+        out, core.PageLexer(io.StringIO(page))
+    )
+    assert out.getvalue() == expected
+
+
+def test_title_with_toc_first():
+    layout = template.PageTemplate.parse(
+        "<title>{{ title }}</title>{{ toc }}{{ content }}"
+    )
+    page = "# One\n\n## a\n\n## b\n"
+    parser = core.PageParser(layout=layout, slots={"title": "page"}, h1_title=True)
+    html = parser.render(lexer=core.PageLexer(io.StringIO(page)))
+
+    assert html.startswith("<title>One</title><nav class='toc'>")
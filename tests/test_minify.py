@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+#   \title      test_minify.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Streamed minifying and gzipping give what the whole page does
+#
+#   \license    MIT
+
+
+import random
+import sys
+import gzip
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import minify
+
+
+# what random pages are made of, tags that drop whitespace around them and
+# ones that do not, preserved elements in any case, and plenty of whitespace
+PIECES = (
+    "<p>", "</p>", "<li>", "</li>", "<div class='x'>", "</div>", "<em>", "</em>",
+    "<a href='u'>", "</a>", "<pre>", "</pre>", "<PRE >", "</pre >", "<textarea>",
+    "</textarea>", "<script>", "</script>", "<style>", "</style>", "<code>",
+    "</code>", "<br>", "text", "more  text", "x>y", " ", "  ", "\n", "\t", " \n ",
+    ">", "<", "&amp;",
+)
+
+
+def random_html(seed: int) -> str:
+    rnd = random.Random(seed)
+
+    return "".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 80)))
+
+
+def streamed(fragments: list) -> str:
+    out = io.StringIO()
+    writer = minify.MinifyingWriter(out)
+
+    for fragment in fragments:
+        writer.write(fragment)
+    writer.close()
+
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_split_at_every_offset(seed):
+    html = random_html(seed)
+    expected = minify.minify(html)
+
+    for cut in range(len(html) + 1):
+        assert streamed([html[:cut], html[cut:]]) == expected
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_split_at_random_offsets(seed):
+    html = random_html(seed)
+    rnd = random.Random(seed)
+
+    cuts = sorted(rnd.randint(0, len(html)) for _ in range(rnd.randint(0, 20)))
+    fragments = [html[start:end] for start, end in zip([0] + cuts, cuts + [len(html)])]
+
+    assert streamed(fragments) == minify.minify(html)
+
+
+def test_one_char_at_a_time():
+    html = "".join(random_html(seed) for seed in range(20))
+
+    assert streamed(list(html)) == minify.minify(html)
+
+
+def test_preserved_whitespace():
+    html = "<p>  a  </p>\n<pre>  x\n   y </pre>  <p> b </p>"
+
+    assert minify.minify(html) == "<p>a</p><pre>  x\n   y </pre><p>b</p>"
+
+
+@pytest.mark.parametrize("level", [1, 6, 9])
+def test_gzip_writer_matches_gzip_bytes(level):
+    html = "".join(random_html(seed) for seed in range(50))
+
+    out, gzip_fd = io.StringIO(), io.BytesIO()
+    writer = minify.GzipWriter(out, gzip_fd, level)
+    for start in range(0, len(html), 97):
+        writer.write(html[start : start + 97])
+    writer.close()
+
+    assert out.getvalue() == html
+    assert gzip.decompress(gzip_fd.getvalue()) == html.encode()
+    assert gzip.decompress(minify.gzip_bytes(html.encode(), level)) == html.encode()
+
+    # same bytes every time, the mtime in the header is left at 0
+    assert gzip_fd.getvalue() == minify.gzip_bytes(html.encode(), level)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+#   \title      test_parser.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Rendering pages with PageParser
+#
+#   \license    MIT
+
+
+import subprocess
+import sys
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import assets
+import core
+import template
+
+
+def render(page: str) -> str:
+    out = io.StringIO()
+    parser = core.PageParser()
+    parser.outline.index = True
+    parser.render_to(out, core.PageLexer(io.StringIO(page)))
+
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("start", ["", "# ", "- "])
+def test_deep_nesting(start):
+    # far deeper than the recursion limit
+    depth = sys.getrecursionlimit() * 2
+    html = render(start + "*x " * depth + "[y](u)" + " x*" * depth + "\n")
+
+    assert html.count("<em>") == html.count("</em>") == depth
+    assert html.count("<a href='u'>y</a>") == 1
+
+
+@pytest.mark.parametrize(
+    "page, html",
+    [
+        ("[a](b) [c](d)", "<a href='b'>a</a> <a href='d'>c</a>"),
+        ("[a [b] c](d)", "<a href='d'>a [b] c</a>"),
+        # a link can't be in a link, the outer brackets stay text
+        ("[a [b](c)](d)", "[a <a href='c'>b</a>](d)"),
+        ("[[a](b) [c](d)](e)", "[<a href='b'>a</a> <a href='d'>c</a>](e)"),
+        ("[[[x](u)](u)](u)", "[[<a href='u'>x</a>](u)](u)"),
+        ("[*a [b](c)*](d)", "[<em>a <a href='c'>b</a></em>](d)"),
+        ("**[a [b](c)](d)**", "<strong>[a <a href='c'>b</a>](d)</strong>"),
+        ("[a [b](c)](d) [e](f)", "[a <a href='c'>b</a>](d) <a href='f'>e</a>"),
+    ],
+)
+def test_links_do_not_nest(page, html):
+    assert body(page + "\n") == f"<p>{html}</p>"
+
+
+def test_deeply_nested_links():
+    depth = sys.getrecursionlimit() * 2
+    html = body("[" * depth + "x" + "](u)" * depth + "\n")
+    outer = depth - 1
+
+    assert html == "<p>" + "[" * outer + "<a href='u'>x</a>" + "](u)" * outer + "</p>"
+
+
+def test_stats_of_every_render_path():
+    page = "# title\n\nsome *text*\n\n- a\n  - b\n\n```py\nx = 1\n```\n" * 50
+
+    serial = core.PageStats()
+    core.PageParser(stats=serial).render_to(
+        io.StringIO(), core.PageLexer(io.StringIO(page))
+    )
+
+    parallel = core.PageStats()
+    core.PageParser(stats=parallel).render_parallel(
+        2, core.PageLexer(io.StringIO(page))
+    )
+
+    assert set(serial.phases) == {"lex", "ir", "render"}
+    assert set(parallel.phases) == {"lex", "ir", "parallel render"}
+    assert parallel.nodes == serial.nodes
+    assert parallel.tokens == serial.tokens
+    assert parallel.output_bytes == serial.output_bytes
+    assert len(parallel.slowest) == len(serial.slowest) == serial.keep
+
+
+def test_parallel_render_fingerprints_links(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    (src / "a.png").write_bytes(b"a")
+    (src / "b.txt").write_bytes(b"b")
+
+    page = "# part\n\n[a](a.png) and [b](b.txt?x#y)\n\n" * 40
+    digests = assets.hash_assets(str(src), assets.AssetHashes())
+
+    rendered = []
+    for jobs in (1, 4):
+        page_assets = assets.PageAssets(str(src), str(out), "page.md", digests)
+        parser = core.PageParser(assets=page_assets)
+        html = parser.render_parallel(jobs, core.PageLexer(io.StringIO(page)))
+        rendered.append((html, page_assets.used))
+
+    assert rendered[0] == rendered[1]
+    assert rendered[0][1] == digests
+    assert "a.png" not in rendered[1][0]
+
+
+def body(page: str) -> str:
+    # the page without a layout around it
+    parser = core.PageParser(layout=template.PageTemplate.parse("{{ content }}"))
+
+    return parser.render(lexer=core.PageLexer(io.StringIO(page)))
+
+
+@pytest.mark.parametrize(
+    "page, html",
+    [
+        ("- a\n- b\n", "<ul><li>a</li><li>b</li></ul>"),
+        (
+            "1. a\n2. b\n",
+            "<ol><li value='1'>a</li><li value='2'>b</li></ol>",
+        ),
+        (
+            "- a\n  - b\n  - c\n- d\n",
+            "<ul><li>a<ul><li>b</li><li>c</li></ul></li><li>d</li></ul>",
+        ),
+        (
+            "- a\n  - b\n    - c\n",
+            "<ul><li>a<ul><li>b<ul><li>c</li></ul></li></ul></li></ul>",
+        ),
+        (
+            "* a\n\t+ b\n* c\n",
+            "<ul><li>a<ul><li>b</li></ul></li><li>c</li></ul>",
+        ),
+    ],
+)
+def test_nested_lists(page, html):
+    assert body(page) == html
+
+
+@pytest.mark.parametrize(
+    "page, html",
+    [
+        # back out of two levels at once
+        (
+            "- a\n  - b\n    - c\n- d\n",
+            "<ul><li>a<ul><li>b<ul><li>c</li></ul></li></ul></li><li>d</li></ul>",
+        ),
+        (
+            "- a\n  - b\n    - c\n  - d\n- e\n",
+            "<ul><li>a<ul><li>b<ul><li>c</li></ul></li><li>d</li></ul></li>"
+            "<li>e</li></ul>",
+        ),
+        # between two levels goes with the deeper one
+        (
+            "- a\n    - b\n  - c\n- d\n",
+            "<ul><li>a<ul><li>b</li><li>c</li></ul></li><li>d</li></ul>",
+        ),
+        # further out than the first item is still the top-level list
+        (
+            "  - a\n    - b\n- c\n",
+            "<ul><li>a<ul><li>b</li></ul></li><li>c</li></ul>",
+        ),
+        # a blank line does not end a list
+        (
+            "- a\n  - b\n\n- c\n",
+            "<ul><li>a<ul><li>b</li></ul></li><li>c</li></ul>",
+        ),
+    ],
+)
+def test_list_dedent(page, html):
+    assert body(page) == html
+
+
+@pytest.mark.parametrize(
+    "page, html",
+    [
+        (
+            "- a\n  1. b\n  2. c\n- d\n",
+            "<ul><li>a<ol><li value='1'>b</li><li value='2'>c</li></ol></li>"
+            "<li>d</li></ul>",
+        ),
+        (
+            "1. a\n  - b\n    - c\n3. d\n",
+            "<ol><li value='1'>a<ul><li>b<ul><li>c</li></ul></li></ul></li>"
+            "<li value='3'>d</li></ol>",
+        ),
+        # switching kind on the same level starts another list
+        ("- a\n1. b\n", "<ul><li>a</li></ul><ol><li value='1'>b</li></ol>"),
+        ("1. a\n- b\n", "<ol><li value='1'>a</li></ol><ul><li>b</li></ul>"),
+        (
+            "- a\n  - b\n  1. c\n  - d\n",
+            "<ul><li>a<ul><li>b</li></ul><ol><li value='1'>c</li></ol>"
+            "<ul><li>d</li></ul></li></ul>",
+        ),
+    ],
+)
+def test_mixed_lists(page, html):
+    assert body(page) == html
+
+
+# a layout with the table of contents in front of the page
+TOC_FIRST = "<head><title>{{ title }}</title></head><body>{{ toc }}{{ content }}</body>"
+
+
+def test_toc_before_content_is_held_back():
+    layout = template.PageTemplate.parse(TOC_FIRST)
+    assert layout.held
+
+    page = "# one\n\ntext\n\n## two\n\nmore\n\n## three\n" * 20
+    toc_last = template.PageTemplate.parse(
+        TOC_FIRST.replace("{{ toc }}{{ content }}", "{{ content }}{{ toc }}")
+    )
+
+    def parser(layout, stats=None):
+        return core.PageParser(layout=layout, slots={"title": "t"}, stats=stats)
+
+    expected = parser(toc_last).render(lexer=core.PageLexer(io.StringIO(page)))
+    body = expected[expected.index("<body>") + 6 : expected.index("<nav")]
+    toc = expected[expected.index("<nav") : expected.index("</body>")]
+    html = "<head><title>t</title></head><body>" + toc + body + "</body>"
+
+    assert parser(layout).render(lexer=core.PageLexer(io.StringIO(page))) == html
+    assert parser(layout).render_parallel(
+        4, core.PageLexer(io.StringIO(page))
+    ) == html
+
+    for stats in (None, core.PageStats()):
+        out = io.StringIO()
+        parser(layout, stats).render_to(out, core.PageLexer(io.StringIO(page)))
+        assert out.getvalue() == html
+
+        if stats is not None:
+            assert stats.output_bytes == len(html.encode())
+            # blocks are counted as they render, not when the page is let go
+            assert all(entry[2] > 0 for entry in stats.slowest)
+
+
+def test_stream_needs_toc_after_content(tmp_path):
+    (tmp_path / "layout.html").write_text(TOC_FIRST)
+    (tmp_path / "page.md").write_text("# one\n\n## two\n\n## three\n")
+    core_py = os.path.join(os.path.dirname(__file__), "..", "src", "core.py")
+
+    def run(*flags):
+        return subprocess.run(
+            [sys.executable, core_py, "page.md", "page.html", "--layout",
+             "layout.html", *flags],
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+        )
+
+    streamed = run("--stream")
+    assert streamed.returncode != 0
+    assert "--stream needs {{ toc }} after content" in streamed.stderr
+
+    assert run().returncode == 0
+    html = (tmp_path / "page.html").read_text()
+    assert html.index("<nav class='toc'>") < html.index("<h1")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+#   \title      test_server.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       The compile server and its json line protocol, over a real
+#               socket
+#
+#   \license    MIT
+
+
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import socket
+import stat
+import json
+import sys
+import os
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import client
+import server
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    """
+        a compile server listening on a socket in tmp_path
+    """
+    path = str(tmp_path / "pquill.sock")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SRC_DIR, "server.py"), "--socket", path],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    # the socket shows up before it is chmodded, the line comes after
+    line = process.stdout.readline()
+    assert line.startswith("listening on"), "the server did not start"
+
+    yield path
+
+    process.terminate()
+    process.wait(10)
+    process.stdout.close()
+
+
+def send_lines(path: str, data: bytes) -> list:
+    """
+        send raw bytes over one connection, every reply line that comes back
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+
+        with sock.makefile("rb") as replies:
+            return [json.loads(line) for line in replies]
+
+
+def test_socket_is_private(socket_path):
+    mode = os.lstat(socket_path).st_mode
+
+    assert stat.S_ISSOCK(mode)
+    assert stat.S_IMODE(mode) == 0o600
+
+
+def test_text_request(socket_path):
+    reply = client.request({"text": "\\o title: t\n# hello\n\\z\n"}, socket_path)
+
+    assert "<h1 id='hello'> hello</h1>" in reply["html"]
+    assert reply["title"] == "t"
+    assert reply["meta"]["title"] == "t"
+    assert [error["line"] for error in reply["diagnostics"]] == [3]
+
+
+def test_path_request(socket_path, tmp_path):
+    page = tmp_path / "page.md"
+    page.write_text("# from a file\n")
+
+    reply = client.request({"path": str(page)}, socket_path)
+
+    assert "from a file" in reply["html"]
+    assert reply["title"] == "from a file"
+
+
+def test_bad_requests(socket_path):
+    replies = send_lines(
+        socket_path,
+        b"not json\n"
+        b"[1, 2]\n"
+        b'{"path": "a", "text": "b"}\n'
+        b'{"text": "x", "engine": "nope"}\n'
+        b'{"path": "/no/such/page.md"}\n'
+        b'{"text": "still answered"}\n',
+    )
+
+    assert [reply.get("error", "")[:11] for reply in replies] == [
+        "bad request",
+        "bad request",
+        "ValueError:",
+        "ValueError:",
+        "FileNotFoun",
+        "",
+    ]
+    assert "still answered" in replies[-1]["html"]
+
+
+def test_concurrent_requests(socket_path):
+    def compile(index: int) -> dict:
+        return client.request({"text": f"# page {index}\n" * 200}, socket_path)
+
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(compile, range(32)))
+
+    for index, reply in enumerate(replies):
+        assert reply["html"].count(f"page {index}</h1>") == 200
+
+
+def test_claim_socket_refuses_other_files(tmp_path):
+    path = tmp_path / "not-a-socket"
+    path.write_text("keep me")
+
+    with pytest.raises(RuntimeError):
+        server.claim_socket(str(path))
+
+    assert path.read_text() == "keep me"
+
+
+def test_claim_socket_refuses_a_live_server(socket_path):
+    with pytest.raises(RuntimeError):
+        server.claim_socket(socket_path)
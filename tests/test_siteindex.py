@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+#   \title      test_siteindex.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Heading ids and the search index built out of page outlines
+#
+#   \license    MIT
+
+
+from xml.etree import ElementTree
+import sys
+import io
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import siteindex
+import template
+import core
+
+
+def slugs(*headings) -> list:
+    outline = core.PageOutline()
+    return [outline.add_heading(2, text) for text in headings]
+
+
+def outline_of(page: str) -> dict:
+    parser = core.PageParser()
+    parser.outline.index = True
+    parser.render(lexer=core.PageLexer(io.StringIO(page)))
+
+    return parser.outline.as_dict()
+
+
+@pytest.mark.parametrize(
+    "text, slug",
+    [
+        ("Usage", "usage"),
+        ("  Getting Started  ", "getting-started"),
+        ("Hello, World!", "hello-world"),
+        ("snake_case and-dashes", "snake-case-and-dashes"),
+        ("C++ / Rust", "c-rust"),
+        ("Ünïcode wörds", "ünïcode-wörds"),
+        ("", "section"),
+        ("!!!", "section"),
+    ],
+)
+def test_slug(text, slug):
+    assert slugs(text) == [slug]
+
+
+@pytest.mark.parametrize(
+    "headings, expected",
+    [
+        (["Usage", "Usage", "Usage"], ["usage", "usage-2", "usage-3"]),
+        (["Usage", "usage", "USAGE!"], ["usage", "usage-2", "usage-3"]),
+        (["Usage 2", "Usage", "Usage"], ["usage-2", "usage", "usage-3"]),
+        (["Usage", "Usage", "Usage 2"], ["usage", "usage-2", "usage-2-2"]),
+        (["", "?", "Section"], ["section", "section-2", "section-3"]),
+    ],
+)
+def test_slug_collisions(headings, expected):
+    assert slugs(*headings) == expected
+
+
+def test_slugs_are_stable():
+    headings = ["Usage", "Usage 2", "Usage", "", "Usage", "Section", ""] * 5
+    first = slugs(*headings)
+
+    assert len(set(first)) == len(first)
+    assert slugs(*headings) == first
+
+    # however the page gets rendered
+    page = "".join(f"## {text}\n\ntext\n\n" for text in headings)
+    serial = core.PageParser()
+    serial.render(lexer=core.PageLexer(io.StringIO(page)))
+    parallel = core.PageParser()
+    parallel.render_parallel(4, core.PageLexer(io.StringIO(page)))
+
+    assert [slug for depth, slug, text in serial.outline.headings] == first
+    assert [slug for depth, slug, text in parallel.outline.headings] == first
+
+
+def test_search_index_postings():
+    outlines = {
+        "b.md": outline_of("intro words\n\n# Bee\n\nshared honey\n"),
+        "a.md": outline_of("# Ant\n\nshared x\n\n## Ant\n\ncolony *Shared*\n"),
+    }
+    index = siteindex.search_index(outlines, {"b.md": {"title": "The Bee"}})
+
+    assert index["version"] == siteindex.SEARCH_VERSION
+    assert index["pages"] == [["a.html", "Ant"], ["b.html", "The Bee"]]
+    assert index["sections"] == [
+        [0, "", ""],
+        [0, "ant", "Ant"],
+        [0, "ant-2", "Ant"],
+        [1, "", ""],
+        [1, "bee", "Bee"],
+    ]
+
+    # lower cased, one letter words left out, a section only once per term
+    assert index["terms"] == {
+        "ant": [1, 2],
+        "shared": [1, 2, 4],
+        "colony": [2],
+        "intro": [3],
+        "words": [3],
+        "bee": [4],
+        "honey": [4],
+    }
+
+
+def test_search_index_of_nothing():
+    index = siteindex.search_index({})
+
+    assert index["pages"] == index["sections"] == []
+    assert index["terms"] == {}
+
+
+# text that has to be escaped in xml and html, in text and in either kind of
+# quoted attribute
+NASTY = "<b> & 'single' \"double\""
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+SITEMAP = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+def test_feed_escapes():
+    outlines = {"a&b.md": {"title": None, "headings": [], "terms": [[]]}}
+    metas = {"a&b.md": {"title": NASTY, "date": "2024-03-01", "tags": [NASTY]}}
+    site_url = "https://example.com/?x='1'&y=\"2\""
+
+    feed = ElementTree.fromstring(
+        siteindex.feed_xml(outlines, metas, site_url, title=NASTY)
+    )
+
+    assert feed.find(f"{ATOM}title").text == NASTY
+    assert feed.find(f"{ATOM}author/{ATOM}name").text == NASTY
+    assert feed.find(f"{ATOM}link").get("href") == site_url + "/"
+
+    entry = feed.find(f"{ATOM}entry")
+    assert entry.find(f"{ATOM}title").text == NASTY
+    assert entry.find(f"{ATOM}link").get("href") == "https://example.com/a&b.html"
+    assert entry.find(f"{ATOM}id").text == "https://example.com/a&b.html"
+    assert entry.find(f"{ATOM}category").get("term") == NASTY
+
+
+def test_sitemap_escapes():
+    urls = [("a&b.html", "a&b.md"), ("q'\"<>.html", None)]
+    metas = {"a&b.md": {"date": "2024-03-01"}}
+
+    sitemap = ElementTree.fromstring(
+        siteindex.sitemap_xml(urls, metas, "https://example.com/?x&y")
+    )
+
+    locs = [url.find(f"{SITEMAP}loc").text for url in sitemap]
+    assert locs == ["https://example.com/a&b.html", "https://example.com/q'\"<>.html"]
+    assert sitemap[0].find(f"{SITEMAP}lastmod").text == "2024-03-01"
+    assert sitemap[1].find(f"{SITEMAP}lastmod") is None
+
+
+def test_tag_page_escapes():
+    layout = template.PageTemplate.parse(
+        "<title>{{ title }}</title><link href='{{ stylesheet }}'>{{ content }}"
+    )
+    outlines = {"a.md": {"title": None, "headings": [], "terms": [[]]}}
+    metas = {"a.md": {"title": NASTY, "tags": [NASTY]}}
+
+    html = siteindex.tag_page(NASTY, ["a.md"], outlines, metas, layout)
+    text = "&lt;b&gt; &amp; 'single' \"double\""
+
+    assert html.startswith(f"<title>{text}</title>")
+    assert f"<h1 id='tag'>{text}</h1>" in html
+    assert f"<a href='../a.html'>{text}</a>" in html
+    assert "<b>" not in html
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+#   \title      test_template.py
+#
+#   \author     Nathan Reed <nreed@linux.com>
+#
+#   \dsec       Parsing layouts into PageTemplates and the layout cache
+#
+#   \license    MIT
+
+
+import sys
+import os
+import re
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import template
+
+
+def test_parse():
+    layout = template.PageTemplate.parse(
+        "<title>{{title}}</title>{{  meta }}<body>{{ content }}</body>{{ toc }}"
+    )
+
+    assert layout.prologue == (
+        (False, "<title>"),
+        (True, "title"),
+        (False, "</title>"),
+        (True, "meta"),
+        (False, "<body>"),
+    )
+    assert layout.epilogue == ((False, "</body>"), (True, "toc"))
+    assert layout.slots == {"title", "meta", "toc"}
+    assert not layout.held
+
+
+def test_fill():
+    layout = template.PageTemplate.parse(
+        "{{ title }}|{{ stylesheet }}|{{ content }}|{{ title }}{{ meta }}"
+    )
+    values = {"title": "T", "stylesheet": "s.css", "unused": "x"}
+
+    assert layout.head(values) == "T|s.css|"
+    assert layout.tail(values) == "|T"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "{{ content }}",
+        "a{{content}}b",
+        "{{ title }}{{ title }}{{ content }}{{ title }}",
+    ],
+)
+def test_slots_may_repeat_but_content(text):
+    layout = template.PageTemplate.parse(text)
+
+    assert "content" not in layout.slots
+    assert layout.head({"title": "t"}) + "page" + layout.tail({"title": "t"}) == (
+        text.replace("{{ content }}", "page")
+        .replace("{{content}}", "page")
+        .replace("{{ title }}", "t")
+    )
+
+
+def test_text_that_is_not_a_slot():
+    text = "{ content } {{ }} {{ two words }} {{-x}} {{ content }}"
+    layout = template.PageTemplate.parse(text)
+
+    assert layout.head({}) == "{ content } {{ }} {{ two words }} {{-x}} "
+    assert layout.slots == frozenset()
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("{{ content }}\n\n{{ author }}", r"layout:3: unknown slot \{\{ author \}\}"),
+        ("{{ Content }}", r"layout:1: unknown slot \{\{ Content \}\}"),
+        ("<body></body>", r"layout: needs exactly one \{\{ content \}\} slot"),
+        ("{{ content }}{{ content }}", r"layout: needs exactly one \{\{ content \}\}"),
+        ("", r"needs exactly one \{\{ content \}\} slot"),
+    ],
+)
+def test_bad_layouts(text, message):
+    with pytest.raises(ValueError, match=message):
+        template.PageTemplate.parse(text, "layout")
+
+
+def test_late_slots():
+    assert template.PageTemplate.parse("{{ toc }}{{ content }}").held
+    assert not template.PageTemplate.parse("{{ content }}{{ toc }}").held
+    assert not template.PageTemplate.parse("{{ title }}{{ content }}").held
+
+
+def test_default_layout():
+    layout = template.load_layout()
+
+    assert layout.source == os.path.abspath(template.DEFAULT_LAYOUT)
+    assert layout.slots == {"title", "meta", "stylesheet", "toc"}
+    assert not layout.held
+
+
+def test_load_layout_cache(tmp_path):
+    path = tmp_path / "layout.html"
+    path.write_text("<a>{{ content }}</a>")
+    stat = os.stat(path)
+
+    first = template.load_layout(str(path))
+    assert template.load_layout(str(path)) is first
+    assert template.load_layout(os.path.relpath(path)) is first
+
+    # the same size and mtime is taken as the same file
+    path.write_text("<b>{{ content }}</b>")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert template.load_layout(str(path)) is first
+
+    # a new mtime is read again
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    second = template.load_layout(str(path))
+    assert second is not first
+    assert second.head({}) == "<b>"
+
+    # and so is a new size, even with the mtime put back
+    path.write_text("<em>{{ content }}</em>")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    third = template.load_layout(str(path))
+    assert third.head({}) == "<em>"
+    assert template.load_layout(str(path)) is third
+
+
+def test_load_layout_errors(tmp_path):
+    path = tmp_path / "layout.html"
+
+    with pytest.raises(FileNotFoundError):
+        template.load_layout(str(path))
+
+    path.write_text("{{ nope }}{{ content }}")
+    with pytest.raises(ValueError, match=re.escape(f"{path}:1: unknown slot")):
+        template.load_layout(str(path))
+
+    # a broken layout is not cached, fixing it is picked up
+    path.write_text("{{ content }}<!-- fixed -->")
+    assert template.load_layout(str(path)).tail({}) == "<!-- fixed -->"